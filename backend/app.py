@@ -1,23 +1,97 @@
 import warnings
 warnings.simplefilter("ignore", FutureWarning)
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 
 from routes.exam import exam_bp
-from routes.proctoring import proctoring_bp
+from routes.proctoring import proctoring_bp, MAX_FRAME_BYTES
 from routes.frontend_events import frontend_bp
 from routes.admin import admin_bp
 from routes.face_auth import bp as face_auth_bp
+from routes.metrics import metrics_bp
 
-app = Flask(__name__)
-CORS(app)
+from db.attempts import auto_flag_job
+from db.face_index import face_index_job
+from db.migrations import partition_job, ensure_schema, SchemaOutOfDate
+from proctoring.models import models, MODEL_WARMUP
+from proctoring.workers import inference_pool
+
+
+def start_background_work():
+    """
+    Background jobs and model warm-up for this process. Called from
+    create_app(), never at import: inference workers are spawned, and a
+    spawned child re-imports the main module.
+    """
+    # Abandoned attempts are flagged in the background (see db/attempts.py);
+    # upcoming cheating_events partitions are created ahead of time and the
+    # cross-attempt face index is rebuilt on each host
+    auto_flag_job.start()
+    partition_job.start()
+    face_index_job.start()
+
+    # Models load lazily; warm-up moves the cost to boot instead of the
+    # first proctored frame
+    if MODEL_WARMUP:
+        if inference_pool.enabled:
+            inference_pool.start()
+        else:
+            models.warm_up(background=True)
+
+
+def create_app():
+    """WSGI servers: `gunicorn "app:create_app()"` (or `gunicorn app:app`)."""
+    app = Flask(__name__)
+    CORS(app)
+
+    # WebSocket messages over the frame limit close the stream before they are buffered
+    app.config["SOCK_SERVER_OPTIONS"] = {"max_message_size": MAX_FRAME_BYTES}
+
+    app.register_blueprint(exam_bp)
+    app.register_blueprint(proctoring_bp)
+    app.register_blueprint(frontend_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(face_auth_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Migrations run at deploy (python -m db.migrations apply), not on requests
+    @app.errorhandler(SchemaOutOfDate)
+    def schema_out_of_date(e):
+        return jsonify({"error": "Database schema out of date"}), 503
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        if inference_pool.enabled:
+            is_ready = inference_pool.health() or not MODEL_WARMUP
+        else:
+            is_ready = models.ready()
+
+        body = models.stats()
+        try:
+            ensure_schema()
+            body["schema_current"] = True
+        except Exception:
+            body["schema_current"] = False
+            is_ready = False
+
+        body["ready"] = is_ready
+        return jsonify(body), 200 if is_ready else 503
+
+    start_background_work()
+    return app
+
+
+def __getattr__(name):
+    # `app:app` still works, but the app is built on first access rather
+    # than at import, so a spawned worker's re-import starts nothing
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app.register_blueprint(exam_bp)
-app.register_blueprint(proctoring_bp)
-app.register_blueprint(frontend_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(face_auth_bp)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # The reloader would run create_app() (and its background work) in a
+    # second process as well
+    create_app().run(debug=True, use_reloader=False)
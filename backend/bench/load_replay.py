@@ -0,0 +1,647 @@
+"""
+End-to-end load-replay benchmark.
+
+Replays recorded JPEG sequences as N simulated candidates against
+/analyze-frame and /log-event at a fixed frame rate, and reports
+throughput, p50/p95/p99 latency and server CPU/RSS. A second pass times
+each pipeline stage on its own (decode, detect_phone, analyze_face,
+extract_face, get_face_embedding and the DB calls). Everything goes into
+one JSON report so runs can be compared across commits.
+
+Fixtures are one directory per scenario, frames replayed in name order:
+
+    fixtures/still_face/  turning_head/  phone/  no_face/  two_faces/
+
+They are webcam captures of real people and are not committed; each
+report records a sha256 of the fixture set, and compare warns when two
+reports were replayed from different sets.
+
+    python -m bench.load_replay record still_face --out fixtures --frames 50
+    python -m bench.load_replay run fixtures --candidates 20 --fps 1 \
+        --duration 60 --json load.json
+    python -m bench.load_replay run fixtures --url http://10.0.0.5:5000 --server-pid 1234
+    python -m bench.load_replay compare base.json load.json --max-regression 10
+
+Without --url a server is started from this checkout (app.py on
+threaded Werkzeug), so it talks to config.DATABASE_URL: point that at a
+local Postgres, not production.
+"""
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("still_face", "turning_head", "phone", "no_face", "two_faces")
+
+FRONTEND_EVENT = "TAB_SWITCH"      # what --log-event-every sends
+SERVER_READY_TIMEOUT = 180         # seconds to wait for a spawned server
+
+
+# -----------------------------------
+# Fixtures
+# -----------------------------------
+def load_scenarios(path, names=SCENARIOS):
+    """{scenario: [(file name, jpeg bytes)]} for every scenario directory present."""
+    scenarios = {}
+    for scenario in names:
+        files = sorted(
+            glob.glob(os.path.join(path, scenario, "*.jpg")) +
+            glob.glob(os.path.join(path, scenario, "*.jpeg"))
+        )
+        frames = []
+        for name in files:
+            with open(name, "rb") as f:
+                frames.append((os.path.basename(name), f.read()))
+        if frames:
+            scenarios[scenario] = frames
+    return scenarios
+
+
+def fixture_digest(scenarios):
+    """sha256 over every scenario's frame names and bytes: reports are only comparable when it matches."""
+    digest = hashlib.sha256()
+    for scenario in sorted(scenarios):
+        for name, jpeg in scenarios[scenario]:
+            digest.update(f"{scenario}/{name}:{len(jpeg)}\n".encode())
+            digest.update(jpeg)
+    return digest.hexdigest()
+
+
+def record(scenario, out, frames, fps, camera):
+    """Captures a fixture sequence from a webcam."""
+    import cv2
+
+    target = os.path.join(out, scenario)
+    os.makedirs(target, exist_ok=True)
+
+    capture = cv2.VideoCapture(camera)
+    if not capture.isOpened():
+        sys.exit(f"Cannot open camera {camera}")
+
+    print(f"Recording {frames} frames of '{scenario}' at {fps} fps into {target}")
+    try:
+        for i in range(frames):
+            ok, frame = capture.read()
+            if not ok:
+                break
+            cv2.imwrite(
+                os.path.join(target, f"frame_{i:04d}.jpg"), frame,
+                [cv2.IMWRITE_JPEG_QUALITY, 80]
+            )
+            time.sleep(1.0 / fps)
+    finally:
+        capture.release()
+
+
+# -----------------------------------
+# Stats
+# -----------------------------------
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "max_ms": round(max(latencies), 2)
+    }
+
+
+class Recorder:
+    """Per-endpoint latencies and errors, shared by all candidate threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.latencies = {}
+        self.errors = {}
+        self.late_frames = 0
+        self.restarts = 0
+
+    def add(self, endpoint, elapsed_ms, ok):
+        if not self.enabled:
+            return
+        with self._lock:
+            if ok:
+                self.latencies.setdefault(endpoint, []).append(elapsed_ms)
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(endpoint, [])
+            endpoints[endpoint] = {
+                **latency_summary(latencies),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_rps": round(len(latencies) / elapsed, 2)
+            }
+        return endpoints
+
+
+class ProcessSampler:
+    """Samples CPU and RSS of a process and its children (inference workers)."""
+
+    def __init__(self, pid, interval=0.5):
+        self.root = psutil.Process(pid)
+        self.interval = interval
+        self._procs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.cpu = []
+        self.rss = []
+
+    def _tree(self):
+        try:
+            procs = [self.root] + self.root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+        for proc in procs:
+            if proc.pid not in self._procs:
+                self._procs[proc.pid] = proc
+                proc.cpu_percent(None)     # primes the counter
+        return procs
+
+    def _loop(self):
+        self._tree()
+        while not self._stop.wait(self.interval):
+            cpu = rss = 0.0
+            for proc in self._tree():
+                try:
+                    cpu += self._procs[proc.pid].cpu_percent(None)
+                    rss += proc.memory_info().rss / (1024 * 1024)
+                except psutil.NoSuchProcess:
+                    pass
+            self.cpu.append(cpu)
+            self.rss.append(rss)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="bench-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self):
+        if not self.cpu:
+            return None
+        return {
+            "pid": self.root.pid,
+            "cpu_count": psutil.cpu_count(),
+            "cpu_percent_mean": round(statistics.mean(self.cpu), 1),
+            "cpu_percent_max": round(max(self.cpu), 1),
+            "rss_mb_mean": round(statistics.mean(self.rss), 1),
+            "rss_mb_max": round(max(self.rss), 1)
+        }
+
+
+# -----------------------------------
+# Server
+# -----------------------------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server():
+    """Starts app.py from this checkout; returns (process, base url)."""
+    port = _free_port()
+    code = (
+        "from app import create_app\n"
+        f"create_app().run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)\n"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR)
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + SERVER_READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"Server exited with code {proc.returncode}")
+        try:
+            # Any answer will do; /ready is 503 until models are warm
+            requests.get(url + "/ready", timeout=2)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.5)
+
+    proc.terminate()
+    sys.exit("Server did not come up")
+
+
+# -----------------------------------
+# Simulated candidate
+# -----------------------------------
+class Candidate(threading.Thread):
+    """One candidate: starts an attempt, then streams its scenario's frames."""
+
+    def __init__(self, index, scenario, frames, url, args, recorder, stop, face_image):
+        super().__init__(name=f"candidate-{index}", daemon=True)
+        self.index = index
+        self.scenario = scenario
+        self.frames = frames
+        self.url = url
+        self.args = args
+        self.recorder = recorder
+        self.stop = stop
+        self.face_image = face_image
+        self.http = requests.Session()
+        self.attempt_id = None
+
+    def _post(self, endpoint, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.post(self.url + endpoint, timeout=self.args.timeout, **kwargs)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, ok)
+        return response
+
+    def _start_attempt(self):
+        response = self._post("/start-exam", json={"exam_id": self.args.exam_id})
+        if response is None or response.status_code != 200:
+            return False
+        self.attempt_id = response.json()["attempt_id"]
+
+        if self.face_image:
+            self._post("/capture-face", json={"attempt_id": self.attempt_id, "image": self.face_image})
+        return True
+
+    def _send_frame(self, jpeg, data_url):
+        if self.args.raw:
+            return self._post(
+                f"/analyze-frame-raw?attempt_id={self.attempt_id}",
+                data=jpeg, headers={"Content-Type": "image/jpeg"}
+            )
+        return self._post("/analyze-frame", json={"attempt_id": self.attempt_id, "image": data_url})
+
+    def run(self):
+        interval = 1.0 / self.args.fps
+        sent = 0
+
+        # Spread candidates over one frame interval
+        if self.stop.wait(interval * self.index / self.args.candidates):
+            return
+
+        while not self.stop.is_set() and not self._start_attempt():
+            self.stop.wait(1.0)
+
+        next_at = time.monotonic()
+        while not self.stop.is_set():
+            jpeg, data_url = self.frames[sent % len(self.frames)]
+            response = self._send_frame(jpeg, data_url)
+            sent += 1
+
+            if self.args.log_event_every and sent % self.args.log_event_every == 0:
+                self._post("/log-event", json={"event": FRONTEND_EVENT, "attempt_id": self.attempt_id})
+
+            # Terminated candidates come back as a fresh attempt
+            if response is not None and response.ok and response.json().get("status") == "TERMINATED":
+                self._post("/end-exam", json={"attempt_id": self.attempt_id})
+                if self.recorder.enabled:
+                    self.recorder.restarts += 1
+                self._start_attempt()
+
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                self.stop.wait(delay)
+            else:
+                if self.recorder.enabled:
+                    self.recorder.late_frames += 1
+                next_at = time.monotonic()
+
+        if self.attempt_id is not None:
+            try:
+                self.http.post(self.url + "/end-exam", json={"attempt_id": self.attempt_id}, timeout=5)
+            except requests.RequestException:
+                pass
+
+
+def replay(scenarios, url, server_pid, args):
+    recorder = Recorder()
+    stop = threading.Event()
+
+    prepared = {
+        scenario: [
+            (jpeg, "data:image/jpeg;base64," + base64.b64encode(jpeg).decode())
+            for _, jpeg in frames
+        ]
+        for scenario, frames in scenarios.items()
+    }
+    names = sorted(prepared)
+
+    face_image = None
+    if args.register_face and "still_face" in prepared:
+        face_image = prepared["still_face"][0][1]
+
+    candidates = [
+        Candidate(i, names[i % len(names)], prepared[names[i % len(names)]],
+                  url, args, recorder, stop, face_image)
+        for i in range(args.candidates)
+    ]
+    for candidate in candidates:
+        candidate.start()
+
+    # Warm-up traffic is not recorded
+    time.sleep(args.warmup)
+
+    sampler = ProcessSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    recorder.enabled = True
+    started = time.monotonic()
+
+    time.sleep(args.duration)
+
+    recorder.enabled = False
+    elapsed = time.monotonic() - started
+    stop.set()
+    if sampler:
+        sampler.stop()
+    for candidate in candidates:
+        candidate.join(timeout=args.timeout + 5)
+
+    frames = sum(
+        r.get("count", 0) for e, r in recorder.report(elapsed).items() if e.startswith("/analyze-frame")
+    )
+    return {
+        "elapsed_s": round(elapsed, 1),
+        "frames_per_second": round(frames / elapsed, 2),
+        "target_frames_per_second": round(args.candidates * args.fps, 2),
+        "late_frames": recorder.late_frames,
+        "restarted_attempts": recorder.restarts,
+        "scenarios": {name: sum(c.scenario == name for c in candidates) for name in names},
+        "endpoints": recorder.report(elapsed),
+        "server": sampler.report() if sampler else None
+    }
+
+
+# -----------------------------------
+# Per-stage timings (in-process)
+# -----------------------------------
+def _timed(timings, stage, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    timings.setdefault(stage, []).append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def stage_timings(scenarios, repeats, with_db):
+    """Times every pipeline stage separately, frame by frame, in this process."""
+    import cv2
+    import numpy as np
+
+    from proctoring.face import analyze_face, extract_face
+    from proctoring.face_auth import get_face_embedding
+    from proctoring.phone import detect_phone
+
+    timings = {}
+    by_scenario = {}
+
+    for scenario, frames in scenarios.items():
+        scenario_timings = {}
+        for _ in range(repeats):
+            for _, jpeg in frames:
+                frame = _timed(
+                    scenario_timings, "decode",
+                    cv2.imdecode, np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR
+                )
+                if frame is None:
+                    continue
+                _timed(scenario_timings, "detect_phone", detect_phone, frame)
+                _timed(scenario_timings, "analyze_face", analyze_face, frame)
+                face, face_count, _ = _timed(scenario_timings, "extract_face", extract_face, frame)
+                if face_count == 1 and face is not None:
+                    try:
+                        _timed(scenario_timings, "get_face_embedding", get_face_embedding, face)
+                    except Exception:
+                        pass
+
+        by_scenario[scenario] = {
+            stage: round(statistics.mean(values), 2) for stage, values in scenario_timings.items()
+        }
+        for stage, values in scenario_timings.items():
+            timings.setdefault(stage, []).extend(values)
+
+    if with_db:
+        timings.update(db_timings(repeats * 20))
+
+    return {
+        "stages": {stage: latency_summary(values) for stage, values in timings.items()},
+        "stage_mean_ms_by_scenario": by_scenario
+    }
+
+
+# Everything db_timings writes for its throwaway attempt
+BENCH_ATTEMPT_TABLES = (
+    ("cheating_events", "attempt_id"),
+    ("attempt_event_summary", "attempt_id"),
+    ("attempt_event_buckets", "attempt_id"),
+    ("exam_attempts", "id")
+)
+
+
+def db_timings(iterations):
+    """DB calls on the hot path, against a throwaway attempt that is deleted afterwards."""
+    from db.attempts import evaluate_attempt, get_face_embedding
+    from db.connection import db_cursor
+    from db.embedding_cache import embedding_cache
+    from db.events import log_event, flush_events
+    from db.ledger import score_ledger
+
+    with db_cursor(commit=True) as cur:
+        cur.execute("""
+            INSERT INTO exam_attempts (user_id, exam_id, status)
+            VALUES ('bench', 'bench', 'ONGOING')
+            RETURNING id
+        """)
+        attempt_id = cur.fetchone()[0]
+
+    timings = {}
+    try:
+        for _ in range(iterations):
+            _timed(timings, "db_log_event", log_event, FRONTEND_EVENT, attempt_id)
+            _timed(timings, "db_flush_events", flush_events)
+            _timed(timings, "db_evaluate_attempt", evaluate_attempt, attempt_id)
+            embedding_cache.invalidate(attempt_id)
+            _timed(timings, "db_get_face_embedding", get_face_embedding, attempt_id)
+    finally:
+        # Queued events first, so none land after the delete
+        flush_events()
+        with db_cursor(commit=True) as cur:
+            for table, column in BENCH_ATTEMPT_TABLES:
+                cur.execute(f"DELETE FROM {table} WHERE {column} = %s", (attempt_id,))
+        score_ledger.forget(attempt_id)
+        embedding_cache.invalidate(attempt_id)
+
+    return timings
+
+
+# -----------------------------------
+# Report
+# -----------------------------------
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, new, max_regression):
+    """Prints p95/throughput deltas; returns the regressions beyond max_regression %."""
+    regressions = []
+
+    base_fixtures = (base.get("meta") or {}).get("fixtures_sha256")
+    new_fixtures = (new.get("meta") or {}).get("fixtures_sha256")
+    if base_fixtures != new_fixtures:
+        print(f"WARNING: reports replayed different fixtures ({base_fixtures} vs {new_fixtures})")
+
+    def delta(label, old, cur, higher_is_worse=True):
+        if not old or cur is None:
+            return
+        change = (cur - old) / old * 100
+        print(f"{label:<44} {old:>10.2f} -> {cur:>10.2f}  {change:+6.1f}%")
+        worse = change if higher_is_worse else -change
+        if max_regression is not None and worse > max_regression:
+            regressions.append(f"{label}: {change:+.1f}%")
+
+    base_replay, new_replay = base.get("replay") or {}, new.get("replay") or {}
+    delta("frames/s", base_replay.get("frames_per_second"), new_replay.get("frames_per_second"), False)
+    for endpoint, stats in (base_replay.get("endpoints") or {}).items():
+        current = (new_replay.get("endpoints") or {}).get(endpoint, {})
+        delta(f"{endpoint} p95 ms", stats.get("p95_ms"), current.get("p95_ms"))
+        delta(f"{endpoint} p99 ms", stats.get("p99_ms"), current.get("p99_ms"))
+
+    for stage, stats in ((base.get("stages") or {}).get("stages") or {}).items():
+        current = ((new.get("stages") or {}).get("stages") or {}).get(stage, {})
+        delta(f"stage {stage} p50 ms", stats.get("p50_ms"), current.get("p50_ms"))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proctoring load-replay benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay fixtures and time pipeline stages")
+    run.add_argument("fixtures", help="directory with one sub-directory of JPEGs per scenario")
+    run.add_argument("--scenario", action="append", choices=SCENARIOS, help="limit to these scenarios")
+    run.add_argument("--candidates", type=int, default=10)
+    run.add_argument("--fps", type=float, default=1.0, help="frames per second per candidate")
+    run.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    run.add_argument("--log-event-every", type=int, default=10, help="frames between /log-event calls (0: never)")
+    run.add_argument("--raw", action="store_true", help="use /analyze-frame-raw (binary JPEG)")
+    run.add_argument("--register-face", action="store_true", help="register the first still_face frame per attempt")
+    run.add_argument("--exam-id", default="bench_exam")
+    run.add_argument("--timeout", type=float, default=30.0)
+    run.add_argument("--url", help="existing server; default: start one from this checkout")
+    run.add_argument("--server-pid", type=int, help="pid to sample CPU/RSS of when using --url")
+    run.add_argument("--stage-repeats", type=int, default=3)
+    run.add_argument("--no-replay", action="store_true", help="only time the stages")
+    run.add_argument("--no-stages", action="store_true", help="only replay")
+    run.add_argument("--no-db-stages", action="store_true", help="skip the DB stage timings")
+    run.add_argument("--json", help="write the report to this file")
+
+    rec = commands.add_parser("record", help="capture a fixture sequence from a webcam")
+    rec.add_argument("scenario", choices=SCENARIOS)
+    rec.add_argument("--out", default="fixtures")
+    rec.add_argument("--frames", type=int, default=50)
+    rec.add_argument("--fps", type=float, default=5.0)
+    rec.add_argument("--camera", type=int, default=0)
+
+    cmp = commands.add_parser("compare", help="diff two reports")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--max-regression", type=float, help="fail if anything is this many percent worse")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.scenario, args.out, args.frames, args.fps, args.camera)
+        return
+
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.max_regression)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        sys.exit(1 if regressions else 0)
+
+    scenarios = load_scenarios(args.fixtures, args.scenario or SCENARIOS)
+    if not scenarios:
+        sys.exit(f"No scenario directories with JPEGs in {args.fixtures}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpu_count": psutil.cpu_count(),
+            "fixtures": {name: len(frames) for name, frames in scenarios.items()},
+            "fixtures_sha256": fixture_digest(scenarios),
+            "config": {
+                k: v for k, v in vars(args).items()
+                if k not in ("command", "fixtures", "json")
+            }
+        },
+        "replay": None,
+        "stages": None
+    }
+
+    if not args.no_replay:
+        server = None
+        url, server_pid = args.url, args.server_pid
+        if not url:
+            server, url = start_server()
+            server_pid = server.pid
+        try:
+            report["replay"] = replay(scenarios, url, server_pid, args)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    if not args.no_stages:
+        report["stages"] = stage_timings(scenarios, args.stage_repeats, not args.no_db_stages)
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
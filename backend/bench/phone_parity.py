@@ -0,0 +1,151 @@
+"""
+Phone-detector parity harness.
+
+Runs the reference PyTorch model (PHONE_MODEL_PATH at 640) and one or
+more candidate backends over a directory of JPEG fixtures, then reports
+per-frame agreement, recall/false positives against the reference, and
+per-frame latency. Exits non-zero if a candidate's recall drops below
+--min-recall.
+
+    python -m bench.phone_parity fixtures/phone --candidate onnx:320 \
+        --candidate openvino:320:int8 --json parity.json
+
+Candidates are backend[:imgsz][:int8]; without --candidate the backend
+configured in proctoring/phone.py is checked.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+from proctoring.phone import (
+    load_phone_model,
+    run_phone_model,
+    PHONE_BACKEND,
+    PHONE_IMGSZ,
+    PHONE_INT8
+)
+
+
+def parse_candidate(spec):
+    parts = spec.split(":")
+    backend = parts[0]
+    imgsz = int(parts[1]) if len(parts) > 1 and parts[1] else 640
+    int8 = len(parts) > 2 and parts[2] == "int8"
+    return backend, imgsz, int8
+
+
+def load_fixtures(path):
+    files = sorted(
+        glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.jpeg"))
+    )
+    frames = []
+    for name in files:
+        frame = cv2.imread(name)
+        if frame is not None:
+            frames.append((os.path.basename(name), frame))
+    return frames
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def run(model, frames, imgsz, repeats):
+    # One throwaway frame so lazy init doesn't count as latency
+    run_phone_model(model, [frames[0][1]], imgsz)
+
+    detections = []
+    latencies = []
+    for _, frame in frames:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            detected = run_phone_model(model, [frame], imgsz)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+        detections.append(detected)
+
+    return detections, {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "mean_ms": round(statistics.mean(latencies), 2)
+    }
+
+
+def compare(reference, candidate, names):
+    positives = sum(reference)
+    hits = sum(1 for r, c in zip(reference, candidate) if r and c)
+    false_positives = sum(1 for r, c in zip(reference, candidate) if c and not r)
+
+    return {
+        "agreement": round(sum(r == c for r, c in zip(reference, candidate)) / len(reference), 4),
+        "recall": round(hits / positives, 4) if positives else None,
+        "false_positives": false_positives,
+        "mismatched_frames": [n for n, r, c in zip(names, reference, candidate) if r != c]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phone detector backend parity")
+    parser.add_argument("fixtures", help="directory of JPEG frames")
+    parser.add_argument("--candidate", action="append", default=[],
+                        help="backend[:imgsz][:int8], e.g. onnx:320 or openvino:320:int8")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per frame")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    frames = load_fixtures(args.fixtures)
+    if not frames:
+        sys.exit(f"No JPEG fixtures in {args.fixtures}")
+    names = [name for name, _ in frames]
+
+    reference, reference_latency = run(load_phone_model("torch", 640, False), frames, 640, args.repeats)
+
+    report = {
+        "fixtures": len(frames),
+        "reference_positives": sum(reference),
+        "reference": {"backend": "torch", "imgsz": 640, **reference_latency},
+        "candidates": []
+    }
+
+    failures = []
+    configured = f"{PHONE_BACKEND}:{PHONE_IMGSZ}" + (":int8" if PHONE_INT8 else "")
+
+    for spec in args.candidate or [configured]:
+        backend, imgsz, int8 = parse_candidate(spec)
+        detections, latency = run(load_phone_model(backend, imgsz, int8), frames, imgsz, args.repeats)
+
+        result = {
+            "backend": backend,
+            "imgsz": imgsz,
+            "int8": int8,
+            **latency,
+            "speedup": (
+                round(reference_latency["p50_ms"] / latency["p50_ms"], 2)
+                if latency["p50_ms"] else None
+            ),
+            **compare(reference, detections, names)
+        }
+        report["candidates"].append(result)
+
+        if result["recall"] is not None and result["recall"] < args.min_recall:
+            failures.append(f"{spec}: recall {result['recall']} < {args.min_recall}")
+
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Per-frame cost of the landmark math and the temporal rules.
+
+Replays a synthetic stream (states that persist for a few frames, as a
+candidate's do) through FrameAnalysis-style landmark math and
+ProctorSession.frame_events, and reports microseconds per frame. No
+models are loaded. Exits non-zero when a budget is exceeded.
+
+    python -m bench.rules --frames 20000 --max-rules-us 100
+    python -m bench.rules --json rules.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from proctoring.face import (
+    KEY_LANDMARKS,
+    analyze_eye_gaze,
+    analyze_head_direction,
+    landmark_points
+)
+from proctoring.session import ProctorSession
+
+EVENTS = (None, None, None, "NO_FACE", "MULTIPLE_FACES", "LOOKING_LEFT", "LOOKING_RIGHT")
+
+
+class _Landmark:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def synthetic_stream(frames, seed=0):
+    """(phone_detected, face_result) per frame; each state lasts 1-6 frames."""
+    rng = random.Random(seed)
+    stream = []
+    event, phone, left = None, False, 0
+    for _ in range(frames):
+        if left == 0:
+            event = rng.choice(EVENTS)
+            phone = rng.random() < 0.1
+            left = rng.randint(1, 6)
+        left -= 1
+        stream.append((phone, {"faces": 1, "direction": "CENTER", "gaze": "CENTER", "event": event}))
+    return stream
+
+
+def synthetic_landmarks(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    size = max(KEY_LANDMARKS) + 1
+    return [
+        [_Landmark(float(x), float(y)) for x, y in rng.random((size, 2))]
+        for _ in range(frames)
+    ]
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "mean_us": round(statistics.mean(values), 2),
+        "p50_us": round(ordered[len(ordered) // 2], 2),
+        "p95_us": round(ordered[int(len(ordered) * 0.95)], 2)
+    }
+
+
+def bench_landmarks(faces):
+    timings = []
+    for landmarks in faces:
+        started = time.perf_counter()
+        points = landmark_points(landmarks)
+        analyze_head_direction(points)
+        analyze_eye_gaze(points)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return summarize(timings)
+
+
+def bench_rules(stream, fps):
+    session = ProctorSession(1)
+    now = 1.0e9
+    timings = []
+    events = 0
+    for phone, face_result in stream:
+        now += 1.0 / fps
+        started = time.perf_counter()
+        fired, _ = session.frame_events(phone, face_result, None, now)
+        timings.append((time.perf_counter() - started) * 1e6)
+        events += len(fired)
+    report = summarize(timings)
+    report["events"] = events
+    report["window_bytes"] = session.window.nbytes
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Landmark / temporal-rule cost per frame")
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--fps", type=float, default=1.0, help="simulated client frame rate")
+    parser.add_argument("--max-rules-us", type=float, help="fail if mean rule time exceeds this")
+    parser.add_argument("--max-landmarks-us", type=float, help="fail if mean landmark time exceeds this")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "frames": args.frames,
+        "landmarks": bench_landmarks(synthetic_landmarks(min(args.frames, 2000))),
+        "rules": bench_rules(synthetic_stream(args.frames), args.fps)
+    }
+
+    failures = []
+    if args.max_rules_us and report["rules"]["mean_us"] > args.max_rules_us:
+        failures.append("rules %.1f us > %.1f us" % (report["rules"]["mean_us"], args.max_rules_us))
+    if args.max_landmarks_us and report["landmarks"]["mean_us"] > args.max_landmarks_us:
+        failures.append("landmarks %.1f us > %.1f us" % (report["landmarks"]["mean_us"], args.max_landmarks_us))
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
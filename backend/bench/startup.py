@@ -0,0 +1,117 @@
+"""
+Startup-time / RSS benchmark.
+
+Imports the app in fresh interpreters and reports import time and
+resident memory, then (with --warmup) the time and memory to load each
+model. Exits non-zero when a budget is exceeded so regressions show up.
+
+    python -m bench.startup --runs 5 --max-import-ms 3000 --max-rss-mb 400
+    python -m bench.startup --warmup --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line
+_PROBE = r"""
+import json, sys, time
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+result = {"baseline_rss_mb": rss_mb()}
+
+started = time.perf_counter()
+import app
+app.create_app()
+result["import_ms"] = (time.perf_counter() - started) * 1000
+result["import_rss_mb"] = rss_mb()
+
+from proctoring.models import models
+result["models_loaded_at_import"] = [
+    name for name, info in models.stats()["models"].items() if info["loaded"]
+]
+
+if WARMUP:
+    started = time.perf_counter()
+    models.warm_up()
+    result["warmup_ms"] = (time.perf_counter() - started) * 1000
+    result["warmup_rss_mb"] = rss_mb()
+    result["models"] = models.stats()["models"]
+
+print(json.dumps(result))
+"""
+
+
+def run_once(warmup):
+    code = "WARMUP = %r\n%s" % (warmup, _PROBE)
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "probe failed")
+
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    return {
+        "min": round(min(values), 1),
+        "median": round(statistics.median(values), 1),
+        "max": round(max(values), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App startup time / RSS benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", action="store_true", help="also measure model warm-up")
+    parser.add_argument("--max-import-ms", type=float, help="fail if median import time exceeds this")
+    parser.add_argument("--max-rss-mb", type=float, help="fail if median post-import RSS exceeds this")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.warmup) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "import_ms": summarize([r["import_ms"] for r in runs]),
+        "import_rss_mb": summarize([r["import_rss_mb"] for r in runs]),
+        "baseline_rss_mb": summarize([r["baseline_rss_mb"] for r in runs]),
+        "models_loaded_at_import": runs[-1]["models_loaded_at_import"]
+    }
+    if args.warmup:
+        report["warmup_ms"] = summarize([r["warmup_ms"] for r in runs])
+        report["warmup_rss_mb"] = summarize([r["warmup_rss_mb"] for r in runs])
+        report["models"] = runs[-1]["models"]
+
+    failures = []
+    if report["models_loaded_at_import"]:
+        failures.append("models loaded at import: %s" % ", ".join(report["models_loaded_at_import"]))
+    if args.max_import_ms and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append("import time %.1f ms > %.1f ms" % (report["import_ms"]["median"], args.max_import_ms))
+    if args.max_rss_mb and report["import_rss_mb"]["median"] > args.max_rss_mb:
+        failures.append("import RSS %.1f MB > %.1f MB" % (report["import_rss_mb"]["median"], args.max_rss_mb))
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
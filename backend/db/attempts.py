@@ -1,127 +1,237 @@
-from db.connection import get_db 
+from db.connection import db_cursor
+from db.embedding_cache import embedding_cache
+from db.jobs import PeriodicJob
+from db.ledger import score_ledger
+from db.live import live_hub
+from db.migrations import ensure_schema
+from proctoring import metrics
+from proctoring.vectors import normalize_embedding, unpack_embedding
 from datetime import datetime
+from psycopg2.extras import execute_values
 import json
+import os
+import threading
+import time
+import psycopg2
+
+# Embeddings are stored as normalized float32 bytes in face_embedding_vec
+# (added by db/migrations.py). The legacy face_embedding column (JSON text) is
+# still read for old rows.
+
+# Abandoned-attempt flagging runs in the background, not on dashboard loads.
+# "Abandoned" means no frame or event for AUTO_FLAG_IDLE; activity reaches
+# exam_attempts.last_seen_at at most ACTIVITY_FLUSH_INTERVAL late.
+AUTO_FLAG_INTERVAL = 60          # seconds between runs
+AUTO_FLAG_IDLE = "10 minutes"    # ONGOING attempts quiet for this long get FLAGGED
+AUTO_FLAG_LOCK_ID = 72001        # pg advisory lock shared by all processes
+ACTIVITY_FLUSH_INTERVAL = 30     # seconds between last_seen_at writes per process
 
 def save_face_embedding(attempt_id, embedding):
-    conn, cur = get_db()
+    ensure_schema()
 
-    # Convert embedding to JSON string
-    embedding_json = json.dumps(embedding)
+    vector = normalize_embedding(embedding)
 
-    cur.execute("""
-        UPDATE exam_attempts
-        SET face_embedding = %s
-        WHERE id = %s
-    """, (embedding_json, attempt_id))
+    with db_cursor(commit=True) as cur:
+        cur.execute("""
+            UPDATE exam_attempts
+            SET face_embedding_vec = %s,
+                face_embedding = NULL,
+                face_registered_at = clock_timestamp()
+            WHERE id = %s
+        """, (psycopg2.Binary(vector.tobytes()), attempt_id))
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Re-registration replaces whatever this process had cached
+    embedding_cache.put(attempt_id, vector)
 
 def is_face_registered(attempt_id):
-    conn, cur = get_db()
-
-    cur.execute("""
-        SELECT face_embedding
-        FROM exam_attempts
-        WHERE id = %s
-    """, (attempt_id,))
-
-    row = cur.fetchone()
-
-    cur.close()
-    conn.close()
-
-    return row is not None and row[0] is not None
+    return get_face_embedding(attempt_id) is not None
 
 def evaluate_attempt(attempt_id):
-    conn, cur = get_db()
-
-    cur.execute(
-        "SELECT cheating_score, status FROM exam_attempts WHERE id=%s",
-        (attempt_id,)
-    )
-    score, status = cur.fetchone()
-
-    admin_status = None
-
-    if score >= 15 and status == "ONGOING":
-        admin_status = "TERMINATED"
-        cur.execute(
-            "UPDATE exam_attempts SET status=%s WHERE id=%s",
-            (admin_status, attempt_id)
-        )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    warning = None
-    if 5 <= score < 8:
-        warning = "WARNING"
-    elif 8 <= score < 12:
-        warning = "WARNING_YELLOW"
-    elif 12 <= score < 15:
-        warning = "FINAL_WARNING"
+    """
+    Warning tier / termination check against the in-memory score ledger.
+    Only touches the database when the attempt gets terminated.
+    Every frame and candidate event is evaluated, so this also marks
+    the attempt as active.
+    """
+    attempt_id = int(attempt_id)
+    activity_tracker.touch(attempt_id)
 
-    return {
-        "status": admin_status,
-        "warning": warning
-    }
+    with metrics.timed("db_evaluate_attempt"):
+        return score_ledger.evaluate(attempt_id)
 
 
+# -----------------------------------
+# ACTIVITY (exam_attempts.last_seen_at)
+# -----------------------------------
+class ActivityTracker:
+    """
+    Last activity per attempt, kept in memory and written for all
+    attempts at once every ACTIVITY_FLUSH_INTERVAL seconds (one UPDATE),
+    so frames never wait on the database for it.
+    """
 
-def auto_flag_abandoned_attempts():
+    def __init__(self, interval=ACTIVITY_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending = {}           # attempt_id -> epoch seconds
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.flushes = 0
+        self.failures = 0
+
+    def touch(self, attempt_id, now=None):
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[attempt_id] = time.time() if now is None else now
+
+    def flush(self):
+        """Writes pending activity; on failure it stays pending. Returns the rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with db_cursor(commit=True) as cur:
+                execute_values(cur, """
+                    UPDATE exam_attempts AS a
+                    SET last_seen_at = GREATEST(a.last_seen_at, v.seen)
+                    FROM (VALUES %s) AS v(id, seen)
+                    WHERE a.id = v.id
+                """, sorted(pending.items()), template="(%s, to_timestamp(%s)::timestamp)")
+        except Exception:
+            with self._lock:
+                for attempt_id, seen in pending.items():
+                    if seen > self._pending.get(attempt_id, 0):
+                        self._pending[attempt_id] = seen
+            self.failures += 1
+            raise
+
+        self.flushes += 1
+        return len(pending)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="activity-flusher", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print("❌ Activity flush failed:", e)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "interval": self.interval,
+            "pending": pending,
+            "flushes": self.flushes,
+            "failures": self.failures
+        }
+
+
+activity_tracker = ActivityTracker()
+
+
+def auto_flag_abandoned_attempts(cur=None):
     """
     Any exam that:
     - is ONGOING
     - has NO ended_at
-    - started more than X minutes ago
+    - had no frame or event for AUTO_FLAG_IDLE
     should be FLAGGED
+
+    Only rows in the partial idx_exam_attempts_idle index are scanned.
+    Returns the number of attempts flagged.
     """
-    conn, cur = get_db()
+    if cur is None:
+        with db_cursor(commit=True) as cur:
+            return auto_flag_abandoned_attempts(cur)
 
     cur.execute("""
         UPDATE exam_attempts
         SET status = 'FLAGGED'
         WHERE status = 'ONGOING'
           AND ended_at IS NULL
-          AND started_at < NOW() - INTERVAL '2 minutes'
-    """)
+          AND last_seen_at < NOW() - %s::interval
+        RETURNING id, exam_id, cheating_score
+    """, (AUTO_FLAG_IDLE,))
+    flagged = cur.fetchall()
+
+    # Cached ledger entries reload the new status on next use
+    for attempt_id, _, _ in flagged:
+        score_ledger.forget(attempt_id)
+
+    live_hub.publish([
+        {
+            "type": "status",
+            "attempt_id": attempt_id,
+            "exam_id": exam_id,
+            "status": "FLAGGED",
+            "score": score
+        }
+        for attempt_id, exam_id, score in flagged
+    ])
+
+    return len(flagged)
+
+
+auto_flag_job = PeriodicJob(
+    "auto-flag", AUTO_FLAG_INTERVAL, auto_flag_abandoned_attempts, AUTO_FLAG_LOCK_ID
+)
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    
 def get_face_embedding(attempt_id):
-    conn, cur = get_db()
+    """
+    Returns the normalized float32 reference vector (cached per process),
+    or None if no face is registered.
+    """
+    return embedding_cache.get(attempt_id, _load_face_embedding)
 
-    cur.execute("""
-        SELECT face_embedding
-        FROM exam_attempts
-        WHERE id = %s
-    """, (attempt_id,))
+def _load_face_embedding(attempt_id):
+    ensure_schema()
+
+    with metrics.timed("db_load_face_embedding"), db_cursor() as cur:
+        cur.execute("""
+            SELECT face_embedding_vec, face_embedding
+            FROM exam_attempts
+            WHERE id = %s
+        """, (attempt_id,))
+
+        row = cur.fetchone()
+
+    if not row:
+        return None
 
-    row = cur.fetchone()
+    vector_bytes, legacy_embedding = row
 
-    cur.close()
-    conn.close()
+    if vector_bytes is not None:
+        return unpack_embedding(vector_bytes)
 
-    if row and row[0]:
-        return json.loads(row[0])  # convert JSON string back to list
+    if legacy_embedding:
+        # Old rows: JSON list of floats
+        if isinstance(legacy_embedding, str):
+            legacy_embedding = json.loads(legacy_embedding)
+        return normalize_embedding(legacy_embedding)
 
     return None
 
 def terminate_attempt(attempt_id):
-    conn, cur = get_db()
-
-    cur.execute("""
-        UPDATE exam_attempts
-        SET status = 'TERMINATED',
-            ended_at = %s
-        WHERE id = %s
-    """, (datetime.utcnow(), attempt_id))
-
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
+    with metrics.timed("db_terminate_attempt"), db_cursor(commit=True) as cur:
+        cur.execute("""
+            UPDATE exam_attempts
+            SET status = 'TERMINATED',
+                ended_at = %s
+            WHERE id = %s
+        """, (datetime.utcnow(), attempt_id))
+
+    score_ledger.set_status(attempt_id, "TERMINATED")
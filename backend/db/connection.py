@@ -1,6 +1,196 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool as pg_pool
+
 from config import DATABASE_URL
+from proctoring import metrics
+
+# --------------------------------------------------
+# POOL CONFIG
+# --------------------------------------------------
+
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 20
+POOL_CHECKOUT_TIMEOUT = 10      # seconds to wait for a free connection
+POOL_HEALTHCHECK_IDLE = 30      # ping connections idle longer than this (seconds)
+
+# --------------------------------------------------
+# PROCESS-WIDE POOL
+# --------------------------------------------------
+# Created lazily per process (pid-checked) so forking servers never share
+# sockets between workers. The semaphore makes callers wait for a free
+# connection instead of failing when the pool is saturated.
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+_last_returned = {}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "peak_in_use": 0,
+    "waits": 0,
+    "wait_time_total": 0.0,
+    "wait_time_max": 0.0,
+    "timeouts": 0,
+    "discarded": 0
+}
+
+
+def _get_pool():
+    global _pool, _pool_pid, _slots
+
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pg_pool.ThreadedConnectionPool(
+                POOL_MIN_SIZE, POOL_MAX_SIZE, DATABASE_URL
+            )
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+            _last_returned.clear()
+
+    return _pool
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+
+    idle = time.monotonic() - _last_returned.get(id(conn), time.monotonic())
+    if idle < POOL_HEALTHCHECK_IDLE:
+        return True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    pool = _get_pool()
+    slots = _slots
+
+    start = time.monotonic()
+    if not slots.acquire(timeout=POOL_CHECKOUT_TIMEOUT):
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise pg_pool.PoolError("connection pool exhausted")
+    waited = time.monotonic() - start
+    metrics.observe("db_pool_wait", waited)
+
+    try:
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            pool.putconn(conn, close=True)
+            _last_returned.pop(id(conn), None)
+            with _stats_lock:
+                _stats["discarded"] += 1
+            conn = pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+
+    with _stats_lock:
+        _stats["checkouts"] += 1
+        _stats["in_use"] += 1
+        _stats["peak_in_use"] = max(_stats["peak_in_use"], _stats["in_use"])
+        if waited > 0.001:
+            _stats["waits"] += 1
+        _stats["wait_time_total"] += waited
+        _stats["wait_time_max"] = max(_stats["wait_time_max"], waited)
+
+    return conn, slots
+
+
+def _checkin(conn, slots, broken=False):
+    close = broken or bool(conn.closed)
+
+    try:
+        _get_pool().putconn(conn, close=close)
+    finally:
+        if close:
+            _last_returned.pop(id(conn), None)
+        else:
+            _last_returned[id(conn)] = time.monotonic()
+        slots.release()
+
+        with _stats_lock:
+            _stats["in_use"] -= 1
+            if close:
+                _stats["discarded"] += 1
+
+
+# --------------------------------------------------
+# CONTEXT-MANAGER API
+# --------------------------------------------------
+
+@contextmanager
+def db_cursor(commit=False):
+    """
+    Borrow a pooled connection and yield a cursor.
+
+    with db_cursor(commit=True) as cur:
+        cur.execute(...)
+
+    Commits on success when commit=True, otherwise the transaction is
+    rolled back so the connection goes back to the pool clean.
+    """
+    conn, slots = _checkout()
+    broken = False
+    cur = conn.cursor()
+
+    try:
+        yield cur
+        if commit:
+            conn.commit()
+        else:
+            conn.rollback()
+
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        if not cur.closed:
+            try:
+                cur.close()
+            except psycopg2.Error:
+                broken = True
+        _checkin(conn, slots, broken)
+
+
+# --------------------------------------------------
+# POOL METRICS
+# --------------------------------------------------
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+
+    checkouts = stats["checkouts"]
+    stats["avg_wait_ms"] = round(stats["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0
+    stats["max_wait_ms"] = round(stats.pop("wait_time_max") * 1000, 3)
+    stats.pop("wait_time_total")
+
+    stats["min_size"] = POOL_MIN_SIZE
+    stats["max_size"] = POOL_MAX_SIZE
+    stats["saturation"] = round(stats["in_use"] / POOL_MAX_SIZE, 3)
 
-def get_db():
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn, conn.cursor()
+    return stats
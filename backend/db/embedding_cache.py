@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --------------------------------------------------
+# CACHE CONFIG
+# --------------------------------------------------
+
+EMBEDDING_CACHE_SIZE = 4096     # attempts kept per process
+EMBEDDING_CACHE_TTL = 600       # seconds a stored embedding stays cached
+EMBEDDING_CACHE_MISS_TTL = 5    # seconds a "not registered yet" result stays cached
+
+
+# --------------------------------------------------
+# LRU + TTL CACHE (keyed by attempt_id)
+# --------------------------------------------------
+
+class EmbeddingCache:
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL,
+                 miss_ttl=EMBEDDING_CACHE_MISS_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+
+        self._entries = OrderedDict()   # attempt_id -> (expires_at, vector or None)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, attempt_id, loader):
+        """
+        Returns the cached vector, or calls loader(attempt_id) on a miss.
+        A None result is cached for miss_ttl only.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(attempt_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(attempt_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        vector = loader(attempt_id)
+        self.put(attempt_id, vector)
+        return vector
+
+    def put(self, attempt_id, vector):
+        ttl = self.ttl if vector is not None else self.miss_ttl
+
+        with self._lock:
+            self._entries[attempt_id] = (time.monotonic() + ttl, vector)
+            self._entries.move_to_end(attempt_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, attempt_id):
+        with self._lock:
+            self._entries.pop(attempt_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+embedding_cache = EmbeddingCache()
@@ -1,82 +1,445 @@
-from db.connection import get_db
+import atexit
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
+
+from db.connection import db_cursor
+from db.ledger import score_ledger, CLOSED_STATUSES
+from db.live import live_hub
+from db.migrations import ensure_schema, SchemaOutOfDate
+from proctoring import metrics
+
+
+# ---------------------------------------------------
+# WRITE-BEHIND CONFIG
+# ---------------------------------------------------
+# Events are queued in memory and written by a background flusher in
+# batches: one multi-row INSERT, one aggregated score UPDATE and two
+# upserts into the per-attempt summary tables, in one transaction.
+
+EVENT_FLUSH_INTERVAL_MS = 50     # max time an event waits in the queue
+EVENT_FLUSH_MAX_BATCH = 500      # flush early once this many are queued
+EVENT_FLUSH_RETRIES = 3          # re-queue an event that fails on its own this many times
+EVENT_RETRY_BACKOFF_MAX = 30     # seconds between attempts while the database is unreachable
+EVENT_QUEUE_MAX = 50000          # events held in memory at most; newer ones are dropped
+EVENT_WEIGHTS_TTL = 60           # seconds before event_weights is re-read
+SUMMARY_BUCKET_SECONDS = 60      # sparkline resolution (matches the backfill's minute buckets)
+
+# Written before log_event returns (terminal events)
+SYNC_EVENT_TYPES = {"FACE_MISMATCH"}
+
+# Event types arrive from the browser (/log-event); anything else is rejected
+EVENT_TYPE_PATTERN = re.compile(r"^[A-Z][A-Z0-9_]{0,63}$")
+
+# The database is unreachable (or mid-deploy): keep the whole batch and
+# back off, without using up retries. Any other error is retried row by
+# row, so one bad row can't sink its batch; only such rows are dropped.
+TRANSIENT_ERRORS = (
+    psycopg2.OperationalError, psycopg2.InterfaceError, pg_pool.PoolError, SchemaOutOfDate
+)
+
+
+class EventWriteError(Exception):
+    """A synchronous event could not be written (it stays queued for retry)."""
+
+
+def valid_event_type(event_type):
+    return isinstance(event_type, str) and EVENT_TYPE_PATTERN.match(event_type) is not None
 
 
 # ---------------------------------------------------
-# GET EVENT WEIGHT (Uses existing cursor)
+# EVENT WEIGHTS (cached for EVENT_WEIGHTS_TTL seconds)
+# ---------------------------------------------------
+_weights = {}
+_weights_loaded_at = 0.0
+
+def get_event_weight(event_type):
+    global _weights, _weights_loaded_at
+
+    if time.monotonic() - _weights_loaded_at > EVENT_WEIGHTS_TTL:
+        with db_cursor() as cur:
+            cur.execute("SELECT event_type, weight FROM event_weights")
+            _weights = dict(cur.fetchall())
+        _weights_loaded_at = time.monotonic()
+
+    return _weights.get(event_type, 1)
+
+
+def event_metric_label(event_type):
+    # Metric labels stay bounded: types without a configured weight are "other"
+    return event_type if event_type in _weights else "other"
+
+
 # ---------------------------------------------------
-def get_event_weight(cur, event_type):
-    cur.execute(
-        "SELECT weight FROM event_weights WHERE event_type = %s",
-        (event_type,)
+# EVENT WRITER
+# ---------------------------------------------------
+class EventWriter:
+    def __init__(self):
+        self._queue = deque()    # (attempt_id, event_type, weight, created_at, retries, exam_id)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Backoff while the database is unreachable (background flushes only)
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+        self.flushes = 0
+        self.events_written = 0
+        self.deferred = 0
+
+    def submit(self, event_type, attempt_id, weight, exam_id=None):
+        """Queues one event. Returns False (not queued) when the queue is full."""
+        self._ensure_flusher()
+
+        with self._cond:
+            if len(self._queue) >= EVENT_QUEUE_MAX:
+                return False
+            self._queue.append((attempt_id, event_type, weight, time.time(), 0, exam_id))
+            if len(self._queue) >= EVENT_FLUSH_MAX_BATCH:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """
+        Write everything queued so far, in the calling thread. Returns
+        False if some events failed and were re-queued (or dropped).
+        """
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    if not self._queue:
+                        return True
+                    count = min(len(self._queue), EVENT_FLUSH_MAX_BATCH)
+                    batch = [self._queue.popleft() for _ in range(count)]
+
+                if not self._write_batch(batch):
+                    # Leave re-queued events for the next interval
+                    return False
+
+    def write_now(self, event_type, attempt_id, weight, exam_id=None):
+        """
+        Writes one event before returning, after everything queued before
+        it. Raises EventWriteError if it could not be written.
+        """
+        item = (attempt_id, event_type, weight, time.time(), 0, exam_id)
+        self.flush()
+
+        with self._write_lock:
+            if self._write_batch([item]):
+                return
+
+        raise EventWriteError(f"{event_type} for attempt {attempt_id} was not persisted")
+
+    def pending(self):
+        return len(self._queue)
+
+    # -------------------------------
+    # Background flusher
+    # -------------------------------
+    def _ensure_flusher(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="event-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        interval = EVENT_FLUSH_INTERVAL_MS / 1000.0
+
+        while True:
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._queue) >= EVENT_FLUSH_MAX_BATCH, timeout=interval
+                )
+            try:
+                self.flush()
+            except Exception as e:
+                print("EVENT FLUSH ERROR:", e)
+
+    # -------------------------------
+    # Batch write
+    # -------------------------------
+    def _write_batch(self, batch):
+        """Writes a batch; failed events are re-queued. Returns True if all were written."""
+        try:
+            ids = self._insert(batch)
+        except TRANSIENT_ERRORS as e:
+            self._defer(batch, e)
+            return False
+        except Exception as e:
+            print("LOG EVENT ERROR:", e)
+            if len(batch) == 1:
+                self._requeue(batch)
+                return False
+        else:
+            self._written(batch, ids)
+            return True
+
+        # Write row by row: only the bad rows fail (and use up their retries)
+        failed = []
+        for index, item in enumerate(batch):
+            try:
+                ids = self._insert([item])
+            except TRANSIENT_ERRORS as e:
+                self._defer(batch[index:], e)
+                break
+            except Exception as e:
+                print("LOG EVENT ERROR:", e)
+                failed.append(item)
+            else:
+                self._written([item], ids)
+
+        # In front of any deferred rows, which came after them
+        self._requeue(failed)
+        return False
+
+    def _insert(self, batch):
+        """One transaction for the batch; returns the new event ids."""
+        started = time.perf_counter()
+        ensure_schema()
+
+        # Attempts were validated against the score ledger when queued
+        rows = [item[:4] for item in batch]
+
+        with db_cursor(commit=True) as cur:
+            # -------------------------------
+            # Insert cheating events (multi-row)
+            # -------------------------------
+            ids = execute_values(cur, """
+                INSERT INTO cheating_events (
+                    attempt_id,
+                    event_type,
+                    weight,
+                    created_at
+                )
+                VALUES %s
+                RETURNING id
+            """, rows, template="(%s, %s, %s, to_timestamp(%s))", fetch=True)
+
+            summary, buckets, attempts = summarize_events(rows, [r[0] for r in ids])
+
+            # -------------------------------
+            # Update cheating scores (one per attempt)
+            # -------------------------------
+            execute_values(cur, """
+                UPDATE exam_attempts AS a
+                SET cheating_score = a.cheating_score + v.delta,
+                    last_event_id = GREATEST(a.last_event_id, v.last_id)
+                FROM (VALUES %s) AS v(id, delta, last_id)
+                WHERE a.id = v.id
+            """, attempts)
+
+            # -------------------------------
+            # Per-attempt rollups
+            # -------------------------------
+            execute_values(cur, """
+                INSERT INTO attempt_event_summary AS s (
+                    attempt_id, event_type, event_count, total_weight,
+                    first_at, last_at, last_event_id
+                )
+                VALUES %s
+                ON CONFLICT (attempt_id, event_type) DO UPDATE SET
+                    event_count = s.event_count + EXCLUDED.event_count,
+                    total_weight = s.total_weight + EXCLUDED.total_weight,
+                    first_at = LEAST(s.first_at, EXCLUDED.first_at),
+                    last_at = GREATEST(s.last_at, EXCLUDED.last_at),
+                    last_event_id = GREATEST(s.last_event_id, EXCLUDED.last_event_id)
+            """, summary, template="(%s, %s, %s, %s, to_timestamp(%s), to_timestamp(%s), %s)")
+
+            execute_values(cur, """
+                INSERT INTO attempt_event_buckets AS b (
+                    attempt_id, bucket_start, event_count, total_weight
+                )
+                VALUES %s
+                ON CONFLICT (attempt_id, bucket_start) DO UPDATE SET
+                    event_count = b.event_count + EXCLUDED.event_count,
+                    total_weight = b.total_weight + EXCLUDED.total_weight
+            """, buckets, template="(%s, to_timestamp(%s), %s, %s)")
+
+        self.flushes += 1
+        self.events_written += len(rows)
+        metrics.observe("db_write_batch", time.perf_counter() - started)
+        print(f"[DB LOG] {len(rows)} events | {len(attempts)} attempts")
+        return [r[0] for r in ids]
+
+    def _written(self, batch, ids):
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        live_hub.publish(live_messages(batch, ids))
+
+    def _defer(self, batch, error):
+        # Nothing is counted against the events; the next background
+        # attempt waits twice as long as the last, up to the cap
+        print(f"[DEFERRED] {len(batch)} events, database unavailable:", error)
+        self._backoff = min(
+            EVENT_RETRY_BACKOFF_MAX, max(EVENT_FLUSH_INTERVAL_MS / 1000.0, self._backoff * 2)
+        )
+        self._retry_at = time.monotonic() + self._backoff
+        self.deferred += len(batch)
+
+        with self._cond:
+            self._queue.extendleft(reversed(batch))
+
+    def _requeue(self, batch):
+        retry = []
+        for item in batch:
+            if item[4] < EVENT_FLUSH_RETRIES:
+                retry.append(item[:4] + (item[4] + 1,) + item[5:])
+            else:
+                attempt_id, event_type, weight = item[:3]
+                print(f"[DROPPED] {event_type} | Attempt {attempt_id} after {EVENT_FLUSH_RETRIES} retries")
+                # The ledger counted it when queued; the database never will
+                score_ledger.retract(attempt_id, weight)
+
+        with self._cond:
+            self._queue.extendleft(reversed(retry))
+
+
+def summarize_events(rows, ids):
+    """
+    Aggregates (attempt_id, event_type, weight, created_at) rows and their
+    new ids into summary, minute-bucket and per-attempt upsert rows.
+    """
+    summary = {}
+    buckets = {}
+    attempts = {}
+
+    for (attempt_id, event_type, weight, created_at), event_id in zip(rows, ids):
+        entry = summary.get((attempt_id, event_type))
+        if entry is None:
+            summary[(attempt_id, event_type)] = [1, weight, created_at, created_at, event_id]
+        else:
+            entry[0] += 1
+            entry[1] += weight
+            entry[2] = min(entry[2], created_at)
+            entry[3] = max(entry[3], created_at)
+            entry[4] = max(entry[4], event_id)
+
+        bucket = buckets.setdefault((attempt_id, created_at - created_at % SUMMARY_BUCKET_SECONDS), [0, 0])
+        bucket[0] += 1
+        bucket[1] += weight
+
+        totals = attempts.setdefault(attempt_id, [0, 0])
+        totals[0] += weight
+        totals[1] = max(totals[1], event_id)
+
+    return (
+        [key + tuple(values) for key, values in summary.items()],
+        [key + tuple(values) for key, values in buckets.items()],
+        [(attempt_id,) + tuple(values) for attempt_id, values in attempts.items()]
     )
-    row = cur.fetchone()
-    return row[0] if row else 1
+
+
+event_writer = EventWriter()
+
+# Durable flush on interpreter shutdown
+atexit.register(event_writer.flush)
+
+
+def live_messages(batch, ids):
+    """
+    Live-feed messages for a written batch: each event, then each
+    attempt's score. Times are epoch milliseconds (JavaScript Date).
+    """
+    messages = []
+    scores = {}
+
+    for (attempt_id, event_type, weight, created_at, _, exam_id), event_id in zip(batch, ids):
+        messages.append({
+            "type": "event",
+            "attempt_id": attempt_id,
+            "exam_id": exam_id,
+            "event_id": event_id,
+            "event_type": event_type,
+            "weight": weight,
+            "time": int(created_at * 1000)
+        })
+
+        entry = score_ledger.peek(attempt_id)
+        if entry is not None:
+            scores[attempt_id] = (exam_id, entry.score)
+
+    for attempt_id, (exam_id, score) in scores.items():
+        messages.append({
+            "type": "score",
+            "attempt_id": attempt_id,
+            "exam_id": exam_id,
+            "score": score
+        })
+
+    return messages
 
 
 # ---------------------------------------------------
 # LOG EVENT
 # ---------------------------------------------------
-def log_event(event_type, attempt_id):
-    conn, cur = get_db()
+def log_event(event_type, attempt_id, sync=False):
+    """
+    Adds the event to the score ledger and queues it for the background
+    writer. Terminal events (SYNC_EVENT_TYPES) or sync=True are written
+    before returning; raises EventWriteError if that write fails.
+    """
+    if not valid_event_type(event_type):
+        print(f"[ERROR] Invalid event type {event_type!r}")
+        return
+
+    try:
+        attempt_id = int(attempt_id)
+    except (TypeError, ValueError):
+        print(f"[ERROR] Invalid attempt id {attempt_id!r} for {event_type}")
+        return
 
     try:
         # -------------------------------
         # Validate attempt exists
         # -------------------------------
-        cur.execute(
-            "SELECT status FROM exam_attempts WHERE id = %s",
-            (attempt_id,)
-        )
-        row = cur.fetchone()
+        entry = score_ledger.get(attempt_id)
 
-        if not row:
+        if entry is None:
             print(f"[ERROR] Attempt {attempt_id} not found")
             return
 
-        status = row[0]
-
         # -------------------------------
         # Skip if already closed
         # -------------------------------
-        if status in ("TERMINATED", "COMPLETED"):
-            print(f"[SKIPPED] {event_type} | Attempt {attempt_id} already {status}")
+        if entry.status in CLOSED_STATUSES:
+            print(f"[SKIPPED] {event_type} | Attempt {attempt_id} already {entry.status}")
             return
 
-        # -------------------------------
-        # Get weight (reuse cursor)
-        # -------------------------------
-        weight = get_event_weight(cur, event_type)
+        with metrics.timed("db_event_weight"):
+            weight = get_event_weight(event_type)
 
-        # -------------------------------
-        # Insert cheating event
-        # -------------------------------
-        cur.execute("""
-            INSERT INTO cheating_events (
-                attempt_id,
-                event_type,
-                weight,
-                created_at
-            )
-            VALUES (%s, %s, %s, NOW())
-        """, (attempt_id, event_type, weight))
-
-        # -------------------------------
-        # Update cheating score
-        # -------------------------------
-        cur.execute("""
-            UPDATE exam_attempts
-            SET cheating_score = cheating_score + %s
-            WHERE id = %s
-        """, (weight, attempt_id))
+    except Exception as e:
+        print("LOG EVENT ERROR:", e)
+        return
 
-        conn.commit()
+    score_ledger.add(attempt_id, weight)
+    metrics.EVENTS_LOGGED.labels(event_metric_label(event_type)).inc()
 
-        print(f"[DB LOG] {event_type} (+{weight}) | Attempt {attempt_id}")
+    if sync or event_type in SYNC_EVENT_TYPES:
+        with metrics.timed("db_sync_flush"):
+            event_writer.write_now(event_type, attempt_id, weight, entry.exam_id)
+    elif not event_writer.submit(event_type, attempt_id, weight, entry.exam_id):
+        print(f"[DROPPED] {event_type} | Attempt {attempt_id}, event queue full")
+        score_ledger.retract(attempt_id, weight)
 
-    except Exception as e:
-        conn.rollback()
-        print("LOG EVENT ERROR:", e)
 
-    finally:
-        cur.close()
-        conn.close()
+def flush_events():
+    event_writer.flush()
@@ -0,0 +1,705 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db import connection
+from db.connection import db_cursor
+from db.jobs import PeriodicJob
+from db.live import live_hub
+from db.migrations import ensure_schema
+from proctoring import metrics
+from proctoring.vectors import EMBEDDING_DTYPE, normalize_embedding, unpack_embedding
+
+# --------------------------------------------------
+# FACE INDEX CONFIG
+# --------------------------------------------------
+# Reference embeddings of every attempt registered in the last
+# FACE_INDEX_WINDOW, so one person sitting exams under several user ids
+# can be spotted. Vectors are L2-normalized float32 (proctoring/vectors.py),
+# so similarity to all of them is one matrix product, V @ q.
+#
+# Snapshot: V as one contiguous matrix in vectors.npy, memory-mapped by
+# every process on the host (the page cache holds a single copy). It is
+# rebuilt by face_index_job and swapped in through the CURRENT file.
+# Faces registered after the snapshot (by face_registered_at, so late and
+# repeated registrations count too) are fetched into a small in-memory
+# tail keyed by attempt; a tail entry replaces that attempt's snapshot
+# row. Each fetch re-reads the last FACE_INDEX_TAIL_OVERLAP seconds, so a
+# registration committed slightly out of order is not skipped.
+#
+# A host without a snapshot does not load the window inside a request:
+# it builds one in the background and checks the registrations seen
+# meanwhile once it is ready.
+#
+# Past FACE_INDEX_ANN_MIN_SIZE rows the snapshot is also split into
+# inverted lists: spherical k-means centroids, with rows stored sorted by
+# list. A lookup then scans only the FACE_INDEX_NPROBE lists closest to
+# the query. cluster_cohort() always compares exhaustively.
+
+FACE_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "face_index")
+FACE_INDEX_WINDOW = "30 days"
+FACE_INDEX_KEEP = 2                 # snapshots kept on disk (readers may still map the older one)
+FACE_INDEX_RELOAD_CHECK = 5         # seconds between checks for a newer snapshot
+FACE_INDEX_BLOCK_ROWS = 65536       # rows per matrix product (bounds temporaries)
+FACE_INDEX_TAIL_OVERLAP = 30        # seconds re-read on each tail fetch
+FACE_INDEX_DEFERRED_MAX = 1000      # lookups held while a cold host builds its snapshot
+
+FACE_INDEX_ANN_MIN_SIZE = 20000     # build inverted lists from this many rows
+FACE_INDEX_NPROBE = 8               # lists scanned per query
+FACE_INDEX_KMEANS_ITERS = 10
+FACE_INDEX_KMEANS_SAMPLE = 50000    # rows the centroids are trained on
+
+FACE_INDEX_JOB_INTERVAL = 300       # seconds between snapshot rebuilds
+FACE_INDEX_JOB_LOCK_ID = 72003      # per host: each host keeps its own files
+
+PROXY_MATCH_THRESHOLD = 0.30        # cosine distance; stricter than identity checks
+PROXY_MAX_MATCHES = 10              # per lookup, closest first
+
+COHORT_BLOCK_ROWS = 4096
+
+
+# -----------------------------------
+# Matrix search
+# -----------------------------------
+def search_matrix(vectors, queries, min_similarity, block_rows=FACE_INDEX_BLOCK_ROWS):
+    """
+    All (query, row, similarity) with similarity >= min_similarity, as
+    three arrays. `vectors` may be a memmap; it is read block by block.
+    """
+    found_q, found_rows, found_sims = [], [], []
+
+    for start in range(0, len(vectors), block_rows):
+        sims = np.asarray(vectors[start:start + block_rows]) @ queries.T     # (rows, queries)
+        rows, q = np.nonzero(sims >= min_similarity)
+        if rows.size:
+            found_q.append(q)
+            found_rows.append(rows + start)
+            found_sims.append(sims[rows, q])
+
+    if not found_q:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=EMBEDDING_DTYPE)
+    return np.concatenate(found_q), np.concatenate(found_rows), np.concatenate(found_sims)
+
+
+def train_centroids(vectors, nlist, iters=FACE_INDEX_KMEANS_ITERS, sample=FACE_INDEX_KMEANS_SAMPLE):
+    """Spherical k-means on a sample of rows; returns normalized (nlist, dim) centroids."""
+    rng = np.random.default_rng(0)
+    picked = np.sort(rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False))
+    data = np.asarray(vectors[picked])
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        norms = np.linalg.norm(sums, axis=1)
+        filled = norms > 0           # empty lists keep their old centroid
+        centroids[filled] = sums[filled] / norms[filled, None]
+
+    return centroids
+
+
+def assign_lists(vectors, centroids, block_rows=FACE_INDEX_BLOCK_ROWS):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows])
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+# -----------------------------------
+# On-disk snapshot
+# -----------------------------------
+class Snapshot:
+    """One built index: vectors.npy (memory-mapped) plus row metadata."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        count = self.meta["rows"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")[:count]
+        self.attempt_ids = np.load(os.path.join(path, "attempts.npy"))[:count]
+        self.user_ids = np.load(os.path.join(path, "users.npy"))[:count]
+        self.exam_ids = np.load(os.path.join(path, "exams.npy"))[:count]
+        self.registered_until = datetime.fromisoformat(self.meta["registered_until"])
+
+        self.centroids = None
+        self.offsets = None
+        if self.meta["lists"]:
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.offsets = np.load(os.path.join(path, "offsets.npy"))
+
+    def __len__(self):
+        return len(self.attempt_ids)
+
+    def search(self, queries, min_similarity, nprobe=FACE_INDEX_NPROBE):
+        if len(self) == 0:
+            return search_matrix(self.vectors[:0], queries, min_similarity)
+        if self.centroids is None:
+            return search_matrix(self.vectors, queries, min_similarity)
+
+        # Inverted lists: each query scans only its nprobe closest lists
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        found = []
+        for lst in np.unique(probes):
+            q_idx = np.flatnonzero((probes == lst).any(axis=1))
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            q, rows, sims = search_matrix(self.vectors[start:end], queries[q_idx], min_similarity)
+            if rows.size:
+                found.append((q_idx[q], rows + start, sims))
+
+        if not found:
+            return search_matrix(self.vectors[:0], queries, min_similarity)
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+def _stream_rows(cur, sql, params, batch=1000):
+    """(attempt_id, user_id, exam_id, vector) through a server-side cursor."""
+    stream = cur.connection.cursor(name=f"face_rows_{threading.get_ident()}")
+    try:
+        stream.execute(sql, params)
+        while True:
+            rows = stream.fetchmany(batch)
+            if not rows:
+                break
+            for attempt_id, user_id, exam_id, data in rows:
+                yield attempt_id, user_id, exam_id, unpack_embedding(data)
+    finally:
+        stream.close()
+
+
+def build_snapshot(cur, directory=FACE_INDEX_DIR):
+    """
+    Writes a new snapshot of the FACE_INDEX_WINDOW registrations and points
+    CURRENT at it. Returns a summary dict.
+    """
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+
+    # Registrations after the cutoff are left to the tail
+    cur.execute("SELECT LOCALTIMESTAMP")
+    cutoff = cur.fetchone()[0]
+
+    cur.execute("""
+        SELECT COUNT(*)
+        FROM exam_attempts
+        WHERE face_registered_at >= %s - %s::interval
+          AND face_registered_at <= %s
+          AND face_embedding_vec IS NOT NULL
+    """, (cutoff, FACE_INDEX_WINDOW, cutoff))
+    expected = cur.fetchone()[0]
+
+    name = f"snap-{int(time.time() * 1000)}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    attempt_ids, user_ids, exam_ids = [], [], []
+    raw = None
+    rows = 0
+
+    # Rows beyond the counted ones (committed meanwhile) are left to the tail
+    for attempt_id, user_id, exam_id, vector in _stream_rows(cur, """
+        SELECT id, user_id, exam_id, face_embedding_vec
+        FROM exam_attempts
+        WHERE face_registered_at >= %s - %s::interval
+          AND face_registered_at <= %s
+          AND face_embedding_vec IS NOT NULL
+        ORDER BY id
+    """, (cutoff, FACE_INDEX_WINDOW, cutoff)):
+        if rows == expected:
+            break
+        if raw is None:
+            raw = np.lib.format.open_memmap(
+                os.path.join(path, "raw.npy"), mode="w+",
+                dtype=EMBEDDING_DTYPE, shape=(expected, len(vector))
+            )
+        raw[rows] = vector
+        attempt_ids.append(attempt_id)
+        user_ids.append(user_id)
+        exam_ids.append(exam_id)
+        rows += 1
+
+    attempt_ids = np.array(attempt_ids, dtype=np.int64)
+    user_ids = np.array(user_ids, dtype=str)
+    exam_ids = np.array(exam_ids, dtype=str)
+    lists = 0
+
+    if raw is None:
+        np.save(os.path.join(path, "vectors.npy"), np.empty((0, 0), dtype=EMBEDDING_DTYPE))
+    elif rows >= FACE_INDEX_ANN_MIN_SIZE:
+        # ~4 * sqrt(n) lists of a few hundred rows each
+        lists = int(4 * np.sqrt(rows))
+        centroids = train_centroids(raw[:rows], lists)
+        assign = assign_lists(raw[:rows], centroids)
+        order = np.argsort(assign, kind="stable")
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(path, "vectors.npy"), mode="w+",
+            dtype=EMBEDDING_DTYPE, shape=raw[:rows].shape
+        )
+        for start in range(0, rows, FACE_INDEX_BLOCK_ROWS):
+            vectors[start:start + FACE_INDEX_BLOCK_ROWS] = raw[order[start:start + FACE_INDEX_BLOCK_ROWS]]
+        vectors.flush()
+        del vectors
+
+        attempt_ids, user_ids, exam_ids = attempt_ids[order], user_ids[order], exam_ids[order]
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        np.save(os.path.join(path, "offsets.npy"),
+                np.searchsorted(assign[order], np.arange(lists + 1)))
+    else:
+        raw.flush()
+
+    if raw is not None:
+        del raw
+        raw_path = os.path.join(path, "raw.npy")
+        if lists:
+            os.remove(raw_path)
+        else:
+            os.replace(raw_path, os.path.join(path, "vectors.npy"))
+
+    np.save(os.path.join(path, "attempts.npy"), attempt_ids)
+    np.save(os.path.join(path, "users.npy"), user_ids)
+    np.save(os.path.join(path, "exams.npy"), exam_ids)
+
+    meta = {
+        "rows": rows,
+        "registered_until": cutoff.isoformat(),
+        "lists": lists,
+        "window": FACE_INDEX_WINDOW,
+        "built_at": time.time()
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Atomic switch for readers in every process
+    pointer = os.path.join(directory, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    snapshots = sorted(n for n in os.listdir(directory) if n.startswith("snap-"))
+    for old in snapshots[:-FACE_INDEX_KEEP]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+    return {
+        "snapshot": name,
+        "rows": rows,
+        "lists": lists,
+        "build_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+# -----------------------------------
+# Process-wide index (snapshot + tail)
+# -----------------------------------
+class FaceIndex:
+    def __init__(self, directory=FACE_INDEX_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+        self._snapshot = None
+        self._snapshot_name = None
+        self._checked_at = 0.0
+
+        # Registrations newer than the snapshot: attempt_id -> (user_id, exam_id, vector, registered_at)
+        self._tail = {}
+        self._tail_since = None       # newest face_registered_at already fetched
+        self._tail_ids = None
+        self._tail_matrix = None
+
+        # Cold host: background build, and the lookups to redo once it lands
+        self._warming = False
+        self._deferred = []
+
+        self.lookups = 0
+        self.matches = 0
+
+    @property
+    def ready(self):
+        return self._snapshot is not None
+
+    def _reload(self, now, force=False):
+        if not force and now - self._checked_at < FACE_INDEX_RELOAD_CHECK:
+            return
+        self._checked_at = now
+
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return
+        if name == self._snapshot_name:
+            return
+
+        snapshot = Snapshot(os.path.join(self.directory, name))
+        self._snapshot, self._snapshot_name = snapshot, name
+
+        # The snapshot now covers the older part of the tail; entries
+        # inside the overlap may have committed after it was built
+        covered = snapshot.registered_until - timedelta(seconds=FACE_INDEX_TAIL_OVERLAP)
+        self._tail = {
+            attempt_id: row for attempt_id, row in self._tail.items() if row[3] > covered
+        }
+        self._tail_matrix = None
+        if self._tail_since is None or snapshot.registered_until > self._tail_since:
+            self._tail_since = snapshot.registered_until
+
+    def _fetch_tail(self, since):
+        """Registrations after since - FACE_INDEX_TAIL_OVERLAP; runs without self._lock."""
+        with metrics.timed("db_face_index_tail"), db_cursor() as cur:
+            if since is None:
+                # No snapshot on this host yet: only new registrations
+                cur.execute("SELECT LOCALTIMESTAMP")
+                return cur.fetchone()[0], []
+
+            cur.execute("""
+                SELECT id, user_id, exam_id, face_embedding_vec, face_registered_at
+                FROM exam_attempts
+                WHERE face_registered_at > %s
+                  AND face_embedding_vec IS NOT NULL
+            """, (since - timedelta(seconds=FACE_INDEX_TAIL_OVERLAP),))
+            return since, cur.fetchall()
+
+    def _merge_tail(self, since, rows):
+        if self._tail_since is None or since > self._tail_since:
+            self._tail_since = since
+
+        for attempt_id, user_id, exam_id, data, registered_at in rows:
+            current = self._tail.get(attempt_id)
+            if current is not None and current[3] >= registered_at:
+                continue
+            self._tail[attempt_id] = (user_id, exam_id, unpack_embedding(data), registered_at)
+            self._tail_matrix = None
+            if registered_at > self._tail_since:
+                self._tail_since = registered_at
+
+    def lookup(self, vector, exclude_user=None, exclude_attempt=None,
+               max_distance=PROXY_MATCH_THRESHOLD, limit=PROXY_MAX_MATCHES):
+        """
+        Registered faces within max_distance of `vector` (normalized), closest
+        first, skipping exclude_user's attempts.
+        """
+        with self._lock:
+            self._reload(time.time())
+            since = self._tail_since
+
+        since, rows = self._fetch_tail(since)
+
+        with self._lock:
+            self._merge_tail(since, rows)
+            snapshot = self._snapshot
+            if self._tail_matrix is None and self._tail:
+                self._tail_ids = list(self._tail)
+                self._tail_matrix = np.stack([self._tail[a][2] for a in self._tail_ids])
+            tail, tail_ids, tail_matrix = self._tail, self._tail_ids, self._tail_matrix
+
+        query = np.asarray(vector, dtype=EMBEDDING_DTYPE)[None, :]
+        min_similarity = 1.0 - max_distance
+        found = []
+
+        with metrics.timed("face_index_search"):
+            if snapshot is not None:
+                _, rows, sims = snapshot.search(query, min_similarity)
+                found.extend(
+                    (int(snapshot.attempt_ids[r]), str(snapshot.user_ids[r]), str(snapshot.exam_ids[r]), float(s))
+                    for r, s in zip(rows, sims)
+                    # A re-registered attempt is matched on its tail vector only
+                    if int(snapshot.attempt_ids[r]) not in tail
+                )
+            if tail_matrix is not None:
+                _, rows, sims = search_matrix(tail_matrix, query, min_similarity)
+                for r, s in zip(rows, sims):
+                    attempt_id = tail_ids[r]
+                    user_id, exam_id = tail[attempt_id][:2]
+                    found.append((attempt_id, user_id, exam_id, float(s)))
+
+        matches = {}
+        for attempt_id, user_id, exam_id, similarity in found:
+            if attempt_id == exclude_attempt or user_id == exclude_user:
+                continue
+            matches[attempt_id] = {
+                "attempt_id": attempt_id,
+                "user_id": user_id,
+                "exam_id": exam_id,
+                "distance": round(1.0 - similarity, 4)
+            }
+
+        self.lookups += 1
+        self.matches += len(matches)
+        return sorted(matches.values(), key=lambda m: m["distance"])[:limit]
+
+    # -------------------------------
+    # Cold host
+    # -------------------------------
+    def defer(self, attempt_id, embedding):
+        """
+        Holds a lookup until this host has a snapshot and starts building
+        one in the background. Returns False if the backlog is full.
+        """
+        with self._lock:
+            if len(self._deferred) >= FACE_INDEX_DEFERRED_MAX:
+                return False
+            self._deferred.append((attempt_id, embedding))
+            if self._warming:
+                return True
+            self._warming = True
+
+        threading.Thread(target=self._warm, name="face-index-warm", daemon=True).start()
+        return True
+
+    def _warm(self):
+        try:
+            while True:
+                with self._lock:
+                    self._reload(time.time(), force=True)
+                    if self._snapshot is not None:
+                        break
+                try:
+                    # None when another process on this host is building it
+                    built = face_index_job.run_once()
+                except Exception as e:
+                    print("[FACE INDEX] snapshot build failed:", e)
+                    built = None
+                if built is None:
+                    time.sleep(FACE_INDEX_RELOAD_CHECK)
+        finally:
+            with self._lock:
+                deferred, self._deferred = self._deferred, []
+                self._warming = False
+
+        for attempt_id, embedding in deferred:
+            try:
+                flag_near_duplicates(attempt_id, embedding)
+            except Exception as e:
+                print("[FACE INDEX] deferred lookup failed:", e)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "snapshot": self._snapshot_name,
+            "snapshot_rows": len(snapshot) if snapshot is not None else 0,
+            "snapshot_lists": snapshot.meta["lists"] if snapshot is not None else 0,
+            "tail_rows": len(self._tail),
+            "deferred": len(self._deferred),
+            "lookups": self.lookups,
+            "matches": self.matches
+        }
+
+
+face_index = FaceIndex()
+
+face_index_job = PeriodicJob(
+    "face-index", FACE_INDEX_JOB_INTERVAL, build_snapshot, FACE_INDEX_JOB_LOCK_ID, per_host=True
+)
+
+
+# -----------------------------------
+# Flagging
+# -----------------------------------
+def record_matches(cur, pairs, source):
+    """pairs: (attempt_id, matched_attempt_id, distance); stored newer attempt first."""
+    cur.executemany("""
+        INSERT INTO face_matches (attempt_id, matched_attempt_id, distance, source)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (attempt_id, matched_attempt_id)
+        DO UPDATE SET distance = EXCLUDED.distance, source = EXCLUDED.source, created_at = NOW()
+    """, [
+        (max(a, b), min(a, b), float(distance), source)
+        for a, b, distance in pairs
+    ])
+
+
+def flag_near_duplicates(attempt_id, embedding):
+    """
+    Looks the newly registered face up among other users' attempts.
+    Matches are stored in face_matches and pushed to the live feed;
+    the candidate is never told. Returns the matches (none yet while
+    this host's first snapshot is being built).
+    """
+    ensure_schema()
+
+    if not face_index.ready:
+        if not face_index.defer(attempt_id, embedding):
+            print(f"[FACE INDEX] backlog full, attempt {attempt_id} not checked")
+        return []
+
+    with db_cursor() as cur:
+        cur.execute("SELECT user_id, exam_id FROM exam_attempts WHERE id = %s", (attempt_id,))
+        row = cur.fetchone()
+    if not row:
+        return []
+
+    user_id, exam_id = row
+    matches = face_index.lookup(
+        normalize_embedding(embedding), exclude_user=user_id, exclude_attempt=attempt_id
+    )
+    if not matches:
+        return []
+
+    with db_cursor(commit=True) as cur:
+        record_matches(cur, [(attempt_id, m["attempt_id"], m["distance"]) for m in matches], "capture")
+
+    live_hub.publish([{
+        "type": "face_match",
+        "attempt_id": attempt_id,
+        "exam_id": exam_id,
+        "user_id": user_id,
+        "matches": matches
+    }])
+    return matches
+
+
+# -----------------------------------
+# Cohort clustering (batch)
+# -----------------------------------
+def cohort_pairs(vectors, user_ids, max_distance=PROXY_MATCH_THRESHOLD, block_rows=COHORT_BLOCK_ROWS):
+    """(i, j, distance) for every i < j within max_distance whose users differ."""
+    pairs = []
+
+    # Blocked all-pairs: each block of queries against every row after it
+    for start in range(0, len(vectors), block_rows):
+        queries = vectors[start:start + block_rows]
+        q, rows_found, sims = search_matrix(vectors[start:], queries, 1.0 - max_distance)
+        for i, j, similarity in zip(q + start, rows_found + start, sims):
+            if i < j and user_ids[i] != user_ids[j]:
+                pairs.append((int(i), int(j), 1.0 - float(similarity)))
+
+    return pairs
+
+
+def group_pairs(pairs, attempt_ids, user_ids):
+    """Clusters of attempts linked through pairs, largest first."""
+    # Union-find over the linked pairs
+    parent = list(range(len(attempt_ids)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, _ in pairs:
+        parent[root(i)] = root(j)
+
+    groups = {}
+    for i, j, distance in pairs:
+        group = groups.setdefault(root(i), {"members": set(), "pairs": 0, "min_distance": distance})
+        group["members"].update((i, j))
+        group["pairs"] += 1
+        group["min_distance"] = min(group["min_distance"], distance)
+
+    clusters = [
+        {
+            "attempts": sorted(attempt_ids[i] for i in group["members"]),
+            "users": sorted({user_ids[i] for i in group["members"]}),
+            "pairs": group["pairs"],
+            "min_distance": round(group["min_distance"], 4)
+        }
+        for group in groups.values()
+    ]
+    clusters.sort(key=lambda c: (-len(c["users"]), c["min_distance"]))
+    return clusters
+
+
+def cluster_cohort(exam_id=None, since=None, max_distance=PROXY_MATCH_THRESHOLD, record=True):
+    """
+    Compares every registered face of a cohort with every other one and
+    groups attempts linked by near-duplicate faces of different users.
+    Returns the clusters, largest first.
+    """
+    ensure_schema()
+
+    clauses = ["face_embedding_vec IS NOT NULL"]
+    params = []
+    if exam_id is not None:
+        clauses.append("exam_id = %s")
+        params.append(exam_id)
+    if since is not None:
+        clauses.append("started_at >= %s")
+        params.append(since)
+
+    with db_cursor() as cur:
+        rows = list(_stream_rows(cur, f"""
+            SELECT id, user_id, exam_id, face_embedding_vec
+            FROM exam_attempts
+            WHERE {" AND ".join(clauses)}
+            ORDER BY id
+        """, params))
+
+    if len(rows) < 2:
+        return []
+
+    attempt_ids = [row[0] for row in rows]
+    user_ids = [row[1] for row in rows]
+    vectors = np.stack([row[3] for row in rows])
+
+    pairs = cohort_pairs(vectors, user_ids, max_distance)
+    clusters = group_pairs(pairs, attempt_ids, user_ids)
+
+    if record and pairs:
+        with db_cursor(commit=True) as cur:
+            record_matches(cur, [(attempt_ids[i], attempt_ids[j], d) for i, j, d in pairs], "cohort")
+
+    return clusters
+
+
+# -----------------------------------
+# CLI
+# -----------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.face_index", description="Cross-attempt face index")
+    parser.add_argument("--database-url", help="defaults to config.DATABASE_URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("rebuild", help="build a new snapshot of the exam window now")
+    commands.add_parser("stats", help="show the current snapshot")
+
+    cluster = commands.add_parser("cluster", help="group near-duplicate faces across users in a cohort")
+    cluster.add_argument("--exam-id", help="one exam's attempts (default: all)")
+    cluster.add_argument("--since", help="attempts started on or after this date (YYYY-MM-DD)")
+    cluster.add_argument("--max-distance", type=float, default=PROXY_MATCH_THRESHOLD)
+    cluster.add_argument("--no-record", action="store_true", help="don't store pairs in face_matches")
+
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        connection.DATABASE_URL = args.database_url
+
+    if args.command == "rebuild":
+        ensure_schema()
+        with db_cursor(commit=True) as cur:
+            print(json.dumps(build_snapshot(cur)))
+        return 0
+
+    if args.command == "stats":
+        face_index._reload(time.time())
+        print(json.dumps(face_index.stats()))
+        return 0
+
+    if args.command == "cluster":
+        clusters = cluster_cohort(
+            exam_id=args.exam_id,
+            since=args.since,
+            max_distance=args.max_distance,
+            record=not args.no_record
+        )
+        for c in clusters:
+            print(json.dumps(c))
+        print(f"{len(clusters)} clusters", file=sys.stderr)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import socket
+import threading
+import time
+import zlib
+
+from db.connection import db_cursor
+
+# --------------------------------------------------
+# PERIODIC BACKGROUND JOBS
+# --------------------------------------------------
+# Maintenance work that used to run inside request handlers. Each job
+# runs in a daemon thread per process; a Postgres advisory lock makes
+# sure only one process executes a given job at a time. Jobs that
+# maintain local files take a per-host lock instead: one process per
+# machine.
+
+
+def _host_key():
+    # Second half of a two-key advisory lock, as a signed int4
+    return zlib.crc32(socket.gethostname().encode()) - 2 ** 31
+
+
+class PeriodicJob:
+    def __init__(self, name, interval, fn, lock_id, per_host=False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.lock_id = lock_id
+        self._lock_key = (lock_id, _host_key()) if per_host else (lock_id,)
+
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_result = None
+        self.last_duration_ms = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failures += 1
+                print(f"[JOB] {self.name} failed:", e)
+
+    def run_once(self):
+        """Runs the job now unless another process holds its lock."""
+        started = time.perf_counter()
+
+        with db_cursor(commit=True) as cur:
+            cur.execute(
+                "SELECT pg_try_advisory_xact_lock(%s)" if len(self._lock_key) == 1
+                else "SELECT pg_try_advisory_xact_lock(%s, %s)",
+                self._lock_key
+            )
+            if not cur.fetchone()[0]:
+                self.skipped += 1
+                return None
+
+            result = self.fn(cur)
+
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_result = result
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_result": self.last_result,
+            "last_duration_ms": self.last_duration_ms
+        }
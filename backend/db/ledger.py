@@ -0,0 +1,199 @@
+import threading
+import time
+
+from db.connection import db_cursor
+from db.live import live_hub
+from proctoring import metrics
+
+# --------------------------------------------------
+# SCORE THRESHOLDS
+# --------------------------------------------------
+
+SCORE_TERMINATE = 15
+WARNING_TIERS = (
+    (12, "FINAL_WARNING"),
+    (8, "WARNING_YELLOW"),
+    (5, "WARNING")
+)
+
+CLOSED_STATUSES = ("TERMINATED", "COMPLETED")
+
+# --------------------------------------------------
+# LEDGER CONFIG
+# --------------------------------------------------
+
+LEDGER_IDLE_TTL = 3600          # drop entries untouched for this long (seconds)
+LEDGER_SWEEP_INTERVAL = 60      # how often idle entries are swept (seconds)
+
+
+def warning_for(score):
+    for threshold, warning in WARNING_TIERS:
+        if threshold <= score < SCORE_TERMINATE:
+            return warning
+    return None
+
+
+# --------------------------------------------------
+# PER-ATTEMPT SCORE / STATUS LEDGER
+# --------------------------------------------------
+# In-memory copy of exam_attempts.cheating_score/status for this process.
+# Scores are updated as events are logged and persisted by the event
+# writer's batched UPDATE; status changes are written immediately.
+# Entries are (re)loaded from the database on first use, which is how the
+# ledger reconciles after a restart.
+
+class LedgerEntry:
+    __slots__ = ("score", "status", "exam_id", "touched")
+
+    def __init__(self, score, status, exam_id=None):
+        self.score = score
+        self.status = status
+        self.exam_id = exam_id
+        self.touched = time.monotonic()
+
+
+class ScoreLedger:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    # -------------------------------
+    # Load / lookup
+    # -------------------------------
+    def _load(self, attempt_id):
+        with metrics.timed("db_ledger_load"), db_cursor() as cur:
+            cur.execute(
+                "SELECT cheating_score, status, exam_id FROM exam_attempts WHERE id=%s",
+                (attempt_id,)
+            )
+            row = cur.fetchone()
+
+        if not row:
+            return None
+        return LedgerEntry(row[0] or 0, row[1], row[2])
+
+    def get(self, attempt_id):
+        """Entry for the attempt, or None if the attempt does not exist."""
+        self._maybe_sweep()
+
+        entry = self._entries.get(attempt_id)
+        if entry is None:
+            loaded = self._load(attempt_id)
+            if loaded is None:
+                return None
+            with self._lock:
+                entry = self._entries.setdefault(attempt_id, loaded)
+
+        entry.touched = time.monotonic()
+        return entry
+
+    def peek(self, attempt_id):
+        """Cached entry or None; never touches the database."""
+        return self._entries.get(attempt_id)
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def add(self, attempt_id, weight):
+        entry = self.get(attempt_id)
+        if entry is None:
+            return None
+
+        with self._lock:
+            entry.score += weight
+        return entry
+
+    def retract(self, attempt_id, weight):
+        """Takes back a weight whose event was never persisted (cached entries only)."""
+        entry = self.peek(attempt_id)
+        if entry is not None:
+            with self._lock:
+                entry.score -= weight
+
+    def set_status(self, attempt_id, status):
+        entry = self.get(attempt_id)
+        if entry is not None:
+            entry.status = status
+            self._publish_status(attempt_id, entry)
+
+    def forget(self, attempt_id):
+        with self._lock:
+            self._entries.pop(attempt_id, None)
+
+    # -------------------------------
+    # Evaluation (O(1), no DB unless status changes)
+    # -------------------------------
+    def evaluate(self, attempt_id):
+        entry = self.get(attempt_id)
+        if entry is None:
+            return {"status": None, "warning": None}
+
+        admin_status = None
+
+        with self._lock:
+            terminate = entry.score >= SCORE_TERMINATE and entry.status == "ONGOING"
+            if terminate:
+                entry.status = "TERMINATED"
+
+        if terminate and self._persist_termination(attempt_id, entry):
+            admin_status = "TERMINATED"
+            self._publish_status(attempt_id, entry)
+
+        return {
+            "status": admin_status,
+            "warning": warning_for(entry.score)
+        }
+
+    def _persist_termination(self, attempt_id, entry):
+        with metrics.timed("db_persist_termination"), db_cursor(commit=True) as cur:
+            cur.execute("""
+                UPDATE exam_attempts
+                SET status = 'TERMINATED'
+                WHERE id = %s AND status = 'ONGOING'
+            """, (attempt_id,))
+
+            if cur.rowcount == 0:
+                # Changed elsewhere (e.g. flagged); trust the database
+                cur.execute(
+                    "SELECT status FROM exam_attempts WHERE id=%s",
+                    (attempt_id,)
+                )
+                row = cur.fetchone()
+                if row:
+                    entry.status = row[0]
+                return False
+
+        return True
+
+    def _publish_status(self, attempt_id, entry):
+        live_hub.publish([{
+            "type": "status",
+            "attempt_id": attempt_id,
+            "exam_id": entry.exam_id,
+            "status": entry.status,
+            "score": entry.score
+        }])
+
+    # -------------------------------
+    # Housekeeping
+    # -------------------------------
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < LEDGER_SWEEP_INTERVAL:
+            return
+
+        with self._lock:
+            self._last_sweep = now
+            stale = [
+                attempt_id for attempt_id, entry in self._entries.items()
+                if now - entry.touched > LEDGER_IDLE_TTL
+            ]
+            for attempt_id in stale:
+                del self._entries[attempt_id]
+
+    def stats(self):
+        return {"entries": len(self._entries)}
+
+
+score_ledger = ScoreLedger()
@@ -0,0 +1,195 @@
+import itertools
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+
+from config import DATABASE_URL
+
+# --------------------------------------------------
+# LIVE FEED CONFIG
+# --------------------------------------------------
+# Persisted events, score changes and status transitions are pushed to
+# admin dashboards (SSE, see routes/admin.py) through an in-process hub.
+# With several server processes, LIVE_FEED_NOTIFY relays every message
+# through Postgres NOTIFY so each process's hub sees all of them.
+
+LIVE_FEED_NOTIFY = False
+LIVE_FEED_CHANNEL = "proctoring_live"
+LIVE_FEED_QUEUE_SIZE = 500       # per subscriber; oldest messages dropped beyond this
+LIVE_FEED_NOTIFY_MAX_BYTES = 7000   # NOTIFY payloads are capped at 8000 bytes
+
+
+class Subscriber:
+    """One connected dashboard: its filters and a bounded message queue."""
+
+    def __init__(self, exam_id=None, attempt_id=None):
+        self.exam_id = exam_id
+        self.attempt_id = attempt_id
+        self.queue = deque(maxlen=LIVE_FEED_QUEUE_SIZE)
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def matches(self, message):
+        if self.attempt_id is not None and message.get("attempt_id") != self.attempt_id:
+            return False
+        if self.exam_id is not None and message.get("exam_id") != self.exam_id:
+            return False
+        return True
+
+    def push(self, message):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+            self.cond.notify()
+
+    def get(self, timeout):
+        """Next messages (possibly empty after timeout)."""
+        with self.cond:
+            if not self.queue:
+                self.cond.wait(timeout)
+            messages = list(self.queue)
+            self.queue.clear()
+        return messages
+
+
+class LiveHub:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+        self._listener = None
+        self._listener_pid = None
+
+        self.published = 0
+        self.delivered = 0
+
+    # -------------------------------
+    # Subscriptions
+    # -------------------------------
+    def subscribe(self, exam_id=None, attempt_id=None):
+        if LIVE_FEED_NOTIFY:
+            self._ensure_listener()
+
+        subscriber = Subscriber(exam_id, attempt_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    # -------------------------------
+    # Publishing
+    # -------------------------------
+    def publish(self, messages):
+        """Publishes a list of message dicts (each needs a "type")."""
+        if not messages:
+            return
+
+        # Nobody is listening in this process and there is no relay
+        if not LIVE_FEED_NOTIFY and not self._subscribers:
+            return
+
+        stamped = [dict(m, ts=m.get("ts", time.time())) for m in messages]
+        self.published += len(stamped)
+
+        if LIVE_FEED_NOTIFY:
+            try:
+                self._notify(stamped)
+                return
+            except Exception as e:
+                print("LIVE FEED NOTIFY ERROR:", e)
+
+        self._fan_out(stamped)
+
+    def _fan_out(self, messages):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for message in messages:
+            message = dict(message, seq=next(self._seq))
+            for subscriber in subscribers:
+                if subscriber.matches(message):
+                    subscriber.push(message)
+                    self.delivered += 1
+
+    # -------------------------------
+    # LISTEN / NOTIFY relay
+    # -------------------------------
+    def _notify(self, messages):
+        from db.connection import db_cursor
+
+        payloads = []
+        chunk = []
+        size = 2
+        for message in messages:
+            encoded = json.dumps(message, default=str)
+            if chunk and size + len(encoded) + 1 > LIVE_FEED_NOTIFY_MAX_BYTES:
+                payloads.append("[" + ",".join(chunk) + "]")
+                chunk, size = [], 2
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        payloads.append("[" + ",".join(chunk) + "]")
+
+        with db_cursor(commit=True) as cur:
+            for payload in payloads:
+                cur.execute("SELECT pg_notify(%s, %s)", (LIVE_FEED_CHANNEL, payload))
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener_pid == os.getpid() and self._listener.is_alive():
+            return
+
+        with self._lock:
+            if self._listener is None or self._listener_pid != os.getpid() or not self._listener.is_alive():
+                self._listener_pid = os.getpid()
+                self._listener = threading.Thread(
+                    target=self._listen, name="live-feed-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        # Dedicated connection outside the pool: it stays in LISTEN forever
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {LIVE_FEED_CHANNEL}")
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._fan_out(json.loads(notify.payload))
+
+            except Exception as e:
+                print("LIVE FEED LISTENER ERROR:", e)
+                if conn is not None:
+                    conn.close()
+                time.sleep(2)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": sum(s.dropped for s in subscribers),
+            "notify_relay": LIVE_FEED_NOTIFY
+        }
+
+
+live_hub = LiveHub()
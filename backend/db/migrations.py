@@ -0,0 +1,906 @@
+import argparse
+import hashlib
+import inspect
+import json
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from db import connection
+from db.connection import db_cursor
+from db.jobs import PeriodicJob
+
+# --------------------------------------------------
+# VERSIONED MIGRATIONS
+# --------------------------------------------------
+# The whole schema the backend relies on, as an ordered list of
+# migrations recorded in schema_migrations. They are applied at deploy
+# time with `apply`, each in its own transaction, under an advisory lock
+# so two deploys never race. Request paths only call ensure_schema(),
+# which checks that nothing is pending. Migrations are written to also
+# run on databases created before this module existed (tables made by
+# hand, or by the old db/schema.py).
+#
+# Indexes on tables that already hold data are built with CREATE INDEX
+# CONCURRENTLY (wrapped in Concurrently below): those statements run
+# outside the migration's transaction, after its other statements.
+#
+#   python -m db.migrations status
+#   python -m db.migrations apply
+#   python -m db.migrations verify
+#   python -m db.migrations detach --before 2026-01 [--drop]
+
+MIGRATIONS_LOCK_ID = 72000
+SCHEMA_RECHECK_INTERVAL = 10          # seconds between checks while migrations are pending
+PARTITION_COPY_BATCH = 50000          # rows moved per transaction when partitioning
+
+# cheating_events is range-partitioned by month on created_at. Partitions
+# are created ahead of time by the maintenance job; anything outside
+# them lands in cheating_events_default and is moved out once the
+# matching month's partition exists.
+PARTITION_MONTHS_AHEAD = 2
+PARTITION_JOB_INTERVAL = 6 * 3600     # seconds
+PARTITION_JOB_LOCK_ID = 72002
+
+EVENTS_TABLE = "cheating_events"
+DEFAULT_PARTITION = "cheating_events_default"
+PARTITION_NAME = re.compile(r"^cheating_events_y(\d{4})m(\d{2})$")
+
+
+# -----------------------------------
+# Partition helpers
+# -----------------------------------
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{EVENTS_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(cur):
+    """Names of the monthly partitions currently attached, oldest first."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (EVENTS_TABLE,))
+    return sorted(r[0] for r in cur.fetchall() if PARTITION_NAME.match(r[0]))
+
+
+def create_partition(cur, month):
+    """Attaches the partition for one month (no-op if it exists).
+
+    Rows for that month already sitting in the default partition are
+    moved into the new table before it is attached.
+    """
+    name = partition_name(month)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+
+    start, end = month, _add_months(month, 1)
+
+    cur.execute(f"CREATE TABLE {name} (LIKE {EVENTS_TABLE} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE created_at >= %s AND created_at < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (start, end))
+    cur.execute(f"""
+        ALTER TABLE {EVENTS_TABLE}
+        ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)
+    """, (start, end))
+    return True
+
+
+def ensure_partitions(cur, start=None, months_ahead=None):
+    """Creates monthly partitions from `start` (default: this month) up to
+    months_ahead months from now. Returns the number created."""
+    if months_ahead is None:
+        months_ahead = PARTITION_MONTHS_AHEAD
+
+    this_month = _month_start(datetime.now())
+    month = _month_start(start) if start else this_month
+    last = _add_months(this_month, months_ahead)
+
+    # Cover whatever has piled up in the default partition as well
+    cur.execute(f"SELECT MIN(created_at), MAX(created_at) FROM {DEFAULT_PARTITION}")
+    oldest, newest = cur.fetchone()
+    if oldest is not None:
+        month = min(month, _month_start(oldest))
+        last = max(last, _month_start(newest))
+
+    created = 0
+    while month <= last:
+        created += create_partition(cur, month)
+        month = _add_months(month, 1)
+    return created
+
+
+def detach_partitions(cur, before, drop=False):
+    """Detaches (or drops) every monthly partition that ends on or before
+    `before`. Detached tables are left in place for archiving. The
+    per-attempt rollups are kept, so admin summaries still work."""
+    before = _month_start(before)
+    detached = []
+
+    for name in list_partitions(cur):
+        year, month = PARTITION_NAME.match(name).groups()
+        if _add_months(date(int(year), int(month), 1), 1) > before:
+            continue
+        cur.execute(f"ALTER TABLE {EVENTS_TABLE} DETACH PARTITION {name}")
+        if drop:
+            cur.execute(f"DROP TABLE {name}")
+        detached.append(name)
+
+    return detached
+
+
+# -----------------------------------
+# Migrations
+# -----------------------------------
+def _create_events_table(cur):
+    cur.execute(f"""
+        CREATE TABLE {EVENTS_TABLE} (
+            id          BIGSERIAL,
+            attempt_id  INTEGER NOT NULL,
+            event_type  TEXT NOT NULL,
+            weight      INTEGER NOT NULL DEFAULT 1,
+            created_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    # Timelines and the writer's lookups: every partition gets this index
+    cur.execute(f"""
+        CREATE INDEX idx_cheating_events_attempt_created
+        ON {EVENTS_TABLE} (attempt_id, created_at)
+    """)
+    cur.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {EVENTS_TABLE} DEFAULT")
+
+
+def _partition_cheating_events(cur):
+    """Creates cheating_events partitioned by month, converting an existing
+    plain table. The table is swapped first (a brief lock), then the old
+    rows are moved over in batches, one transaction each; an interrupted
+    run resumes where it stopped."""
+    cur.execute("""
+        SELECT c.relkind
+        FROM pg_class c
+        WHERE c.oid = to_regclass(%s)
+    """, (EVENTS_TABLE,))
+    row = cur.fetchone()
+
+    if not row:
+        _create_events_table(cur)
+        ensure_partitions(cur)
+        return
+
+    if row[0] != "p":
+        cur.execute(f"ALTER TABLE {EVENTS_TABLE} RENAME TO cheating_events_legacy")
+        cur.execute("DROP INDEX IF EXISTS idx_cheating_events_attempt_created")
+        _create_events_table(cur)
+
+        cur.execute("SELECT MIN(created_at) FROM cheating_events_legacy")
+        ensure_partitions(cur, start=cur.fetchone()[0])
+
+        # New events get ids above every old one
+        cur.execute(f"""
+            SELECT setval(
+                pg_get_serial_sequence(%s, 'id'),
+                COALESCE((SELECT MAX(id) FROM cheating_events_legacy), 0) + 1,
+                false
+            )
+        """, (EVENTS_TABLE,))
+        cur.connection.commit()
+
+    cur.execute("SELECT to_regclass('cheating_events_legacy')")
+    if cur.fetchone()[0] is None:
+        return
+
+    while True:
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM cheating_events_legacy
+                WHERE id IN (
+                    SELECT id FROM cheating_events_legacy ORDER BY id LIMIT %s
+                )
+                RETURNING id, attempt_id, event_type, weight, created_at
+            )
+            INSERT INTO {EVENTS_TABLE} (id, attempt_id, event_type, weight, created_at)
+            SELECT id, attempt_id, event_type, COALESCE(weight, 1), COALESCE(created_at, NOW())
+            FROM moved
+        """, (PARTITION_COPY_BATCH,))
+        moved = cur.rowcount
+        cur.connection.commit()
+        if moved < PARTITION_COPY_BATCH:
+            break
+
+    cur.execute("DROP TABLE cheating_events_legacy")
+
+
+class Concurrently(str):
+    """A CREATE INDEX CONCURRENTLY IF NOT EXISTS statement (see above)."""
+
+
+# (version, name, SQL statement(s) or a function taking a cursor)
+MIGRATIONS = (
+    (1, "base_tables", (
+        """
+        CREATE TABLE IF NOT EXISTS exam_attempts (
+            id              SERIAL PRIMARY KEY,
+            user_id         TEXT NOT NULL,
+            exam_id         TEXT NOT NULL,
+            status          TEXT NOT NULL DEFAULT 'ONGOING',
+            cheating_score  INTEGER NOT NULL DEFAULT 0,
+            started_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+            ended_at        TIMESTAMP,
+            face_embedding  TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS event_weights (
+            event_type  TEXT PRIMARY KEY,
+            weight      INTEGER NOT NULL
+        )
+        """,
+        # Defaults only; weights tuned in the database are kept
+        """
+        INSERT INTO event_weights (event_type, weight) VALUES
+            ('NO_FACE', 3),
+            ('MULTIPLE_FACES', 5),
+            ('LOOKING_LEFT', 2),
+            ('LOOKING_RIGHT', 2),
+            ('PHONE_DETECTED', 5),
+            ('COPY_PASTE', 4),
+            ('TAB_SWITCH', 3),
+            ('FACE_MISMATCH', 5)
+        ON CONFLICT (event_type) DO NOTHING
+        """
+    )),
+
+    (2, "attempt_columns_and_indexes", (
+        # Normalized float32 face embeddings (see db/attempts.py)
+        """
+        ALTER TABLE exam_attempts
+        ADD COLUMN IF NOT EXISTS face_embedding_vec BYTEA
+        """,
+
+        # Newest event per attempt: version for admin ETags
+        """
+        ALTER TABLE exam_attempts
+        ADD COLUMN IF NOT EXISTS last_event_id BIGINT NOT NULL DEFAULT 0
+        """,
+
+        # Admin listing: keyset pagination, optionally per exam / status
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_started
+        ON exam_attempts (started_at DESC, id DESC)
+        """),
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_exam_started
+        ON exam_attempts (exam_id, started_at DESC, id DESC)
+        """),
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_status_started
+        ON exam_attempts (status, started_at DESC, id DESC)
+        """),
+
+        # Auto-flag job: only open attempts are candidates
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_open
+        ON exam_attempts (started_at)
+        WHERE status = 'ONGOING' AND ended_at IS NULL
+        """)
+    )),
+
+    (3, "partition_cheating_events", _partition_cheating_events),
+
+    # Per-attempt rollups maintained by the event writer (db/events.py),
+    # backfilled from cheating_events when first created
+    (4, "attempt_event_rollups", (
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('attempt_event_summary') IS NULL THEN
+                CREATE TABLE attempt_event_summary (
+                    attempt_id     INTEGER NOT NULL,
+                    event_type     TEXT NOT NULL,
+                    event_count    INTEGER NOT NULL,
+                    total_weight   INTEGER NOT NULL,
+                    first_at       TIMESTAMP NOT NULL,
+                    last_at        TIMESTAMP NOT NULL,
+                    last_event_id  BIGINT NOT NULL,
+                    PRIMARY KEY (attempt_id, event_type)
+                );
+
+                INSERT INTO attempt_event_summary
+                SELECT attempt_id, event_type, COUNT(*), COALESCE(SUM(weight), 0),
+                       MIN(created_at), MAX(created_at), MAX(id)
+                FROM cheating_events
+                GROUP BY attempt_id, event_type;
+
+                UPDATE exam_attempts AS a
+                SET last_event_id = s.last_id
+                FROM (
+                    SELECT attempt_id, MAX(last_event_id) AS last_id
+                    FROM attempt_event_summary
+                    GROUP BY attempt_id
+                ) AS s
+                WHERE a.id = s.attempt_id;
+            END IF;
+        END $$
+        """,
+        # Per-attempt event counts per minute (sparklines)
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('attempt_event_buckets') IS NULL THEN
+                CREATE TABLE attempt_event_buckets (
+                    attempt_id    INTEGER NOT NULL,
+                    bucket_start  TIMESTAMP NOT NULL,
+                    event_count   INTEGER NOT NULL,
+                    total_weight  INTEGER NOT NULL,
+                    PRIMARY KEY (attempt_id, bucket_start)
+                );
+
+                INSERT INTO attempt_event_buckets
+                SELECT attempt_id, date_trunc('minute', created_at), COUNT(*), COALESCE(SUM(weight), 0)
+                FROM cheating_events
+                GROUP BY attempt_id, date_trunc('minute', created_at);
+            END IF;
+        END $$
+        """
+    )),
+
+    # Near-duplicate faces across users (db/face_index.py); the newer
+    # attempt first, so each pair is stored once
+    (5, "face_matches", (
+        """
+        CREATE TABLE IF NOT EXISTS face_matches (
+            attempt_id          INTEGER NOT NULL,
+            matched_attempt_id  INTEGER NOT NULL,
+            distance            REAL NOT NULL,
+            source              TEXT NOT NULL,
+            created_at          TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (attempt_id, matched_attempt_id)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_face_matches_matched
+        ON face_matches (matched_attempt_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_face_matches_created
+        ON face_matches (created_at DESC)
+        """
+    )),
+
+    # When each face was (re-)registered: the face index tail follows this,
+    # not the attempt id, which is assigned at exam start
+    (6, "face_registered_at", (
+        """
+        ALTER TABLE exam_attempts
+        ADD COLUMN IF NOT EXISTS face_registered_at TIMESTAMP
+        """,
+        """
+        UPDATE exam_attempts
+        SET face_registered_at = started_at
+        WHERE face_embedding_vec IS NOT NULL
+          AND face_registered_at IS NULL
+        """,
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_face_registered
+        ON exam_attempts (face_registered_at)
+        WHERE face_embedding_vec IS NOT NULL
+        """)
+    )),
+
+    # Last frame or event of an attempt (db/attempts.py ActivityTracker):
+    # the auto-flag job only flags open attempts that went quiet
+    (7, "attempt_last_seen", (
+        """
+        ALTER TABLE exam_attempts
+        ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP
+        """,
+        # New attempts start active; existing rows keep NULL until backfilled
+        """
+        ALTER TABLE exam_attempts
+        ALTER COLUMN last_seen_at SET DEFAULT NOW()
+        """,
+        """
+        UPDATE exam_attempts
+        SET last_seen_at = GREATEST(started_at, COALESCE(
+            (SELECT MAX(created_at) FROM cheating_events e WHERE e.attempt_id = exam_attempts.id),
+            started_at
+        ))
+        WHERE status = 'ONGOING'
+          AND ended_at IS NULL
+          AND last_seen_at IS NULL
+        """,
+        Concurrently("""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_exam_attempts_idle
+        ON exam_attempts (last_seen_at)
+        WHERE status = 'ONGOING' AND ended_at IS NULL
+        """)
+    )),
+)
+
+
+def checksum(migration):
+    """Fingerprint of a migration's body, to catch edits after it shipped."""
+    _, _, body = migration
+    if callable(body):
+        text = inspect.getsource(body)
+    elif isinstance(body, str):
+        text = body
+    else:
+        text = "\n;\n".join(body)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INTEGER PRIMARY KEY,
+            name        TEXT NOT NULL,
+            checksum    TEXT NOT NULL,
+            applied_at  TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+@contextmanager
+def _autocommit_cursor():
+    """A pooled cursor outside any transaction (CONCURRENTLY, session locks)."""
+    with db_cursor() as cur:
+        cur.connection.autocommit = True
+        try:
+            yield cur
+        finally:
+            cur.connection.autocommit = False
+
+
+@contextmanager
+def _migration_lock():
+    # Session-level, so migrations may commit in steps while holding it
+    with _autocommit_cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        try:
+            yield
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+
+
+def _create_index_concurrently(cur, statement):
+    # An interrupted CONCURRENTLY build leaves an invalid index behind,
+    # which IF NOT EXISTS would then accept
+    name = re.search(r"IF NOT EXISTS\s+(\w+)", statement).group(1)
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    if row and not row[0]:
+        cur.execute(f"DROP INDEX CONCURRENTLY {name}")
+    cur.execute(statement)
+
+
+def applied_migrations():
+    """{version: (name, checksum, applied_at)} for the connected database."""
+    with db_cursor(commit=True) as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        _ensure_migrations_table(cur)
+        cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {r[0]: r[1:] for r in cur.fetchall()}
+
+
+def apply_migrations(verbose=False):
+    """Applies pending migrations in order. Returns the versions applied."""
+    applied = []
+
+    with _migration_lock():
+        for migration in MIGRATIONS:
+            version, name, body = migration
+            concurrent = []
+
+            with db_cursor(commit=True) as cur:
+                _ensure_migrations_table(cur)
+
+                cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+                if cur.fetchone():
+                    continue
+
+                if callable(body):
+                    body(cur)
+                else:
+                    for statement in (body,) if isinstance(body, str) else body:
+                        if isinstance(statement, Concurrently):
+                            concurrent.append(statement)
+                        else:
+                            cur.execute(statement)
+
+            if concurrent:
+                with _autocommit_cursor() as cur:
+                    for statement in concurrent:
+                        _create_index_concurrently(cur, statement)
+
+            with db_cursor(commit=True) as cur:
+                cur.execute("""
+                    INSERT INTO schema_migrations (version, name, checksum)
+                    VALUES (%s, %s, %s)
+                """, (version, name, checksum(migration)))
+
+            applied.append(version)
+            if verbose:
+                print(f"applied {version:04d} {name}")
+
+    return applied
+
+
+def pending_migrations():
+    """Versions not yet recorded in schema_migrations (read-only)."""
+    with db_cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations')")
+        if cur.fetchone()[0] is None:
+            applied = set()
+        else:
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {r[0] for r in cur.fetchall()}
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+_schema_ready = False
+_schema_checked_at = None
+_schema_pending = []
+
+
+def ensure_schema():
+    """
+    Raises SchemaOutOfDate while migrations are pending. Never applies
+    them: that is `python -m db.migrations apply`, run at deploy. Once
+    the schema is current the check is free; while it is behind the
+    database is asked again every SCHEMA_RECHECK_INTERVAL seconds.
+    """
+    global _schema_ready, _schema_checked_at, _schema_pending
+    if _schema_ready:
+        return
+
+    now = time.monotonic()
+    if _schema_checked_at is None or now - _schema_checked_at >= SCHEMA_RECHECK_INTERVAL:
+        _schema_pending = pending_migrations()
+        _schema_checked_at = now
+        if not _schema_pending:
+            _schema_ready = True
+            return
+
+    raise SchemaOutOfDate(
+        "database schema is behind (pending migrations %s); run `python -m db.migrations apply`"
+        % ", ".join(f"{v:04d}" for v in _schema_pending)
+    )
+
+
+def maintain_partitions(cur):
+    ensure_schema()
+    return ensure_partitions(cur)
+
+
+partition_job = PeriodicJob(
+    "partition-maintenance", PARTITION_JOB_INTERVAL, maintain_partitions, PARTITION_JOB_LOCK_ID
+)
+
+
+# -----------------------------------
+# Verification: indexes and query plans
+# -----------------------------------
+EXPECTED_INDEXES = (
+    ("exam_attempts", "idx_exam_attempts_started"),
+    ("exam_attempts", "idx_exam_attempts_exam_started"),
+    ("exam_attempts", "idx_exam_attempts_status_started"),
+    ("exam_attempts", "idx_exam_attempts_open"),
+    ("exam_attempts", "idx_exam_attempts_face_registered"),
+    ("exam_attempts", "idx_exam_attempts_idle"),
+    ("cheating_events", "idx_cheating_events_attempt_created"),
+    ("face_matches", "idx_face_matches_matched"),
+    ("face_matches", "idx_face_matches_created"),
+)
+
+# The hot read and write paths (same shape as the queries in routes/admin.py,
+# db/events.py and db/attempts.py). Each check: no sequential scan on the
+# listed tables (partitions included), the named index if one is given,
+# and optionally no Sort node, i.e. the index supplies the ORDER BY.
+PLAN_CHECKS = (
+    {
+        "name": "admin attempts page",
+        "sql": """
+            SELECT id, user_id, exam_id, cheating_score, status, started_at
+            FROM exam_attempts
+            WHERE (started_at, id) < (%s, %s)
+            ORDER BY started_at DESC, id DESC
+            LIMIT 51
+        """,
+        "params": (datetime(2100, 1, 1), 0),
+        "tables": ("exam_attempts",),
+        "index": "idx_exam_attempts_started",
+        "no_sort": True
+    },
+    {
+        "name": "admin attempts by exam",
+        "sql": """
+            SELECT id, user_id, exam_id, cheating_score, status, started_at
+            FROM exam_attempts
+            WHERE exam_id = %s
+            ORDER BY started_at DESC, id DESC
+            LIMIT 51
+        """,
+        "params": ("exam",),
+        "tables": ("exam_attempts",),
+        "index": "idx_exam_attempts_exam_started",
+        "no_sort": True
+    },
+    {
+        "name": "admin attempts by status",
+        "sql": """
+            SELECT id, user_id, exam_id, cheating_score, status, started_at
+            FROM exam_attempts
+            WHERE status = %s
+            ORDER BY started_at DESC, id DESC
+            LIMIT 51
+        """,
+        "params": ("FLAGGED",),
+        "tables": ("exam_attempts",),
+        "index": "idx_exam_attempts_status_started",
+        "no_sort": True
+    },
+    {
+        "name": "attempt timeline",
+        "sql": """
+            SELECT event_type, weight, created_at
+            FROM cheating_events
+            WHERE attempt_id = %s
+            ORDER BY created_at
+        """,
+        "params": (0,),
+        "tables": ("cheating_events",),
+        "index": "idx_cheating_events_attempt_created",
+        "no_sort": True
+    },
+    {
+        "name": "attempt summary",
+        "sql": """
+            SELECT bucket_start, event_count, total_weight
+            FROM attempt_event_buckets
+            WHERE attempt_id = %s
+            ORDER BY bucket_start DESC
+            LIMIT 180
+        """,
+        "params": (0,),
+        "tables": ("attempt_event_buckets",),
+        "index": "attempt_event_buckets_pkey",
+        "no_sort": True
+    },
+    {
+        "name": "event writer score update",
+        "sql": """
+            UPDATE exam_attempts AS a
+            SET cheating_score = a.cheating_score + v.delta,
+                last_event_id = GREATEST(a.last_event_id, v.last_id)
+            FROM (VALUES (%s, 1, 1)) AS v(id, delta, last_id)
+            WHERE a.id = v.id
+        """,
+        "params": (0,),
+        "tables": ("exam_attempts",),
+        "index": "exam_attempts_pkey",
+        "no_sort": False
+    },
+    {
+        "name": "auto-flag abandoned attempts",
+        "sql": """
+            UPDATE exam_attempts
+            SET status = 'FLAGGED'
+            WHERE status = 'ONGOING'
+              AND ended_at IS NULL
+              AND last_seen_at < NOW() - %s::interval
+            RETURNING id, exam_id, cheating_score
+        """,
+        "params": ("10 minutes",),
+        "tables": ("exam_attempts",),
+        "index": "idx_exam_attempts_idle",
+        "no_sort": False
+    },
+    {
+        "name": "face index tail",
+        "sql": """
+            SELECT id, user_id, exam_id, face_embedding_vec, face_registered_at
+            FROM exam_attempts
+            WHERE face_registered_at > %s
+              AND face_embedding_vec IS NOT NULL
+        """,
+        "params": (datetime(2100, 1, 1),),
+        "tables": ("exam_attempts",),
+        "index": "idx_exam_attempts_face_registered",
+        "no_sort": False
+    },
+)
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+def _on_table(relation, tables):
+    # Monthly partitions count as their parent table
+    return any(relation == t or relation.startswith(t + "_") for t in tables)
+
+
+def _index_names(cur, index):
+    """The index and, for a partitioned index, its partitions' indexes
+    (the plan names those, e.g. cheating_events_y2026m01_attempt_id_created_at_idx)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (index,))
+    return {index} | {r[0] for r in cur.fetchall()}
+
+
+def explain(cur, sql, params):
+    """Planner output as a flat list of plan nodes.
+
+    Sequential scans are disabled for the EXPLAIN: on a small local
+    database the planner would rightly prefer them, and the question
+    here is whether an index can serve the query at all.
+    """
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute("SET LOCAL enable_bitmapscan = off")
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(_plan_nodes(plan[0]["Plan"]))
+
+
+def check_plan(cur, check):
+    """Problems found in one PLAN_CHECKS entry's plan (empty if fine)."""
+    nodes = explain(cur, check["sql"], check["params"])
+    problems = []
+
+    for node in nodes:
+        relation = node.get("Relation Name", "")
+        if node["Node Type"] == "Seq Scan" and _on_table(relation, check["tables"]):
+            problems.append(f"sequential scan on {relation}")
+
+    if check["index"]:
+        used = {n["Index Name"] for n in nodes if n.get("Index Name")}
+        if check["index"] not in used and not used & _index_names(cur, check["index"]):
+            problems.append(f"expected {check['index']}, used {sorted(used) or 'no index'}")
+
+    if check["no_sort"] and any(n["Node Type"] in ("Sort", "Incremental Sort") for n in nodes):
+        problems.append("explicit sort (index does not supply the order)")
+
+    return problems
+
+
+def verify():
+    """Checks migrations, indexes, partitions and query plans.
+
+    Returns a list of problems; empty means the database is in shape.
+    """
+    problems = []
+    applied = applied_migrations()
+
+    for migration in MIGRATIONS:
+        version, name, _ = migration
+        if version not in applied:
+            problems.append(f"migration {version:04d} {name} not applied")
+        elif applied[version][1] != checksum(migration):
+            problems.append(f"migration {version:04d} {name} changed after it was applied")
+
+    for version in sorted(set(applied) - {m[0] for m in MIGRATIONS}):
+        problems.append(f"unknown migration {version:04d} {applied[version][0]} in database")
+
+    with db_cursor() as cur:
+        cur.execute("SELECT tablename, indexname FROM pg_indexes")
+        indexes = set(cur.fetchall())
+        for table, index in EXPECTED_INDEXES:
+            if (table, index) not in indexes:
+                problems.append(f"missing index {index} on {table}")
+
+        cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (EVENTS_TABLE,))
+        if not cur.fetchone():
+            problems.append(f"{EVENTS_TABLE} is not partitioned")
+        else:
+            partitions = set(list_partitions(cur))
+            this_month = _month_start(datetime.now())
+            for n in range(PARTITION_MONTHS_AHEAD + 1):
+                name = partition_name(_add_months(this_month, n))
+                if name not in partitions:
+                    problems.append(f"missing partition {name}")
+
+            cur.execute(f"SELECT COUNT(*) FROM {DEFAULT_PARTITION}")
+            stray = cur.fetchone()[0]
+            if stray:
+                problems.append(f"{stray} rows in {DEFAULT_PARTITION} (run apply to move them)")
+
+        for check in PLAN_CHECKS:
+            try:
+                for problem in check_plan(cur, check):
+                    problems.append(f"{check['name']}: {problem}")
+            except Exception as e:
+                cur.connection.rollback()
+                problems.append(f"{check['name']}: EXPLAIN failed ({e})")
+
+    return problems
+
+
+# -----------------------------------
+# CLI
+# -----------------------------------
+def _month_arg(value):
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.migrations", description="Schema migrations")
+    parser.add_argument("--database-url", help="defaults to config.DATABASE_URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="list migrations and whether they are applied")
+    commands.add_parser("apply", help="apply pending migrations and create upcoming partitions")
+    commands.add_parser("verify", help="check migrations, indexes, partitions and query plans")
+
+    detach = commands.add_parser("detach", help="detach monthly event partitions")
+    detach.add_argument("--before", type=_month_arg, required=True, help="YYYY-MM; partitions ending by then")
+    detach.add_argument("--drop", action="store_true", help="drop the detached tables")
+
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        connection.DATABASE_URL = args.database_url
+
+    if args.command == "status":
+        applied = applied_migrations()
+        for migration in MIGRATIONS:
+            version, name, _ = migration
+            state = f"applied {applied[version][2]:%Y-%m-%d %H:%M}" if version in applied else "pending"
+            print(f"{version:04d} {name:<32} {state}")
+        return 0
+
+    if args.command == "apply":
+        applied = apply_migrations(verbose=True)
+        with db_cursor(commit=True) as cur:
+            created = ensure_partitions(cur)
+        print(f"{len(applied)} migrations applied, {created} partitions created")
+        return 0
+
+    if args.command == "verify":
+        problems = verify()
+        for problem in problems:
+            print("FAIL", problem)
+        print("OK" if not problems else f"{len(problems)} problems")
+        return 1 if problems else 0
+
+    if args.command == "detach":
+        with db_cursor(commit=True) as cur:
+            names = detach_partitions(cur, args.before, drop=args.drop)
+        print(("dropped " if args.drop else "detached ") + (", ".join(names) or "nothing"))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
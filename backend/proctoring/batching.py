@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# --------------------------------------------------
+# MICRO-BATCHING SCHEDULER
+# --------------------------------------------------
+# Collects single items submitted by concurrent request threads and runs
+# them through one batched call. A batch is dispatched as soon as it holds
+# `max_batch_size` items or the first item has waited `max_wait_ms`.
+
+
+class BatchScheduler:
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name="batch"):
+        """
+        batch_fn: callable(list of items) -> list of results (same order)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    # -------------------------------
+    # Public API
+    # -------------------------------
+    def submit(self, item, timeout=None):
+        """
+        Blocks until the batch containing `item` has run and
+        returns the result for this item.
+        """
+        if self.max_batch_size <= 1 or self.max_wait_ms <= 0:
+            # Batching disabled: run inline, no thread hop
+            result = self.batch_fn([item])[0]
+            self._record(1)
+            return result
+
+        self._ensure_worker()
+
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+                "largest_batch": self._largest_batch,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms
+            }
+
+    # -------------------------------
+    # Worker
+    # -------------------------------
+    def _ensure_worker(self):
+        # Started lazily so forking servers don't inherit a dead thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name=f"{self.name}-scheduler",
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+
+            try:
+                results = list(self.batch_fn(items))
+            except Exception as e:
+                print(f"[{self.name.upper()} BATCH ERROR]", e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            # A short result list must not leave callers waiting forever
+            if len(results) < len(batch):
+                error = RuntimeError(
+                    f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items"
+                )
+                print(f"[{self.name.upper()} BATCH ERROR]", error)
+                for _, future in batch[len(results):]:
+                    future.set_exception(error)
+
+            self._record(len(batch))
+
+    def _record(self, size):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._largest_batch = max(self._largest_batch, size)
@@ -1,38 +1,198 @@
+import os
+import threading
+import time
+
 import cv2
-import mediapipe as mp
 import numpy as np
 
+from proctoring import metrics
+from proctoring.models import models
+
 # --------------------------------------------------
-# MediaPipe Setup (Shared)
+# FACE PRESENCE TIER
 # --------------------------------------------------
+# A cheap detector counts faces on a downscaled frame first. NO_FACE and
+# MULTIPLE_FACES are decided there; the refined FaceMesh only runs when
+# exactly one face is present. None = let FaceMesh decide (old behaviour).
+
+FACE_PRESENCE_TIER = "blazeface"     # "blazeface" | "haar" | None
+FACE_PRESENCE_WIDTH = 320            # frames are downscaled to this width first
 
-mp_face = mp.solutions.face_mesh
-face_mesh = mp_face.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=2,
-    refine_landmarks=True
+HAAR_CASCADE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "haarcascade_frontalface_default.xml"
 )
+HAAR_SCALE_FACTOR = 1.1
+HAAR_MIN_NEIGHBORS = 5
+HAAR_MIN_SIZE = (40, 40)             # at FACE_PRESENCE_WIDTH
+
+# --------------------------------------------------
+# MediaPipe Setup (Shared, built on first use)
+# --------------------------------------------------
+
+def _build_face_mesh():
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=2,
+        refine_landmarks=True
+    )
+
+
+def _build_face_detection():
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(
+        model_selection=0,
+        min_detection_confidence=0.6
+    )
+
+
+def _build_haar():
+    cascade = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
+    if cascade.empty():
+        raise RuntimeError(f"Could not load {HAAR_CASCADE_PATH}")
+    return cascade
+
+
+def _warm_up_mediapipe(graph):
+    graph.process(np.zeros((240, 320, 3), dtype=np.uint8))
+
+
+def _reset_mediapipe(graph):
+    # Drops the tracked face ROI; the next frame runs full detection
+    graph.reset()
+
+
+def _warm_up_haar(cascade):
+    cascade.detectMultiScale(np.zeros((240, 320), dtype=np.uint8))
+
 
-mp_face_detection = mp.solutions.face_detection
-face_detection = mp_face_detection.FaceDetection(
-    model_selection=0,
-    min_detection_confidence=0.6
+# One graph instance per concurrent request (see model_pool.py)
+models.register("face_mesh", _build_face_mesh, _warm_up_mediapipe, pooled=True, reset=_reset_mediapipe)
+models.register("face_detection", _build_face_detection, _warm_up_mediapipe, pooled=True)
+if FACE_PRESENCE_TIER == "haar":
+    models.register("haar", _build_haar, _warm_up_haar, pooled=True)
+
+
+# --------------------------------------------------
+# PER-TIER TIMING
+# --------------------------------------------------
+
+class FaceTierStats:
+    TIERS = ("presence", "detection", "mesh")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = dict.fromkeys(self.TIERS, 0)
+        self.total_ms = dict.fromkeys(self.TIERS, 0.0)
+        self.frames = 0
+        self.mesh_skipped = 0
+
+    def record(self, timings, mesh_skipped):
+        with self._lock:
+            self.frames += 1
+            self.mesh_skipped += mesh_skipped
+            for tier, ms in timings.items():
+                self.calls[tier] += 1
+                self.total_ms[tier] += ms
+
+    def stats(self):
+        with self._lock:
+            return {
+                "presence_tier": FACE_PRESENCE_TIER,
+                "frames": self.frames,
+                "mesh_skipped": self.mesh_skipped,
+                "tiers": {
+                    tier: {
+                        "calls": self.calls[tier],
+                        "avg_ms": round(self.total_ms[tier] / self.calls[tier], 2) if self.calls[tier] else 0
+                    }
+                    for tier in self.TIERS
+                }
+            }
+
+
+face_tier_stats = FaceTierStats()
+
+# --------------------------------------------------
+# KEY LANDMARKS
+# --------------------------------------------------
+# The few mesh points the rules use are copied out of the MediaPipe
+# objects once per frame as nine (x, y) float pairs; head and gaze are
+# then a few scalar operations. For many frames at once (offline
+# analysis), landmark_array() stacks them into a (..., 9, 2) array and
+# both helpers below answer for the whole stack.
+
+KEY_LANDMARKS = (
+    1, 234, 454,       # nose tip, left / right face edge
+    33, 362,           # left corners of both eyes (in image coords)
+    133, 263,          # right corners of both eyes
+    468, 473           # iris centers (refine_landmarks=True)
 )
+NOSE = 0
+FACE_EDGES = (1, 2)
+EYE_LEFT_CORNERS = (3, 4)
+EYE_RIGHT_CORNERS = (5, 6)
+IRISES = (7, 8)
+EYES = tuple(zip(EYE_LEFT_CORNERS, EYE_RIGHT_CORNERS, IRISES))
+
+HEAD_YAW_THRESHOLD = 0.06      # nose offset from the face midline, relative coords
+GAZE_LEFT_RATIO = 0.35         # iris position across the eye, 0 = left corner
+GAZE_RIGHT_RATIO = 0.65
+
+
+def landmark_points(landmarks):
+    """One frame's KEY_LANDMARKS as a tuple of (x, y) pairs."""
+    return tuple([(landmarks[i].x, landmarks[i].y) for i in KEY_LANDMARKS])
+
+
+def landmark_array(frames):
+    """Stacks landmark_points() of several frames into an (n, 9, 2) array."""
+    return np.array(frames, dtype=np.float32).reshape(-1, len(KEY_LANDMARKS), 2)
+
+
+def head_offsets(points):
+    if not isinstance(points, np.ndarray):
+        return points[NOSE][0] - (points[FACE_EDGES[0]][0] + points[FACE_EDGES[1]][0]) / 2
+
+    x = points[..., 0]
+    return x[..., NOSE] - x[..., FACE_EDGES].mean(axis=-1)
+
+
+def gaze_ratios(points):
+    """Iris position across the eye, averaged over both eyes (0.5 = center)."""
+    if not isinstance(points, np.ndarray):
+        total = 0.0
+        count = 0
+        for left, right, iris in EYES:
+            left_x = points[left][0]
+            width = points[right][0] - left_x
+            if width > 0:
+                total += (points[iris][0] - left_x) / width
+                count += 1
+        return total / count if count else 0.5
+
+    x = points[..., 0]
+    left = x[..., EYE_LEFT_CORNERS]
+    width = x[..., EYE_RIGHT_CORNERS] - left
+
+    valid = width > 0
+    ratios = np.divide(x[..., IRISES] - left, width, out=np.zeros_like(width), where=valid)
+    count = valid.sum(axis=-1)
+
+    return np.where(count > 0, ratios.sum(axis=-1) / np.maximum(count, 1), 0.5)
+
 
 # --------------------------------------------------
 # HEAD MOVEMENT ANALYSIS
 # --------------------------------------------------
 
-def analyze_head_direction(landmarks):
-    nose_x = landmarks[1].x
-    left = landmarks[234].x
-    right = landmarks[454].x
+def analyze_head_direction(points):
+    offset = head_offsets(points)
 
-    offset = nose_x - ((left + right) / 2)
-
-    if offset > 0.06:
+    if offset > HEAD_YAW_THRESHOLD:
         return "LEFT", "LOOKING_LEFT"
-    if offset < -0.06:
+    if offset < -HEAD_YAW_THRESHOLD:
         return "RIGHT", "LOOKING_RIGHT"
 
     return "CENTER", None
@@ -42,100 +202,241 @@ def analyze_head_direction(landmarks):
 # EYE GAZE ANALYSIS
 # --------------------------------------------------
 
-def analyze_eye_gaze(landmarks):
-    # Left eye
-    left_corner = landmarks[33]
-    right_corner = landmarks[133]
-    iris = landmarks[468]  # left iris center
-
-    eye_width = right_corner.x - left_corner.x
-    if eye_width == 0:
-        return "CENTER", None
+def analyze_eye_gaze(points):
+    iris_position = gaze_ratios(points)
 
-    iris_position = (iris.x - left_corner.x) / eye_width
-
-    if iris_position < 0.35:
+    if iris_position < GAZE_LEFT_RATIO:
         return "LEFT", "GAZE_LEFT"
-    elif iris_position > 0.65:
+    elif iris_position > GAZE_RIGHT_RATIO:
         return "RIGHT", "GAZE_RIGHT"
 
     return "CENTER", None
 
 
 # --------------------------------------------------
-# FULL FACE ANALYSIS (HEAD + GAZE)
+# SHARED PER-FRAME ANALYSIS
 # --------------------------------------------------
+# Converts the frame to RGB once and runs each model at most once,
+# no matter how many results (head, gaze, face count, crop, landmarks)
+# are read from it. Model time per tier is collected in `timings`.
 
-def analyze_face(frame):
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = face_mesh.process(rgb)
+_UNSET = object()
 
-    if not result.multi_face_landmarks:
-        return {
-            "faces": 0,
-            "direction": "NONE",
-            "event": "NO_FACE",
-            "gaze": "NONE"
-        }
 
-    if len(result.multi_face_landmarks) > 1:
+def _no_face_result():
+    return {
+        "faces": 0,
+        "direction": "NONE",
+        "event": "NO_FACE",
+        "gaze": "NONE"
+    }
+
+
+def _multiple_faces_result(count):
+    return {
+        "faces": count,
+        "direction": "MULTIPLE",
+        "event": "MULTIPLE_FACES",
+        "gaze": "NONE"
+    }
+
+
+class FrameAnalysis:
+    def __init__(self, frame, affinity=None):
+        self.frame = frame
+        self.affinity = affinity       # e.g. attempt id: keeps FaceMesh tracking per candidate
+        self.timings = {}
+        self._rgb = None
+        self._small = None
+        self._mesh_result = _UNSET
+        self._detection_result = _UNSET
+        self._face_count = _UNSET
+        self._points = _UNSET
+
+    def _run(self, tier, model_name, call, key=None):
+        """Checks out a model instance and times call(instance) under `tier`."""
+        with models.get(model_name).checkout(key) as instance:
+            started = time.perf_counter()
+            result = call(instance)
+            elapsed = time.perf_counter() - started
+        self.timings[tier] = self.timings.get(tier, 0.0) + elapsed * 1000
+        metrics.observe(model_name, elapsed)
+        return result
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def small(self):
+        """Frame downscaled to FACE_PRESENCE_WIDTH (BGR) for the cheap tier."""
+        if self._small is None:
+            h, w = self.frame.shape[:2]
+            if w > FACE_PRESENCE_WIDTH:
+                size = (FACE_PRESENCE_WIDTH, int(h * FACE_PRESENCE_WIDTH / w))
+                self._small = cv2.resize(self.frame, size, interpolation=cv2.INTER_AREA)
+            else:
+                self._small = self.frame
+        return self._small
+
+    @property
+    def mesh_result(self):
+        if self._mesh_result is _UNSET:
+            self._mesh_result = self._run(
+                "mesh", "face_mesh", lambda mesh: mesh.process(self.rgb), self.affinity
+            )
+        return self._mesh_result
+
+    @property
+    def detection_result(self):
+        # Boxes are relative, so BlazeFace can run on the small frame
+        if self._detection_result is _UNSET:
+            small_rgb = cv2.cvtColor(self.small, cv2.COLOR_BGR2RGB)
+            tier = "presence" if FACE_PRESENCE_TIER == "blazeface" else "detection"
+            self._detection_result = self._run(
+                tier, "face_detection", lambda detector: detector.process(small_rgb)
+            )
+        return self._detection_result
+
+    @property
+    def face_count(self):
+        """Face count from the cheap tier, or None when the tier is off."""
+        if self._face_count is _UNSET:
+            if FACE_PRESENCE_TIER == "blazeface":
+                self._face_count = len(self.detection_result.detections or ())
+            elif FACE_PRESENCE_TIER == "haar":
+                gray = cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY)
+                boxes = self._run("presence", "haar", lambda cascade: cascade.detectMultiScale(
+                    gray,
+                    scaleFactor=HAAR_SCALE_FACTOR,
+                    minNeighbors=HAAR_MIN_NEIGHBORS,
+                    minSize=HAAR_MIN_SIZE
+                ))
+                self._face_count = len(boxes)
+            else:
+                self._face_count = None
+        return self._face_count
+
+    @property
+    def landmarks(self):
+        faces = self.mesh_result.multi_face_landmarks
+        return faces[0].landmark if faces else None
+
+    @property
+    def points(self):
+        """KEY_LANDMARKS of the first face as (x, y) pairs, or None."""
+        if self._points is _UNSET:
+            landmarks = self.landmarks
+            self._points = landmark_points(landmarks) if landmarks is not None else None
+        return self._points
+
+    @property
+    def face_center(self):
+        """Nose tip (x, y) in relative coords, used to spot sudden face jumps."""
+        if self.face_count not in (None, 1):
+            return None
+        points = self.points
+        if points is None:
+            return None
+        return points[NOSE]
+
+    # -------------------------------
+    # HEAD + GAZE (same output as analyze_face)
+    # -------------------------------
+    def face_result(self):
+        result = self._face_result()
+        face_tier_stats.record(self.timings, "mesh" not in self.timings)
+        return result
+
+    def _face_result(self):
+        # Cheap tier first: no mesh for empty or crowded frames
+        count = self.face_count
+        if count == 0:
+            return _no_face_result()
+        if count is not None and count > 1:
+            return _multiple_faces_result(count)
+
+        faces = self.mesh_result.multi_face_landmarks
+
+        if not faces:
+            return _no_face_result()
+
+        if len(faces) > 1:
+            return _multiple_faces_result(len(faces))
+
+        points = self.points
+
+        # ---- HEAD ----
+        head_direction, head_event = analyze_head_direction(points)
+
+        # ---- GAZE (both eyes) ----
+        gaze_direction, gaze_event = analyze_eye_gaze(points)
+
+        # Priority: head movement > gaze movement
+        event = head_event if head_event else gaze_event
+
         return {
-            "faces": len(result.multi_face_landmarks),
-            "direction": "MULTIPLE",
-            "event": "MULTIPLE_FACES",
-            "gaze": "NONE"
+            "faces": 1,
+            "direction": head_direction,
+            "gaze": gaze_direction,
+            "event": event
         }
 
-    landmarks = result.multi_face_landmarks[0].landmark
+    # -------------------------------
+    # FACE CROP (same output as extract_face)
+    # -------------------------------
+    def face_box(self):
+        """
+        Returns (box, count): the pixel box (x1, y1, x2, y2) of the single
+        detected face, or (None, count) when there isn't exactly one.
+        """
+        detections = self.detection_result.detections
 
-    # ---- HEAD ----
-    head_direction, head_event = analyze_head_direction(landmarks)
+        if not detections:
+            return None, 0
 
-    # ---- GAZE ----
-    gaze_direction, gaze_event = analyze_eye_gaze(landmarks)
+        if len(detections) > 1:
+            return None, len(detections)
 
-    # Priority: head movement > gaze movement
-    event = head_event if head_event else gaze_event
+        h, w, _ = self.frame.shape
+        bbox = detections[0].location_data.relative_bounding_box
 
-    return {
-        "faces": 1,
-        "direction": head_direction,
-        "gaze": gaze_direction,
-        "event": event
-    }
+        x1 = int(bbox.xmin * w)
+        y1 = int(bbox.ymin * h)
+        x2 = int((bbox.xmin + bbox.width) * w)
+        y2 = int((bbox.ymin + bbox.height) * h)
 
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w, x2), min(h, y2)
 
-# --------------------------------------------------
-# FACE EXTRACTION (Authentication)
-# --------------------------------------------------
+        if x2 <= x1 or y2 <= y1:
+            return None, 0
 
-def extract_face(frame):
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    detection_results = face_detection.process(rgb)
+        return (x1, y1, x2, y2), 1
 
-    if not detection_results.detections:
-        return None, 0, None
+    def face_crop(self):
+        box, count = self.face_box()
 
-    if len(detection_results.detections) > 1:
-        return None, len(detection_results.detections), None
+        if box is None:
+            return None, count, None
 
-    h, w, _ = frame.shape
-    bbox = detection_results.detections[0].location_data.relative_bounding_box
+        x1, y1, x2, y2 = box
+        return self.frame[y1:y2, x1:x2], 1, self.landmarks
 
-    x1 = int(bbox.xmin * w)
-    y1 = int(bbox.ymin * h)
-    x2 = int((bbox.xmin + bbox.width) * w)
-    y2 = int((bbox.ymin + bbox.height) * h)
 
-    x1, y1 = max(0, x1), max(0, y1)
-    x2, y2 = min(w, x2), min(h, y2)
+# --------------------------------------------------
+# FULL FACE ANALYSIS (HEAD + GAZE)
+# --------------------------------------------------
 
-    face_img = frame[y1:y2, x1:x2]
+def analyze_face(frame):
+    return FrameAnalysis(frame).face_result()
 
-    if face_img.size == 0:
-        return None, 0, None
 
-    mesh_results = face_mesh.process(rgb)
-    landmarks = mesh_results.multi_face_landmarks[0].landmark if mesh_results.multi_face_landmarks else None
+# --------------------------------------------------
+# FACE EXTRACTION (Authentication)
+# --------------------------------------------------
 
-    return face_img, 1, landmarks
+def extract_face(frame):
+    return FrameAnalysis(frame).face_crop()
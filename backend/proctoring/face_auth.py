@@ -1,8 +1,9 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
 from numpy.linalg import norm
 
+from proctoring.models import models
+
 # -----------------------------------
 # MODEL CONFIG
 # -----------------------------------
@@ -10,6 +11,24 @@ MODEL_NAME = "Facenet512"     # stable + accurate
 DISTANCE_THRESHOLD = 0.35     # tuned for Facenet512 (strict)
 
 
+def _build_deepface():
+    # Importing DeepFace pulls in TensorFlow; build_model caches the weights
+    from deepface import DeepFace
+    DeepFace.build_model(MODEL_NAME)
+    return DeepFace
+
+
+def _warm_up_deepface(deepface):
+    deepface.represent(
+        img_path=np.zeros((160, 160, 3), dtype=np.uint8),
+        model_name=MODEL_NAME,
+        enforce_detection=False
+    )
+
+
+models.register("facenet", _build_deepface, _warm_up_deepface)
+
+
 # -----------------------------------
 # FACE EMBEDDING
 # -----------------------------------
@@ -17,7 +36,7 @@ def get_face_embedding(face_img):
     try:
         face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
 
-        result = DeepFace.represent(
+        result = models.get("facenet").represent(
             img_path=face_img,
             model_name="Facenet512",
             enforce_detection=False
@@ -44,6 +63,13 @@ def cosine_distance(vec1, vec2):
     return 1 - np.dot(v1, v2) / (norm(v1) * norm(v2))
 
 
+def normalized_distance(ref_vector, live_vector):
+    """
+    Cosine distance for vectors already L2-normalized (see proctoring.vectors).
+    """
+    return 1.0 - float(np.dot(ref_vector, live_vector))
+
+
 def is_face_match(ref_embedding, curr_embedding):
     """
     returns: (is_match: bool, distance: float)
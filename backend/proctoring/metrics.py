@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# --------------------------------------------------
+# METRICS CONFIG
+# --------------------------------------------------
+# Stage timings are sampled per frame: METRICS_SAMPLE_RATE of frames get
+# every stage timed, the rest pay one random() call. Counters are never
+# sampled. Gauges are read from the existing stats() methods at scrape
+# time, so they cost nothing between scrapes. Served on /metrics
+# (routes/metrics.py), per process.
+
+METRICS_ENABLED = True
+METRICS_SAMPLE_RATE = 1.0
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+STAGE_SECONDS = Histogram(
+    "proctoring_stage_seconds",
+    "Time spent in each stage of the frame pipeline and its DB calls",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+FRAMES = Counter(
+    "proctoring_frames_total",
+    "Frames received, by how they were handled",
+    ["result"]
+)
+
+EVENTS_LOGGED = Counter(
+    "proctoring_events_logged_total",
+    "Cheating events accepted by log_event, by event type (\"other\" if it has no weight)",
+    ["event_type"]
+)
+
+
+# -----------------------------------
+# Sampling
+# -----------------------------------
+_local = threading.local()
+_stages = {}
+
+
+def _stage(name):
+    child = _stages.get(name)
+    if child is None:
+        child = _stages[name] = STAGE_SECONDS.labels(name)
+    return child
+
+
+def _roll():
+    return METRICS_ENABLED and (METRICS_SAMPLE_RATE >= 1 or random.random() < METRICS_SAMPLE_RATE)
+
+
+@contextmanager
+def frame():
+    """Marks one frame: all stages timed in this thread share one sampling decision."""
+    previous = getattr(_local, "sampled", None)
+    _local.sampled = _roll()
+    try:
+        yield
+    finally:
+        _local.sampled = previous
+
+
+def sampled():
+    decision = getattr(_local, "sampled", None)
+    return _roll() if decision is None else decision
+
+
+def observe(stage, seconds):
+    if sampled():
+        _stage(stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    if not sampled():
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage(stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def locked(lock, stage="lock_wait"):
+    """Acquires `lock`, recording the wait under `stage`."""
+    if sampled():
+        started = time.perf_counter()
+        lock.acquire()
+        _stage(stage).observe(time.perf_counter() - started)
+    else:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+# -----------------------------------
+# Scrape-time gauges / counters from stats()
+# -----------------------------------
+class StatsCollector:
+    """Turns stats() dictionaries into metrics when /metrics is scraped."""
+
+    def __init__(self):
+        self._sources = []
+        self._failing = set()      # sources whose last call raised (logged once)
+
+    def add(self, name, documentation, fn, kind="gauge"):
+        """fn() returns a number, or a dict of {label value: number} for name's "name" label."""
+        self._sources.append((name, documentation, fn, kind))
+
+    def collect(self):
+        for name, documentation, fn, kind in self._sources:
+            try:
+                value = fn()
+            except Exception as e:
+                if name not in self._failing:
+                    self._failing.add(name)
+                    print(f"[METRICS] {name} not collected:", repr(e))
+                continue
+            self._failing.discard(name)
+
+            family_type = CounterMetricFamily if kind == "counter" else GaugeMetricFamily
+            if isinstance(value, dict):
+                family = family_type(name, documentation, labels=["name"])
+                for label, v in value.items():
+                    family.add_metric([label], v)
+            else:
+                family = family_type(name, documentation, value=value)
+            yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
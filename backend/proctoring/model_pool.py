@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --------------------------------------------------
+# MODEL INSTANCE POOL CONFIG
+# --------------------------------------------------
+# MediaPipe graphs (and YOLO / OpenCV cascades) are stateful and not safe
+# to call from several threads at once. Each pooled model gets up to
+# MODEL_POOL_SIZE instances; a request thread checks one out, uses it
+# alone and returns it. With affinity, a candidate goes back to the
+# instance that saw their previous frame, so FaceMesh tracking state
+# follows one stream instead of jumping between candidates. Stateful
+# models pass reset(instance): whenever an instance is handed to a
+# different key than the one it last served (or to a caller without a
+# key), it is reset first, so one candidate's tracking state never
+# leaks into another's frames.
+
+MODEL_POOL_SIZE = min(os.cpu_count() or 4, 8)
+MODEL_POOL_TIMEOUT = 10         # seconds to wait for a free instance
+MODEL_POOL_AFFINITY = True
+
+
+class ModelPool:
+    def __init__(self, factory, size=None, name="model", affinity=MODEL_POOL_AFFINITY, reset=None):
+        self.factory = factory
+        self.reset = reset
+        self.size = MODEL_POOL_SIZE if size is None else size
+        self.name = name
+        self.affinity = affinity
+
+        self._instances = []       # built lazily, up to size
+        self._idle = []            # indices of free instances
+        self._building = 0
+        self._cond = threading.Condition()
+
+        # key -> instance index, and instance index -> key (at most `size` keys)
+        self._key_to_index = {}
+        self._index_to_key = {}
+        self._served = {}          # instance index -> key of the stream its state belongs to
+
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.affinity_hits = 0
+        self.affinity_misses = 0
+        self.resets = 0
+
+    # -------------------------------
+    # Checkout / return
+    # -------------------------------
+    @contextmanager
+    def checkout(self, key=None, timeout=MODEL_POOL_TIMEOUT):
+        """Yields an instance nobody else is using until the block exits."""
+        index, stale = self._acquire(key, timeout)
+        try:
+            instance = self._instances[index]
+            if stale:
+                self.reset(instance)
+            yield instance
+        finally:
+            with self._cond:
+                self._idle.append(index)
+                self._cond.notify()
+
+    def _acquire(self, key, timeout):
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                index = self._pick(key)
+                if index is not None:
+                    break
+
+                if len(self._instances) + self._building < self.size:
+                    index = self._grow()
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free {self.name} instance within {timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait_ms += (time.monotonic() - started) * 1000
+            if key is not None and self.affinity:
+                self._bind(key, index)
+
+            # A fresh instance has no state; a used one is stale unless it
+            # last served this same key
+            stale = False
+            if self.reset is not None and index in self._served:
+                stale = key is None or self._served[index] != key
+                if stale:
+                    self.resets += 1
+            self._served[index] = key
+
+        return index, stale
+
+    def _pick(self, key):
+        if not self._idle:
+            return None
+
+        if key is not None and self.affinity:
+            preferred = self._key_to_index.get(key)
+            if preferred is not None:
+                if preferred in self._idle:
+                    self.affinity_hits += 1
+                    self._idle.remove(preferred)
+                    return preferred
+                self.affinity_misses += 1
+
+            # Prefer an instance no other candidate is bound to
+            for index in self._idle:
+                if index not in self._index_to_key:
+                    self._idle.remove(index)
+                    return index
+
+        return self._idle.pop()
+
+    def _grow(self):
+        # Called with the condition held; builds outside it
+        self._building += 1
+        self._cond.release()
+        try:
+            instance = self.factory()
+        finally:
+            self._cond.acquire()
+            self._building -= 1
+
+        self._instances.append(instance)
+        return len(self._instances) - 1
+
+    def _bind(self, key, index):
+        previous_key = self._index_to_key.get(index)
+        if previous_key is not None and previous_key != key:
+            self._key_to_index.pop(previous_key, None)
+
+        previous_index = self._key_to_index.get(key)
+        if previous_index is not None and previous_index != index:
+            self._index_to_key.pop(previous_index, None)
+
+        self._key_to_index[key] = index
+        self._index_to_key[index] = key
+
+    # -------------------------------
+    # Warm-up / metrics
+    # -------------------------------
+    def warm_up(self, warmup=None):
+        """Builds every instance and runs warmup(instance) on each."""
+        held = []
+        try:
+            for _ in range(self.size):
+                held.append(self._acquire(None, MODEL_POOL_TIMEOUT)[0])
+            if warmup is not None:
+                for index in held:
+                    warmup(self._instances[index])
+                    if self.reset is not None:
+                        self.reset(self._instances[index])
+        finally:
+            with self._cond:
+                # Warm-up frames belong to no stream: start clean
+                for index in held:
+                    self._served.pop(index, None)
+                self._idle.extend(held)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "built": len(self._instances),
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.total_wait_ms / self.waits, 2) if self.waits else 0,
+                "affinity_hits": self.affinity_hits,
+                "affinity_misses": self.affinity_misses,
+                "resets": self.resets
+            }
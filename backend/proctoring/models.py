@@ -0,0 +1,132 @@
+import threading
+import time
+
+from proctoring.model_pool import ModelPool
+
+# --------------------------------------------------
+# MODEL REGISTRY
+# --------------------------------------------------
+# YOLO, the MediaPipe graphs and Facenet512 are registered here and only
+# built on first use, so processes that never analyze a frame (admin,
+# exam start) don't pay for them. With MODEL_WARMUP the app loads every
+# model and runs one dummy inference at boot; /ready reports when that
+# has finished. Models registered with pooled=True are a ModelPool of
+# instances (see model_pool.py); use models.get(name).checkout().
+
+MODEL_WARMUP = False        # load + dummy inference at boot (in a background thread)
+
+
+class _ModelSlot:
+    __slots__ = ("factory", "warmup", "instance", "lock", "load_ms", "warmup_ms", "error")
+
+    def __init__(self, factory, warmup):
+        self.factory = factory
+        self.warmup = warmup
+        self.instance = None
+        self.lock = threading.Lock()
+        self.load_ms = None
+        self.warmup_ms = None
+        self.error = None
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._slots = {}
+        self._warming = False
+        self._warmed = False
+
+    def register(self, name, factory, warmup=None, pooled=False, reset=None, size=None):
+        """
+        factory() builds the model (heavy imports belong inside it);
+        warmup(model) runs one throwaway inference. reset(instance) clears
+        a pooled model's per-stream state and size caps its instances
+        (default MODEL_POOL_SIZE; see model_pool.py).
+        """
+        if pooled:
+            instance_factory, instance_warmup = factory, warmup
+            factory = lambda: ModelPool(instance_factory, size=size, name=name, reset=reset)
+            warmup = lambda pool: pool.warm_up(instance_warmup)
+
+        self._slots[name] = _ModelSlot(factory, warmup)
+
+    def get(self, name):
+        slot = self._slots[name]
+        if slot.instance is not None:
+            return slot.instance
+
+        with slot.lock:
+            if slot.instance is None:
+                started = time.perf_counter()
+                try:
+                    slot.instance = slot.factory()
+                except Exception as e:
+                    slot.error = repr(e)
+                    raise
+                slot.error = None
+                slot.load_ms = round((time.perf_counter() - started) * 1000, 1)
+                print(f"[MODELS] {name} loaded in {slot.load_ms} ms")
+
+        return slot.instance
+
+    def loaded(self, name):
+        return self._slots[name].instance is not None
+
+    # -------------------------------
+    # Warm-up
+    # -------------------------------
+    def warm_up(self, names=None, background=False):
+        if background:
+            self._warming = True
+            threading.Thread(
+                target=self.warm_up, args=(names,), name="model-warmup", daemon=True
+            ).start()
+            return
+
+        self._warming = True
+        try:
+            for name in names or list(self._slots):
+                slot = self._slots[name]
+                try:
+                    model = self.get(name)
+                    if slot.warmup is not None:
+                        started = time.perf_counter()
+                        slot.warmup(model)
+                        slot.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+                except Exception as e:
+                    slot.error = repr(e)
+                    print(f"[MODELS] warm-up failed for {name}: {e}")
+        finally:
+            self._warming = False
+            self._warmed = True
+
+    def ready(self):
+        """
+        Without warm-up the process is ready immediately (models load on
+        demand); with it, once every model loaded without error.
+        """
+        if self._warming:
+            return False
+        if not self._warmed:
+            return True
+        return all(slot.error is None and slot.instance is not None for slot in self._slots.values())
+
+    def stats(self):
+        report = {}
+        for name, slot in self._slots.items():
+            report[name] = {
+                "loaded": slot.instance is not None,
+                "load_ms": slot.load_ms,
+                "warmup_ms": slot.warmup_ms,
+                "error": slot.error
+            }
+            if isinstance(slot.instance, ModelPool):
+                report[name]["pool"] = slot.instance.stats()
+
+        return {
+            "ready": self.ready(),
+            "warming": self._warming,
+            "models": report
+        }
+
+
+models = ModelRegistry()
@@ -0,0 +1,24 @@
+import cv2
+
+# --------------------------------------------------
+# MOTION GATE CONFIG
+# --------------------------------------------------
+# A tiny grayscale thumbnail is compared with the one from the attempt's
+# last fully analyzed frame. If the scene hasn't changed, the previous
+# model outputs are reused instead of running YOLO/FaceMesh again.
+
+MOTION_THUMB_SIZE = (32, 24)        # (width, height)
+MOTION_DIFF_THRESHOLD = 4.0         # mean absolute gray difference (0-255)
+MOTION_FORCE_EVERY_FRAMES = 5       # full analysis at least every K frames
+MOTION_FORCE_EVERY_SECONDS = 5      # ...and at least every T seconds
+
+
+def frame_thumbnail(frame):
+    small = cv2.resize(frame, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def scene_changed(previous, current):
+    if previous is None or previous.shape != current.shape:
+        return True
+    return float(cv2.absdiff(previous, current).mean()) > MOTION_DIFF_THRESHOLD
@@ -1,13 +1,125 @@
-from ultralytics import YOLO
+import os
+import shutil
 
-model = YOLO("yolo11n.pt")
+import numpy as np
+
+from proctoring.batching import BatchScheduler
+from proctoring.models import models
+
+PHONE_MODEL_PATH = "yolo11n.pt"
 PHONE_CLASS_ID = 67
+PHONE_CONFIDENCE = 0.45
+
+# --------------------------------------------------
+# DETECTOR BACKEND
+# --------------------------------------------------
+# "torch" runs the .pt weights as before. "onnx" / "openvino" run an
+# export of the same weights (created next to PHONE_MODEL_PATH on first
+# use) through ONNX Runtime / OpenVINO on CPU (pip install onnxruntime /
+# openvino; not needed for "torch"). PHONE_INT8 quantizes the
+# export. Only PHONE_CLASS_ID survives NMS, so no other class ever
+# becomes a box. Check a new backend/size with bench/phone_parity.py.
+
+PHONE_BACKEND = "torch"       # "torch" | "onnx" | "openvino"
+PHONE_IMGSZ = 640             # model input size; exports are fixed to it
+PHONE_INT8 = False
+PHONE_INT8_CALIBRATION = "coco8.yaml"   # OpenVINO INT8 calibration data
+
+PHONE_BACKENDS = ("torch", "onnx", "openvino")
+
+# --------------------------------------------------
+# BATCHING CONFIG
+# --------------------------------------------------
+# Frames from concurrent /analyze-frame requests are grouped into one
+# model.predict call. Set PHONE_BATCH_MAX_SIZE = 1 to disable batching.
+
+PHONE_BATCH_MAX_SIZE = 16
+PHONE_BATCH_MAX_WAIT_MS = 10
+
+
+def phone_model_path(backend=PHONE_BACKEND, imgsz=PHONE_IMGSZ, int8=PHONE_INT8):
+    if backend not in PHONE_BACKENDS:
+        raise ValueError(f"Unknown phone detector backend: {backend}")
+
+    if backend == "torch":
+        return PHONE_MODEL_PATH
+
+    stem = os.path.splitext(PHONE_MODEL_PATH)[0]
+    name = f"{stem}_{imgsz}" + ("_int8" if int8 else "")
+
+    if backend == "onnx":
+        return name + ".onnx"
+    return name + "_openvino_model"
+
+
+def export_phone_model(backend=PHONE_BACKEND, imgsz=PHONE_IMGSZ, int8=PHONE_INT8):
+    """Exports PHONE_MODEL_PATH for the backend (once) and returns its path."""
+    target = phone_model_path(backend, imgsz, int8)
+    if backend == "torch" or os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+
+    if backend == "onnx":
+        # Dynamic batch axis so batched frames go through one session.run
+        exported = YOLO(PHONE_MODEL_PATH).export(format="onnx", imgsz=imgsz, dynamic=True)
+
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            os.remove(exported)
+        else:
+            shutil.move(exported, target)
+
+    else:
+        exported = YOLO(PHONE_MODEL_PATH).export(
+            format="openvino", imgsz=imgsz, dynamic=True,
+            int8=int8, data=PHONE_INT8_CALIBRATION if int8 else None
+        )
+        shutil.move(exported, target)
+
+    print(f"[PHONE] exported {backend} model to {target}")
+    return target
+
+
+def load_phone_model(backend=PHONE_BACKEND, imgsz=PHONE_IMGSZ, int8=PHONE_INT8):
+    from ultralytics import YOLO
+    return YOLO(export_phone_model(backend, imgsz, int8), task="detect")
+
+
+def run_phone_model(model, frames, imgsz=PHONE_IMGSZ):
+    results = model.predict(
+        frames,
+        conf=PHONE_CONFIDENCE,
+        imgsz=imgsz,
+        classes=[PHONE_CLASS_ID],
+        verbose=False
+    )
+    # Boxes are already restricted to PHONE_CLASS_ID
+    return [r.boxes is not None and len(r.boxes) > 0 for r in results]
+
+
+def _warm_up_phone_model(model):
+    run_phone_model(model, [np.zeros((480, 640, 3), dtype=np.uint8)])
+
+
+# Frames reach YOLO in batches from phone_scheduler's single thread (the
+# inference workers and rescoring are single-threaded too): one instance
+models.register("yolo", load_phone_model, _warm_up_phone_model, pooled=True, size=1)
+
+
+def detect_phones(frames):
+    with models.get("yolo").checkout() as model:
+        return run_phone_model(model, frames)
+
+
+phone_scheduler = BatchScheduler(
+    detect_phones,
+    max_batch_size=PHONE_BATCH_MAX_SIZE,
+    max_wait_ms=PHONE_BATCH_MAX_WAIT_MS,
+    name="phone"
+)
+
 
 def detect_phone(frame):
-    results = model.predict(frame, conf=0.45, verbose=False)
-    for r in results:
-        if r.boxes:
-            for box in r.boxes:
-                if int(box.cls[0]) == PHONE_CLASS_ID:
-                    return True
-    return False
+    return phone_scheduler.submit(frame)
@@ -0,0 +1,536 @@
+"""
+Offline re-scoring of recorded exam sessions.
+
+Streams stored video or frame archives through the same detectors and
+temporal rules as the live pipeline (proctoring/phone.py,
+proctoring/face.py, ProctorSession.frame_events), with timestamps taken
+from the recording instead of the wall clock. Each attempt runs in a
+worker process; frames are read as a stream and sent to YOLO in
+batches, so memory stays flat however long the footage is.
+
+One input per attempt, named after the attempt id:
+
+    recordings/1234.mp4           any format OpenCV can read
+    recordings/1235/              JPEG frames; epoch-ms names (1718000000000.jpg) are timestamps
+    recordings/1236.zip / .tar    JPEG frames in archive order
+
+    python -m proctoring.rescore recordings/ --workers 8 --out rescored.jsonl
+    python -m proctoring.rescore recordings/1234.mp4 \
+        --set HEAD_DURATION_THRESHOLD=3 --set PHONE_COOLDOWN=5 --compare
+
+Output is one JSON line per attempt: the replayed event timeline, final
+score and status, and with --compare the stored cheating_events counts
+and score next to them.
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+import cv2
+import numpy as np
+
+# --------------------------------------------------
+# RESCORE CONFIG
+# --------------------------------------------------
+
+RESCORE_FPS = 1.0              # live clients send about one frame per second
+RESCORE_BATCH = 16             # frames per YOLO batch (and read-ahead per attempt)
+RESCORE_CLOCK_BASE = 1.0e9     # simulated epoch for recordings without a start time
+
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".avi", ".mkv", ".mov")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Frame names in this range are epoch milliseconds (2001-09 .. 2286-11);
+# other numeric names (0001.jpg, ...) are sequence numbers
+EPOCH_MS_RANGE = (10 ** 12, 10 ** 13)
+
+# Modules whose constants --set may override
+TUNABLE_MODULES = (
+    "proctoring.session",
+    "proctoring.face",
+    "proctoring.face_auth",
+    "proctoring.phone",
+    "proctoring.motion",
+    "db.ledger"
+)
+
+# face_auth.DISTANCE_THRESHOLD only drives is_face_match(); the live
+# identity rule reads FACE_MISMATCH_THRESHOLD, so set both
+LINKED_SETTINGS = {
+    "DISTANCE_THRESHOLD": ("proctoring.session.FACE_MISMATCH_THRESHOLD",)
+}
+
+
+# -----------------------------------
+# Threshold overrides
+# -----------------------------------
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        try:
+            overrides[name.strip()] = json.loads(value)
+        except ValueError:
+            overrides[name.strip()] = value
+    return overrides
+
+
+def apply_overrides(overrides):
+    """Sets NAME or module.NAME constants; raises KeyError for unknown names."""
+    import importlib
+
+    expanded = dict(overrides)
+    for name, value in overrides.items():
+        for linked in LINKED_SETTINGS.get(name.rpartition(".")[2], ()):
+            expanded.setdefault(linked, value)
+
+    for name, value in expanded.items():
+        module_name, _, attr = name.rpartition(".")
+        candidates = [module_name] if module_name else TUNABLE_MODULES
+
+        for candidate in candidates:
+            module = importlib.import_module(candidate)
+            if hasattr(module, attr):
+                setattr(module, attr, value)
+                break
+        else:
+            raise KeyError(f"unknown setting {name}")
+
+
+# -----------------------------------
+# Frame sources (streaming)
+# -----------------------------------
+def _epoch_ms(name):
+    """The epoch-ms timestamp a frame is named after, or None."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if not stem.isdigit():
+        return None
+    value = int(stem)
+    return value if EPOCH_MS_RANGE[0] <= value < EPOCH_MS_RANGE[1] else None
+
+
+def _name_times(names, fps):
+    """Seconds from the start: from the names when all are epoch ms, else index / fps."""
+    stamps = [_epoch_ms(n) for n in names]
+    if stamps and None not in stamps:
+        return [(ms - stamps[0]) / 1000.0 for ms in stamps]
+    return [i / fps for i in range(len(names))]
+
+
+def _subsample(timed_frames, fps):
+    """Keeps one frame per 1/fps seconds of recording."""
+    next_at = 0.0
+    for t, load in timed_frames:
+        if t + 1e-6 < next_at:
+            continue
+        frame = load()
+        if frame is not None:
+            yield t, frame
+        next_at = t + 1.0 / fps
+
+
+def _decode(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def iter_video(path, fps):
+    capture = cv2.VideoCapture(path)
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    next_at = 0.0
+    index = 0
+
+    try:
+        # grab() without retrieve() skips frames without decoding them
+        while capture.grab():
+            t = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 or index / native_fps
+            index += 1
+            if t + 1e-6 < next_at:
+                continue
+            ok, frame = capture.retrieve()
+            if ok:
+                yield t, frame
+            next_at = t + 1.0 / fps
+    finally:
+        capture.release()
+
+
+def iter_directory(path, fps):
+    names = sorted(
+        n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    times = _name_times(names, fps)
+    return _subsample(
+        ((t, lambda n=n: cv2.imread(os.path.join(path, n))) for t, n in zip(times, names)),
+        fps
+    )
+
+
+def iter_zip(path, fps):
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(n for n in archive.namelist() if n.lower().endswith(IMAGE_EXTENSIONS))
+        times = _name_times(names, fps)
+        yield from _subsample(
+            ((t, lambda n=n: _decode(archive.read(n))) for t, n in zip(times, names)),
+            fps
+        )
+
+
+def iter_tar(path, fps):
+    # Stream mode: members are read in archive order, never all at once
+    # The first frame's name decides between epoch-ms and index / fps
+    # times; in ms mode, frames with other names are dropped
+    with tarfile.open(path, "r|*") as archive:
+        first = None
+        index = 0
+        next_at = 0.0
+        for member in archive:
+            if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            ms = _epoch_ms(member.name)
+            if index == 0:
+                first = ms
+            index += 1
+            if first is None:
+                t = (index - 1) / fps
+            elif ms is None:
+                continue
+            else:
+                t = (ms - first) / 1000.0
+            if t + 1e-6 < next_at:
+                continue
+            frame = _decode(archive.extractfile(member).read())
+            if frame is not None:
+                yield t, frame
+            next_at = t + 1.0 / fps
+
+
+def open_source(path, fps):
+    lower = path.lower()
+    if os.path.isdir(path):
+        return iter_directory(path, fps)
+    if lower.endswith(".zip"):
+        return iter_zip(path, fps)
+    if lower.endswith((".tar", ".tar.gz", ".tgz")):
+        return iter_tar(path, fps)
+    return iter_video(path, fps)
+
+
+def attempt_key(path):
+    name = os.path.basename(path.rstrip(os.sep))
+    for ext in (".tar.gz", ".tgz") + VIDEO_EXTENSIONS + (".zip", ".tar"):
+        if name.lower().endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return int(name) if name.isdigit() else name
+
+
+def discover(inputs):
+    """Recording paths, one per attempt."""
+    found = []
+    for path in inputs:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        if not os.path.isdir(path):
+            continue
+
+        entries = sorted(glob.glob(os.path.join(path, "*")))
+        if any(e.lower().endswith(IMAGE_EXTENSIONS) for e in entries):
+            found.append(path)          # a frame directory itself
+            continue
+        for entry in entries:
+            lower = entry.lower()
+            if os.path.isdir(entry) or lower.endswith(VIDEO_EXTENSIONS + (".zip", ".tar", ".tar.gz", ".tgz")):
+                found.append(entry)
+    return found
+
+
+def _chunks(frames, size):
+    chunk = []
+    for item in frames:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------------------
+# Worker
+# -----------------------------------
+def _init_worker(overrides):
+    from proctoring import model_pool
+    from proctoring import metrics
+
+    # One attempt at a time per process: one instance per model
+    model_pool.MODEL_POOL_SIZE = 1
+    metrics.METRICS_ENABLED = False
+    cv2.setNumThreads(1)
+    apply_overrides(overrides)
+
+
+def rescore_attempt(task):
+    """Replays one recording; returns the attempt's result dict."""
+    from db.ledger import SCORE_TERMINATE
+    from proctoring.face import FrameAnalysis
+    from proctoring.face_auth import get_face_embedding, normalized_distance
+    from proctoring.motion import frame_thumbnail
+    from proctoring.phone import detect_phones
+    from proctoring.session import ProctorSession
+    from proctoring.vectors import normalize_embedding
+
+    attempt_id, path, options = task
+    weights = options["weights"]
+    reference = options["reference"]
+    clock = options.get("clock_base") or RESCORE_CLOCK_BASE
+
+    started = time.perf_counter()
+    session = ProctorSession(attempt_id, now=clock)
+
+    score = 0
+    status = "COMPLETED"
+    timeline = []
+    frames = analyzed = identity_checks = 0
+    duration = 0.0
+    latest = None             # (phone_detected, face_result) of the last full analysis
+
+    def embed(analysis):
+        face_img, face_count, _ = analysis.face_crop()
+        if face_count != 1 or face_img is None:
+            return None
+        vector = get_face_embedding(face_img)
+        return normalize_embedding(vector) if vector is not None else None
+
+    try:
+        for chunk in _chunks(open_source(path, options["fps"]), options["batch"]):
+            # Gate decisions only depend on thumbnails and timing, so the
+            # whole chunk is gated first and YOLO batches just the frames
+            # the live pipeline would have analyzed
+            fresh = []
+            for i, (t, frame) in enumerate(chunk):
+                if options["motion_gate"]:
+                    thumb = frame_thumbnail(frame)
+                    if session.cached_analysis(thumb, clock + t) is not None:
+                        continue
+                    session.store_analysis(thumb, True, clock + t)
+                fresh.append(i)
+
+            phones = dict(zip(fresh, detect_phones([chunk[i][1] for i in fresh]))) if fresh else {}
+
+            for i, (t, frame) in enumerate(chunk):
+                now = clock + t
+                frames += 1
+                duration = t
+                distance = None
+
+                if i in phones:
+                    analysis = FrameAnalysis(frame, affinity=attempt_id)
+                    face_result = analysis.face_result()
+                    latest = (phones[i], face_result)
+                    analyzed += 1
+
+                    if reference is None:
+                        if options["reference_mode"] == "first-face" and face_result["faces"] == 1:
+                            reference = embed(analysis)
+                    elif session.identity_check_due(face_result["faces"], analysis.face_center, now):
+                        identity_checks += 1
+                        live = embed(analysis)
+                        if live is not None:
+                            distance = normalized_distance(reference, live)
+
+                phone_detected, face_result = latest
+
+                events, _ = session.frame_events(phone_detected, face_result, distance, now)
+                for event in events:
+                    weight = weights.get(event, 1)
+                    score += weight
+                    timeline.append({
+                        "t": round(t, 2),
+                        "event_type": event,
+                        "weight": weight,
+                        "score": score
+                    })
+
+                if "FACE_MISMATCH" in events or score >= SCORE_TERMINATE:
+                    status = "TERMINATED"
+                    if options["stop_on_terminate"]:
+                        break
+
+            if status == "TERMINATED" and options["stop_on_terminate"]:
+                break
+
+    except Exception as e:
+        return {"attempt_id": attempt_id, "source": path, "error": str(e)}
+
+    elapsed = time.perf_counter() - started
+    return {
+        "attempt_id": attempt_id,
+        "source": path,
+        "frames": frames,
+        "frames_analyzed": analyzed,
+        "identity_checks": identity_checks,
+        "recording_s": round(duration, 1),
+        "wall_s": round(elapsed, 2),
+        "speed_x": round(duration / elapsed, 1) if elapsed else None,
+        "score": score,
+        "status": status,
+        "events": timeline
+    }
+
+
+# -----------------------------------
+# Stored data (optional, needs the database)
+# -----------------------------------
+def load_weights(path):
+    if path:
+        with open(path) as f:
+            return json.load(f)
+
+    from db.connection import db_cursor
+    with db_cursor() as cur:
+        cur.execute("SELECT event_type, weight FROM event_weights")
+        return dict(cur.fetchall())
+
+
+def load_attempt(attempt_id):
+    """(reference embedding, started_at epoch) from exam_attempts."""
+    from db.attempts import get_face_embedding
+    from db.connection import db_cursor
+
+    with db_cursor() as cur:
+        cur.execute("SELECT EXTRACT(EPOCH FROM started_at) FROM exam_attempts WHERE id = %s", (attempt_id,))
+        row = cur.fetchone()
+
+    return get_face_embedding(attempt_id), float(row[0]) if row and row[0] else None
+
+
+def stored_summary(attempt_id):
+    """Counts per event type, score and status as recorded live."""
+    from db.connection import db_cursor
+
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT event_type, COUNT(*)
+            FROM cheating_events
+            WHERE attempt_id = %s
+            GROUP BY event_type
+        """, (attempt_id,))
+        counts = dict(cur.fetchall())
+
+        cur.execute("SELECT cheating_score, status FROM exam_attempts WHERE id = %s", (attempt_id,))
+        row = cur.fetchone()
+
+    return {
+        "score": row[0] if row else None,
+        "status": row[1] if row else None,
+        "event_counts": counts
+    }
+
+
+def compare_result(result, stored):
+    replayed = {}
+    for event in result["events"]:
+        replayed[event["event_type"]] = replayed.get(event["event_type"], 0) + 1
+
+    types = sorted(set(replayed) | set(stored["event_counts"]))
+    return {
+        "stored": stored,
+        "score_delta": result["score"] - (stored["score"] or 0),
+        "event_count_delta": {
+            t: replayed.get(t, 0) - stored["event_counts"].get(t, 0)
+            for t in types
+            if replayed.get(t, 0) != stored["event_counts"].get(t, 0)
+        }
+    }
+
+
+# -----------------------------------
+# CLI
+# -----------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Re-score recorded exam sessions offline")
+    parser.add_argument("inputs", nargs="+", help="recordings, or directories of recordings")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--fps", type=float, default=RESCORE_FPS, help="frames per second replayed")
+    parser.add_argument("--batch", type=int, default=RESCORE_BATCH, help="frames per YOLO batch")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a threshold, e.g. HEAD_DURATION_THRESHOLD=3; "
+                             "DISTANCE_THRESHOLD also sets FACE_MISMATCH_THRESHOLD")
+    parser.add_argument("--weights", help="JSON {event_type: weight}; default: event_weights table")
+    parser.add_argument("--reference", choices=("db", "first-face", "none"), default="db",
+                        help="reference face for identity checks")
+    parser.add_argument("--no-motion-gate", action="store_true", help="analyze every replayed frame")
+    parser.add_argument("--keep-going", action="store_true", help="continue after termination")
+    parser.add_argument("--compare", action="store_true", help="diff against stored cheating_events")
+    parser.add_argument("--out", help="JSON lines output (default: stdout)")
+    args = parser.parse_args()
+
+    overrides = parse_overrides(args.set)
+    try:
+        apply_overrides(overrides)
+    except KeyError as e:
+        sys.exit(str(e))
+
+    paths = discover(args.inputs)
+    if not paths:
+        sys.exit("No recordings found")
+
+    weights = load_weights(args.weights)
+
+    tasks = []
+    for path in paths:
+        attempt_id = attempt_key(path)
+        reference, clock_base = None, None
+        if args.reference == "db" and isinstance(attempt_id, int):
+            reference, clock_base = load_attempt(attempt_id)
+
+        tasks.append((attempt_id, path, {
+            "weights": weights,
+            "reference": reference,
+            "reference_mode": args.reference,
+            "clock_base": clock_base,
+            "fps": args.fps,
+            "batch": args.batch,
+            "motion_gate": not args.no_motion_gate,
+            "stop_on_terminate": not args.keep_going
+        }))
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    started = time.perf_counter()
+    recorded = 0.0
+    failures = 0
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(args.workers, initializer=_init_worker, initargs=(overrides,)) as pool:
+        for result in pool.imap_unordered(rescore_attempt, tasks):
+            if "error" in result:
+                failures += 1
+            else:
+                recorded += result["recording_s"]
+                if args.compare and isinstance(result["attempt_id"], int):
+                    result.update(compare_result(result, stored_summary(result["attempt_id"])))
+
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"[RESCORE] {len(tasks)} attempts, {recorded / 3600:.2f} h of footage in {elapsed:.1f} s "
+        f"({recorded / elapsed if elapsed else 0:.0f}x real time), {failures} failed",
+        file=sys.stderr
+    )
+
+    if out is not sys.stdout:
+        out.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import sys
+import threading
+import time
+
+from proctoring.motion import (
+    scene_changed,
+    MOTION_FORCE_EVERY_FRAMES,
+    MOTION_FORCE_EVERY_SECONDS
+)
+from proctoring.window import RollingWindow, RuleSet, TemporalRule
+
+# =================================================
+# CONFIGURATION
+# =================================================
+
+NO_FACE_THRESHOLD = 3
+NO_FACE_TIME_WINDOW = 8
+
+PHONE_DURATION_THRESHOLD = 3
+PHONE_COOLDOWN = 8
+
+MULTIPLE_FACES_DURATION_THRESHOLD = 2
+MULTIPLE_FACES_COOLDOWN = 8
+
+HEAD_DURATION_THRESHOLD = 2
+HEAD_COOLDOWN = 5
+
+FACE_MISMATCH_THRESHOLD = 0.35
+FACE_MISMATCH_CONSECUTIVE = 3
+
+# Identity schedule: Facenet512 runs every IDENTITY_CHECK_INTERVAL seconds,
+# or on every frame for the next IDENTITY_ESCALATION_CHECKS checks after a
+# trigger (face count change, face jump, borderline/mismatching distance).
+IDENTITY_CHECK_INTERVAL = 12
+IDENTITY_ESCALATION_CHECKS = 3
+IDENTITY_BORDERLINE_MARGIN = 0.08
+IDENTITY_JUMP_THRESHOLD = 0.15     # nose movement in relative frame coords
+
+SESSION_IDLE_TTL = 300          # evict sessions with no frames for this long (seconds)
+SESSION_STRIPES = 64            # lock stripes in the registry
+
+
+# =================================================
+# TEMPORAL RULES (see proctoring/window.py)
+# =================================================
+# Channel codes pushed for every frame; 0 is the neutral state. Gaze is
+# reported to the client but not scored.
+
+PHONE, FACES, HEAD = range(3)
+
+FACES_CODES = {"NO_FACE": 1, "MULTIPLE_FACES": 2}
+HEAD_CODES = {"LOOKING_LEFT": 1, "LOOKING_RIGHT": 2}
+
+_rule_set = None
+
+
+def temporal_rules():
+    """Built on first use, so thresholds changed at startup are picked up."""
+    global _rule_set
+    if _rule_set is None:
+        _rule_set = RuleSet([
+            TemporalRule("PHONE_DETECTED", PHONE, 1, PHONE_DURATION_THRESHOLD, PHONE_COOLDOWN, 1),
+            # Repeats every NO_FACE_THRESHOLD frames once the window has passed
+            TemporalRule("NO_FACE", FACES, 1, NO_FACE_TIME_WINDOW, 0, NO_FACE_THRESHOLD),
+            TemporalRule("MULTIPLE_FACES", FACES, 2,
+                         MULTIPLE_FACES_DURATION_THRESHOLD, MULTIPLE_FACES_COOLDOWN, 1),
+            TemporalRule("LOOKING_LEFT", HEAD, 1, HEAD_DURATION_THRESHOLD, HEAD_COOLDOWN, 1),
+            TemporalRule("LOOKING_RIGHT", HEAD, 2, HEAD_DURATION_THRESHOLD, HEAD_COOLDOWN, 1)
+        ], channels=3)
+    return _rule_set
+
+
+# =================================================
+# PER-ATTEMPT SESSION
+# =================================================
+# All timer/counter state for one candidate. The rule methods take `now`
+# explicitly and return the event to log (or None); they never touch the
+# database, so they can also be driven with simulated timestamps.
+
+class ProctorSession:
+    __slots__ = (
+        "attempt_id", "lock", "last_seen", "window",
+        "face_mismatch_counter", "identity_warning_issued",
+        "last_thumb", "last_analysis", "last_full_at", "frames_since_full",
+        "frames_analyzed", "frames_skipped",
+        "last_face_count", "last_face_center", "identity_last_check",
+        "identity_escalation", "identity_checks", "identity_skipped"
+    )
+
+    def __init__(self, attempt_id, now=None):
+        now = time.time() if now is None else now
+
+        self.attempt_id = attempt_id
+        self.lock = threading.Lock()
+        self.last_seen = now
+        self.window = RollingWindow(temporal_rules())
+
+        self.face_mismatch_counter = 0
+        self.identity_warning_issued = False
+
+        self.last_thumb = None
+        self.last_analysis = None
+        self.last_full_at = 0
+        self.frames_since_full = 0
+        self.frames_analyzed = 0
+        self.frames_skipped = 0
+
+        self.last_face_count = None
+        self.last_face_center = None
+        self.identity_last_check = 0
+        self.identity_escalation = 0
+        self.identity_checks = 0
+        self.identity_skipped = 0
+
+    # ---------------- MOTION GATE ----------------
+    def cached_analysis(self, thumb, now):
+        """
+        Previous model outputs if the scene is unchanged since the last
+        full analysis and no forced refresh is due, else None.
+        """
+        if self.last_analysis is None:
+            return None
+
+        if (
+            self.frames_since_full >= MOTION_FORCE_EVERY_FRAMES
+            or now - self.last_full_at >= MOTION_FORCE_EVERY_SECONDS
+            or scene_changed(self.last_thumb, thumb)
+        ):
+            return None
+
+        self.frames_since_full += 1
+        self.frames_skipped += 1
+        return self.last_analysis
+
+    def store_analysis(self, thumb, analysis, now):
+        self.last_thumb = thumb
+        self.last_analysis = analysis
+        self.last_full_at = now
+        self.frames_since_full = 0
+        self.frames_analyzed += 1
+
+    # ---------------- IDENTITY SCHEDULE ----------------
+    def identity_check_due(self, face_count, face_center, now):
+        """
+        Called for every freshly analyzed frame. Tracks the escalation
+        triggers and returns True if the embedding should run now.
+        """
+        triggered = face_count != self.last_face_count   # includes NO_FACE gaps
+
+        if face_center is not None and self.last_face_center is not None:
+            dx = face_center[0] - self.last_face_center[0]
+            dy = face_center[1] - self.last_face_center[1]
+            if (dx * dx + dy * dy) ** 0.5 > IDENTITY_JUMP_THRESHOLD:
+                triggered = True
+
+        self.last_face_count = face_count
+        self.last_face_center = face_center
+
+        if triggered:
+            self.identity_escalation = IDENTITY_ESCALATION_CHECKS
+
+        if face_count != 1:
+            return False
+
+        # A pending mismatch streak is always checked frame by frame so
+        # FACE_MISMATCH_CONSECUTIVE keeps meaning consecutive frames
+        due = (
+            self.identity_escalation > 0
+            or self.face_mismatch_counter > 0
+            or now - self.identity_last_check >= IDENTITY_CHECK_INTERVAL
+        )
+
+        if due:
+            self.identity_last_check = now
+            self.identity_checks += 1
+        else:
+            self.identity_skipped += 1
+
+        return due
+
+    # ---------------- IDENTITY ----------------
+    def check_identity(self, distance):
+        """
+        Returns None, "IDENTITY_MISMATCH_WARNING" (first strike)
+        or "FACE_MISMATCH" (terminal).
+        """
+        if distance > FACE_MISMATCH_THRESHOLD:
+            self.face_mismatch_counter += 1
+        else:
+            self.face_mismatch_counter = 0
+
+        if distance > FACE_MISMATCH_THRESHOLD - IDENTITY_BORDERLINE_MARGIN:
+            self.identity_escalation = IDENTITY_ESCALATION_CHECKS
+        elif self.identity_escalation > 0:
+            self.identity_escalation -= 1
+
+        if self.face_mismatch_counter < FACE_MISMATCH_CONSECUTIVE:
+            return None
+
+        if not self.identity_warning_issued:
+            self.identity_warning_issued = True
+            self.face_mismatch_counter = 0
+            return "IDENTITY_MISMATCH_WARNING"
+
+        return "FACE_MISMATCH"
+
+    # ---------------- ALL RULES, ONE FRAME ----------------
+    def frame_events(self, phone_detected, face_result, distance, now):
+        """
+        Pushes one frame's model outputs through the temporal rules and
+        returns (events, face_missing). Identity is only judged on frames
+        with a face; `distance` is None when no identity check ran.
+        """
+        event = face_result["event"]
+        face_missing = event == "NO_FACE"
+
+        events = self.window.push(now, (
+            1 if phone_detected else 0,
+            FACES_CODES.get(event, 0),
+            HEAD_CODES.get(event, 0)
+        ))
+
+        if distance is not None and not face_missing:
+            identity_event = self.check_identity(distance)
+            if identity_event:
+                events.append(identity_event)
+
+        return events, face_missing
+
+
+# =================================================
+# LOCK-STRIPED SESSION REGISTRY
+# =================================================
+# Registry locks only guard the dicts; rule evaluation happens under the
+# session's own lock, so different candidates never wait on each other.
+
+class SessionRegistry:
+    def __init__(self, stripes=SESSION_STRIPES, idle_ttl=SESSION_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+        self._last_sweep = time.time()
+        self.evicted = 0
+
+    def _stripe(self, attempt_id):
+        return self._stripes[hash(attempt_id) % len(self._stripes)]
+
+    def get(self, attempt_id, now=None):
+        now = time.time() if now is None else now
+        self._maybe_sweep(now)
+
+        sessions, lock = self._stripe(attempt_id)
+        with lock:
+            session = sessions.get(attempt_id)
+            if session is None:
+                session = sessions[attempt_id] = ProctorSession(attempt_id, now)
+
+        session.last_seen = now
+        return session
+
+    def attach(self, session, now=None):
+        """
+        For connections that hold a session across frames: returns the
+        registered session for its attempt, putting `session` back if it
+        was evicted or removed in the meantime.
+        """
+        now = time.time() if now is None else now
+
+        sessions, lock = self._stripe(session.attempt_id)
+        with lock:
+            session = sessions.setdefault(session.attempt_id, session)
+
+        session.last_seen = now
+        return session
+
+    def remove(self, attempt_id):
+        sessions, lock = self._stripe(attempt_id)
+        with lock:
+            return sessions.pop(attempt_id, None)
+
+    def _maybe_sweep(self, now):
+        if now - self._last_sweep < self.idle_ttl / 4:
+            return
+        self._last_sweep = now
+
+        for sessions, lock in self._stripes:
+            with lock:
+                idle = [
+                    attempt_id for attempt_id, session in sessions.items()
+                    if now - session.last_seen > self.idle_ttl
+                ]
+                for attempt_id in idle:
+                    del sessions[attempt_id]
+                self.evicted += len(idle)
+
+    def __len__(self):
+        return sum(len(sessions) for sessions, _ in self._stripes)
+
+    def stats(self):
+        active = 0
+        analyzed = 0
+        skipped = 0
+        identity_checks = 0
+        identity_skipped = 0
+        state_bytes = 0
+
+        for sessions, lock in self._stripes:
+            with lock:
+                for session in sessions.values():
+                    active += 1
+                    analyzed += session.frames_analyzed
+                    skipped += session.frames_skipped
+                    identity_checks += session.identity_checks
+                    identity_skipped += session.identity_skipped
+                    state_bytes += session.window.nbytes
+                    if session.last_thumb is not None:
+                        state_bytes += session.last_thumb.nbytes
+
+        session_size = sys.getsizeof(ProctorSession(0))
+        total = analyzed + skipped
+
+        return {
+            "active_sessions": active,
+            "evicted_sessions": self.evicted,
+            "stripes": len(self._stripes),
+            "approx_bytes": active * session_size + state_bytes,
+            "frames_analyzed": analyzed,
+            "frames_skipped": skipped,
+            "skip_rate": round(skipped / total, 3) if total else 0,
+            "identity_checks": identity_checks,
+            "identity_checks_skipped": identity_skipped
+        }
+
+
+sessions = SessionRegistry()
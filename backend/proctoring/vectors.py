@@ -0,0 +1,22 @@
+import numpy as np
+
+# --------------------------------------------------
+# EMBEDDING VECTOR HELPERS
+# --------------------------------------------------
+# Embeddings are kept L2-normalized as float32 so that cosine distance
+# is a single dot product: 1 - a @ b.
+
+EMBEDDING_DTYPE = np.float32
+
+
+def normalize_embedding(embedding):
+    vec = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    length = np.linalg.norm(vec)
+    if length == 0:
+        return vec
+    return vec / length
+
+
+def unpack_embedding(data):
+    # Read-only view over the bytes, no copy
+    return np.frombuffer(bytes(data), dtype=EMBEDDING_DTYPE)
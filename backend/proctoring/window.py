@@ -0,0 +1,92 @@
+import math
+import sys
+from collections import namedtuple
+
+# --------------------------------------------------
+# TEMPORAL RULES
+# --------------------------------------------------
+# Every frame pushes one small integer code per channel (phone, faces,
+# head). Every temporal rule is the same question asked of that stream:
+# has channel C been in state S for at least `duration` seconds (over at
+# least `min_frames` frames since the rule last fired) and is the rule
+# out of its cooldown?
+#
+# A run survives up to WINDOW_GAP_FRAMES consecutive frames in another
+# state, so a single missed detection or landmark flicker does not
+# restart a timer. Answering that needs no frame history: per rule, the
+# window keeps where the current run started, the frames counted in it
+# since the last firing, the trailing mismatches and the last firing.
+# That is a handful of scalar updates per frame.
+
+WINDOW_GAP_FRAMES = 1
+
+
+TemporalRule = namedtuple(
+    "TemporalRule",
+    ["event", "channel", "state", "duration", "cooldown", "min_frames"]
+)
+
+
+class RuleSet:
+    """Rule parameters, shared by every attempt's window."""
+
+    def __init__(self, rules, channels, gap=WINDOW_GAP_FRAMES):
+        self.rules = tuple(rules)
+        self.events = [rule.event for rule in self.rules]
+        self.channels = channels
+        self.gap = gap
+
+
+class RollingWindow:
+    """One attempt's run state, one slot per rule."""
+
+    __slots__ = ("rule_set", "run_start", "counted", "misses", "last_fired")
+
+    def __init__(self, rule_set):
+        count = len(rule_set.rules)
+        self.rule_set = rule_set
+        self.run_start = [None] * count         # time of the run's first frame
+        self.counted = [0] * count              # run frames since the rule last fired
+        self.misses = [0] * count               # consecutive frames in another state
+        self.last_fired = [-math.inf] * count
+
+    @property
+    def nbytes(self):
+        return sum(
+            sys.getsizeof(values)
+            for values in (self.run_start, self.counted, self.misses, self.last_fired)
+        )
+
+    def push(self, now, codes):
+        """Adds one frame; returns the events of the rules that fire on it, in rule order."""
+        gap = self.rule_set.gap
+        run_start = self.run_start
+        counted = self.counted
+        misses = self.misses
+        last_fired = self.last_fired
+        fired = []
+
+        for i, rule in enumerate(self.rule_set.rules):
+            if codes[rule.channel] != rule.state:
+                if run_start[i] is not None:
+                    misses[i] += 1
+                    if misses[i] > gap:
+                        run_start[i] = None
+                        counted[i] = 0
+                continue
+
+            if run_start[i] is None:
+                run_start[i] = now
+            misses[i] = 0
+            counted[i] += 1
+
+            if (
+                now - run_start[i] >= rule.duration
+                and counted[i] >= rule.min_frames
+                and now - last_fired[i] > rule.cooldown
+            ):
+                last_fired[i] = now
+                counted[i] = 0
+                fired.append(rule.event)
+
+        return fired
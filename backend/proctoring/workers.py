@@ -0,0 +1,391 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import cv2
+import numpy as np
+
+# --------------------------------------------------
+# INFERENCE WORKER CONFIG
+# --------------------------------------------------
+# With INFERENCE_WORKERS > 0, YOLO / MediaPipe / DeepFace run in separate
+# processes. Decoded frames are copied once into a shared-memory slot;
+# only the slot index and shape travel through each worker's pipe, and
+# results come back as small tuples. Frames with an affinity key (the
+# attempt id) go to the same worker while it is no more than
+# INFERENCE_AFFINITY_SLACK requests busier than the least-loaded one, so
+# that worker's FaceMesh keeps tracking the candidate; otherwise the
+# frame goes elsewhere and that worker's instance is reset first.
+
+INFERENCE_WORKERS = 0                   # 0 = run models in the request thread
+INFERENCE_SLOTS = 32                    # frames in flight across all workers
+INFERENCE_SLOT_BYTES = 1280 * 720 * 3   # largest frame a slot can hold
+INFERENCE_TIMEOUT = 5                   # seconds to wait for a worker result
+INFERENCE_HEALTH_INTERVAL = 2           # seconds between worker liveness checks
+INFERENCE_AFFINITY_SLACK = 1            # extra outstanding requests tolerated for affinity
+
+TASK_ANALYZE = 0
+TASK_EMBED = 1
+
+
+class InferenceUnavailable(RuntimeError):
+    """No result for this frame: no free slot, a timeout or a failed worker."""
+
+
+# --------------------------------------------------
+# WORKER PROCESS
+# --------------------------------------------------
+
+def _frame_view(shm, slot, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf,
+                      offset=slot * INFERENCE_SLOT_BYTES)
+
+
+def _worker_main(worker_id, shm_name, conn):
+    # Models load once per worker process
+    from proctoring.phone import detect_phones
+    from proctoring.face import FrameAnalysis
+    from proctoring.face_auth import get_face_embedding
+    from proctoring.vectors import normalize_embedding
+    from proctoring import model_pool
+    from proctoring.models import models
+
+    # Single-threaded process: one instance per model is enough. Pay the
+    # model cost before the first task.
+    model_pool.MODEL_POOL_SIZE = 1
+    models.warm_up()
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        request_id, kind, slot, shape, box, affinity = task
+
+        try:
+            frame = _frame_view(shm, slot, shape)
+
+            if kind == TASK_ANALYZE:
+                analysis = FrameAnalysis(frame, affinity)
+                face = analysis.face_result()
+                crop_box = analysis.face_box()[0] if face["faces"] == 1 else None
+
+                conn.send((
+                    request_id, True,
+                    (
+                        detect_phones([frame])[0],
+                        face["faces"], face["direction"], face["gaze"], face["event"],
+                        analysis.face_center, crop_box
+                    )
+                ))
+
+            else:
+                x1, y1, x2, y2 = box
+                embedding = get_face_embedding(frame[y1:y2, x1:x2])
+                if embedding is not None:
+                    embedding = normalize_embedding(embedding).tobytes()
+                conn.send((request_id, True, embedding))
+
+        except Exception as e:
+            conn.send((request_id, False, repr(e)))
+
+    shm.close()
+
+
+# --------------------------------------------------
+# PARENT-SIDE POOL
+# --------------------------------------------------
+
+class FrameJob:
+    """One frame held in a shared-memory slot until the job is closed."""
+
+    def __init__(self, pool, slot, shape, affinity=None):
+        self.pool = pool
+        self.slot = slot
+        self.shape = shape
+        self.affinity = affinity
+        self.crop_box = None
+
+    def analyze(self):
+        """Returns (phone_detected, face_result, face_center)."""
+        phone, faces, direction, gaze, event, center, crop_box = self.pool._call(
+            TASK_ANALYZE, self.slot, self.shape, affinity=self.affinity
+        )
+        self.crop_box = crop_box
+
+        face_result = {
+            "faces": faces,
+            "direction": direction,
+            "gaze": gaze,
+            "event": event
+        }
+        return phone, face_result, center
+
+    def embed(self):
+        """Normalized float32 embedding of the face found by analyze(), or None."""
+        if self.crop_box is None:
+            return None
+
+        data = self.pool._call(TASK_EMBED, self.slot, self.shape, self.crop_box)
+        return None if data is None else np.frombuffer(data, dtype=np.float32)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.pool._release(self.slot)
+
+
+class _Worker:
+    """Parent-side handle: process, its pipe end and the requests it owes."""
+
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.outstanding = set()
+        self.dead = False
+
+
+class InferencePool:
+    def __init__(self, workers=INFERENCE_WORKERS, slots=INFERENCE_SLOTS):
+        self.workers = workers
+        self.slots = slots
+
+        self._ctx = mp.get_context("spawn")
+        self._started = False
+        self._start_lock = threading.Lock()
+
+        # One pipe per worker: a worker killed mid-read can't wedge a
+        # queue lock shared with the others
+        self._shm = None
+        self._workers = []
+        self._restarts = 0
+
+        self._free = queue.Queue()
+        self._pending = {}       # request_id -> (Future, worker index)
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=self.slots * INFERENCE_SLOT_BYTES
+            )
+
+            for slot in range(self.slots):
+                self._free.put(slot)
+
+            self._workers = [self._spawn(i) for i in range(self.workers)]
+            self._started = True
+
+            threading.Thread(target=self._collect_results, name="inference-results", daemon=True).start()
+            threading.Thread(target=self._monitor, name="inference-health", daemon=True).start()
+
+            atexit.register(self.stop)
+
+    def stop(self):
+        if not self._started:
+            return
+        self._started = False
+
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.proc.join(timeout=2)
+            if worker.proc.is_alive():
+                worker.proc.terminate()
+            worker.conn.close()
+
+        self._shm.close()
+        self._shm.unlink()
+
+    def _spawn(self, worker_id):
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._shm.name, child_conn),
+            name=f"inference-{worker_id}",
+            daemon=True
+        )
+        proc.start()
+        child_conn.close()
+        return _Worker(proc, parent_conn)
+
+    # -------------------------------
+    # Frame submission
+    # -------------------------------
+    def frame(self, frame, affinity=None):
+        """
+        Copies the frame into a free slot and returns a FrameJob
+        (use as a context manager so the slot is released).
+        """
+        if not self._started:
+            self.start()
+
+        if frame.nbytes > INFERENCE_SLOT_BYTES:
+            # Shrink to fit a slot; results are relative or slot-local
+            h, w = frame.shape[:2]
+            scale = (INFERENCE_SLOT_BYTES / frame.nbytes) ** 0.5
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        try:
+            slot = self._free.get(timeout=INFERENCE_TIMEOUT)
+        except queue.Empty:
+            raise InferenceUnavailable("no free inference slot") from None
+        _frame_view(self._shm, slot, frame.shape)[...] = frame
+
+        return FrameJob(self, slot, frame.shape, affinity)
+
+    def _call(self, kind, slot, shape, box=None, affinity=None):
+        request_id = next(self._ids)
+        future = Future()
+
+        with self._pending_lock:
+            # Least-loaded worker, unless the key's home worker is close enough
+            index = min(
+                range(len(self._workers)),
+                key=lambda i: len(self._workers[i].outstanding)
+            )
+            if affinity is not None:
+                home = zlib.crc32(str(affinity).encode()) % len(self._workers)
+                home_load = len(self._workers[home].outstanding)
+                if home_load <= len(self._workers[index].outstanding) + INFERENCE_AFFINITY_SLACK:
+                    index = home
+            worker = self._workers[index]
+            worker.outstanding.add(request_id)
+            self._pending[request_id] = (future, index)
+
+        try:
+            with worker.send_lock:
+                worker.conn.send((request_id, kind, slot, shape, box, affinity))
+            return future.result(INFERENCE_TIMEOUT)
+        except FutureTimeout:
+            self.timeouts += 1
+            raise InferenceUnavailable(f"no result within {INFERENCE_TIMEOUT}s") from None
+        except (OSError, ValueError) as e:
+            # Pipe of a dead worker; the monitor replaces it
+            raise InferenceUnavailable(f"worker unreachable: {e!r}") from None
+        except RuntimeError as e:
+            raise InferenceUnavailable(f"worker failed: {e}") from None
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+                worker.outstanding.discard(request_id)
+
+    def _release(self, slot):
+        self._free.put(slot)
+
+    # -------------------------------
+    # Background threads
+    # -------------------------------
+    def _collect_results(self):
+        while self._started:
+            conns = {worker.conn: worker for worker in self._workers if not worker.dead}
+            for conn in wait(list(conns), timeout=INFERENCE_HEALTH_INTERVAL):
+                try:
+                    request_id, ok, payload = conn.recv()
+                except (EOFError, OSError):
+                    conns[conn].dead = True   # the monitor replaces it
+                    continue
+
+                with self._pending_lock:
+                    future, _ = self._pending.get(request_id, (None, None))
+
+                if future is None:
+                    continue   # caller already timed out
+
+                if ok:
+                    self.completed += 1
+                    future.set_result(payload)
+                else:
+                    self.failed += 1
+                    future.set_exception(RuntimeError(payload))
+
+    def _monitor(self):
+        while self._started:
+            time.sleep(INFERENCE_HEALTH_INTERVAL)
+
+            for i, worker in enumerate(self._workers):
+                if worker.proc.is_alive() or not self._started:
+                    continue
+
+                print(f"[INFERENCE] worker {i} (pid {worker.proc.pid}) died, restarting")
+
+                with self._pending_lock:
+                    self._workers[i] = self._spawn(i)
+                    lost = [self._pending[r][0] for r in worker.outstanding if r in self._pending]
+
+                # Requests the dead worker owed fail now instead of timing out
+                for future in lost:
+                    if not future.done():
+                        self.failed += 1
+                        future.set_exception(RuntimeError(f"inference worker {i} died"))
+
+                worker.conn.close()
+                self._restarts += 1
+
+    # -------------------------------
+    # Health / metrics
+    # -------------------------------
+    def health(self):
+        if not self._started:
+            return False
+        return all(worker.proc.is_alive() for worker in self._workers)
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+
+        return {
+            "enabled": True,
+            "workers": [
+                {
+                    "pid": worker.proc.pid,
+                    "alive": worker.proc.is_alive(),
+                    "queue_depth": len(worker.outstanding)
+                }
+                for worker in self._workers
+            ],
+            "healthy": self.health(),
+            "restarts": self._restarts,
+            "queue_depth": len(self._pending),
+            "free_slots": self._free.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts
+        }
+
+
+inference_pool = InferencePool()
@@ -1,71 +1,224 @@
-from flask import Blueprint, jsonify
-from db.attempts import auto_flag_abandoned_attempts
-from db.connection import get_db
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context
+from datetime import datetime, timedelta
+import base64
+import json
+
+from db.attempts import auto_flag_job, activity_tracker
+from db.connection import db_cursor, pool_stats
+from db.events import SUMMARY_BUCKET_SECONDS
+from db.face_index import face_index, face_index_job
+from db.live import live_hub
+from db.migrations import ensure_schema, partition_job
 
 # ✅ Admin Blueprint with prefix
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
+ATTEMPTS_PAGE_SIZE = 50
+ATTEMPTS_MAX_PAGE_SIZE = 500
+
+SPARKLINE_MAX_POINTS = 180      # newest minute buckets returned per attempt
+
+LIVE_HEARTBEAT = 15             # seconds between keepalive comments on idle streams
+
+FACE_MATCHES_LIMIT = 100
+
+
+# -----------------------------------
+# Keyset cursor: (started_at, id) of the last row on the page
+# -----------------------------------
+def encode_cursor(started_at, attempt_id):
+    raw = f"{started_at.isoformat()}|{attempt_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    started_at, attempt_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(started_at), int(attempt_id)
+
+
+def _attempt_filters(args, include_status=True):
+    """WHERE clauses + params from the query string (raises ValueError)."""
+    clauses = []
+    params = []
+
+    if args.get("exam_id"):
+        clauses.append("exam_id = %s")
+        params.append(args["exam_id"])
+
+    if include_status and args.get("status"):
+        clauses.append("status = %s")
+        params.append(args["status"].upper())
+
+    if args.get("min_score"):
+        clauses.append("cheating_score >= %s")
+        params.append(int(args["min_score"]))
+
+    if args.get("max_score"):
+        clauses.append("cheating_score <= %s")
+        params.append(int(args["max_score"]))
+
+    if args.get("since"):
+        clauses.append("started_at >= %s")
+        params.append(datetime.fromisoformat(args["since"]))
+
+    if args.get("until"):
+        clauses.append("started_at < %s")
+        params.append(datetime.fromisoformat(args["until"]))
+
+    return clauses, params
+
 
 # -----------------------------------
 # ADMIN: All Attempts (Dashboard)
 # -----------------------------------
+# GET /admin/attempts?limit=&cursor=&exam_id=&status=&min_score=&max_score=&since=&until=
+# Newest first. next_cursor is null on the last page; status_counts
+# (over the same filters, ignoring status) comes with the first page.
 @admin_bp.route("/attempts", methods=["GET"])
 def admin_attempts():
     try:
-        # 🔥 Auto-flag abandoned exams
-        auto_flag_abandoned_attempts()
+        limit = min(int(request.args.get("limit", ATTEMPTS_PAGE_SIZE)), ATTEMPTS_MAX_PAGE_SIZE)
+        clauses, params = _attempt_filters(request.args)
+        count_clauses, count_params = _attempt_filters(request.args, include_status=False)
+        cursor = request.args.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid query parameters"}), 400
 
-        conn, cur = get_db()
-        cur.execute("""
-            SELECT id, user_id, exam_id, cheating_score, status, started_at
-            FROM exam_attempts
-            ORDER BY started_at DESC
-        """)
-        rows = cur.fetchall()
+    try:
+        ensure_schema()
 
-        cur.close()
-        conn.close()
+        page_clauses = list(clauses)
+        page_params = list(params)
+        if after:
+            page_clauses.append("(started_at, id) < (%s, %s)")
+            page_params.extend(after)
 
-        return jsonify([
-            {
-                "id": r[0],
-                "user_id": r[1],
-                "exam_id": r[2],
-                "cheating_score": r[3],
-                "status": r[4],
-                "started_at": str(r[5])
-            } for r in rows
-        ])
+        where = "WHERE " + " AND ".join(page_clauses) if page_clauses else ""
+
+        with db_cursor() as cur:
+            cur.execute(f"""
+                SELECT id, user_id, exam_id, cheating_score, status, started_at
+                FROM exam_attempts
+                {where}
+                ORDER BY started_at DESC, id DESC
+                LIMIT %s
+            """, page_params + [limit + 1])
+            rows = cur.fetchall()
+
+            status_counts = None
+            if not after:
+                count_where = "WHERE " + " AND ".join(count_clauses) if count_clauses else ""
+                cur.execute(f"""
+                    SELECT status, COUNT(*)
+                    FROM exam_attempts
+                    {count_where}
+                    GROUP BY status
+                """, count_params)
+                status_counts = dict(cur.fetchall())
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return jsonify({
+            "attempts": [
+                {
+                    "id": r[0],
+                    "user_id": r[1],
+                    "exam_id": r[2],
+                    "cheating_score": r[3],
+                    "status": r[4],
+                    "started_at": str(r[5])
+                } for r in rows
+            ],
+            "next_cursor": encode_cursor(rows[-1][5], rows[-1][0]) if has_more else None,
+            "status_counts": status_counts
+        })
 
     except Exception as e:
         print("ADMIN ATTEMPTS ERROR:", e)
         return jsonify({"error": "Failed to fetch attempts"}), 500
 
 
+# -----------------------------------
+# Attempt version / ETag
+# -----------------------------------
+# exam_attempts.last_event_id moves with every logged event, so together
+# with score/status it identifies the attempt's state. Polls that send
+# If-None-Match get a 304 after one primary-key lookup.
+def _load_attempt(cur, attempt_id):
+    cur.execute("""
+        SELECT user_id, exam_id, cheating_score, status, started_at, ended_at, last_event_id
+        FROM exam_attempts
+        WHERE id = %s
+    """, (attempt_id,))
+    return cur.fetchone()
+
+
+def _attempt_etag(attempt_id, attempt):
+    return f"{attempt_id}-{attempt[6]}-{attempt[2]}-{attempt[3]}-{attempt[5] is not None}"
+
+
+def _not_modified(etag):
+    if etag not in request.if_none_match:
+        return None
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _with_etag(payload, etag):
+    # no-cache: browsers keep the body but revalidate with If-None-Match
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _attempt_json(attempt_id, attempt):
+    return {
+        "attempt_id": attempt_id,
+        "user_id": attempt[0],
+        "exam_id": attempt[1],
+        "cheating_score": attempt[2],
+        "status": attempt[3],
+        "started_at": str(attempt[4]),
+        "ended_at": str(attempt[5]) if attempt[5] else None
+    }
+
+
 # -----------------------------------
 # ADMIN: Attempt Timeline
 # -----------------------------------
 @admin_bp.route("/attempt/<int:attempt_id>", methods=["GET"])
 def admin_attempt_events(attempt_id):
-    conn, cur = get_db()
+    ensure_schema()
 
-    cur.execute("""
-        SELECT event_type, created_at
-        FROM cheating_events
-        WHERE attempt_id = %s
-        ORDER BY created_at
-    """, (attempt_id,))
-    rows = cur.fetchall()
+    with db_cursor() as cur:
+        attempt = _load_attempt(cur, attempt_id)
+        if not attempt:
+            return jsonify([])
 
-    cur.close()
-    conn.close()
+        etag = _attempt_etag(attempt_id, attempt)
+        cached = _not_modified(etag)
+        if cached:
+            return cached
 
-    return jsonify([
+        cur.execute("""
+            SELECT event_type, created_at
+            FROM cheating_events
+            WHERE attempt_id = %s
+            ORDER BY created_at
+        """, (attempt_id,))
+        rows = cur.fetchall()
+
+    return _with_etag([
         {
             "event_type": r[0],
             "time": str(r[1])
         } for r in rows
-    ])
+    ], etag)
 
 
 # -----------------------------------
@@ -73,43 +226,31 @@ def admin_attempt_events(attempt_id):
 # -----------------------------------
 @admin_bp.route("/attempt/<int:attempt_id>/details", methods=["GET"])
 def admin_attempt_details(attempt_id):
-    conn, cur = get_db()
+    ensure_schema()
 
-    # Attempt summary
-    cur.execute("""
-        SELECT user_id, exam_id, cheating_score, status, started_at, ended_at
-        FROM exam_attempts
-        WHERE id = %s
-    """, (attempt_id,))
-    attempt = cur.fetchone()
+    with db_cursor() as cur:
+        # Attempt summary
+        attempt = _load_attempt(cur, attempt_id)
 
-    if not attempt:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Attempt not found"}), 404
+        if not attempt:
+            return jsonify({"error": "Attempt not found"}), 404
 
-    # Cheating events
-    cur.execute("""
-        SELECT event_type, weight, created_at
-        FROM cheating_events
-        WHERE attempt_id = %s
-        ORDER BY created_at
-    """, (attempt_id,))
-    events = cur.fetchall()
+        etag = _attempt_etag(attempt_id, attempt)
+        cached = _not_modified(etag)
+        if cached:
+            return cached
 
-    cur.close()
-    conn.close()
+        # Cheating events
+        cur.execute("""
+            SELECT event_type, weight, created_at
+            FROM cheating_events
+            WHERE attempt_id = %s
+            ORDER BY created_at
+        """, (attempt_id,))
+        events = cur.fetchall()
 
-    return jsonify({
-        "attempt": {
-            "attempt_id": attempt_id,
-            "user_id": attempt[0],
-            "exam_id": attempt[1],
-            "cheating_score": attempt[2],
-            "status": attempt[3],
-            "started_at": str(attempt[4]),
-            "ended_at": str(attempt[5]) if attempt[5] else None
-        },
+    return _with_etag({
+        "attempt": _attempt_json(attempt_id, attempt),
         "events": [
             {
                 "event_type": e[0],
@@ -117,4 +258,211 @@ def admin_attempt_details(attempt_id):
                 "time": str(e[2])
             } for e in events
         ]
+    }, etag)
+
+
+# -----------------------------------
+# ADMIN: Attempt Rollups + Sparkline
+# -----------------------------------
+# Served from attempt_event_summary / attempt_event_buckets (kept up to
+# date by the event writer), never from cheating_events.
+@admin_bp.route("/attempt/<int:attempt_id>/summary", methods=["GET"])
+def admin_attempt_summary(attempt_id):
+    ensure_schema()
+
+    with db_cursor() as cur:
+        attempt = _load_attempt(cur, attempt_id)
+
+        if not attempt:
+            return jsonify({"error": "Attempt not found"}), 404
+
+        etag = _attempt_etag(attempt_id, attempt)
+        cached = _not_modified(etag)
+        if cached:
+            return cached
+
+        cur.execute("""
+            SELECT event_type, event_count, total_weight, first_at, last_at
+            FROM attempt_event_summary
+            WHERE attempt_id = %s
+            ORDER BY total_weight DESC, event_type
+        """, (attempt_id,))
+        by_type = cur.fetchall()
+
+        cur.execute("""
+            SELECT bucket_start, event_count, total_weight
+            FROM attempt_event_buckets
+            WHERE attempt_id = %s
+            ORDER BY bucket_start DESC
+            LIMIT %s
+        """, (attempt_id, SPARKLINE_MAX_POINTS))
+        buckets = cur.fetchall()[::-1]
+
+    return _with_etag({
+        "attempt": _attempt_json(attempt_id, attempt),
+        "totals": {
+            "events": sum(r[1] for r in by_type),
+            "weight": sum(r[2] for r in by_type),
+            "first_at": str(min(r[3] for r in by_type)) if by_type else None,
+            "last_at": str(max(r[4] for r in by_type)) if by_type else None
+        },
+        "by_type": [
+            {
+                "event_type": r[0],
+                "count": r[1],
+                "weight": r[2],
+                "first_at": str(r[3]),
+                "last_at": str(r[4])
+            } for r in by_type
+        ],
+        "sparkline": {
+            "bucket_seconds": SUMMARY_BUCKET_SECONDS,
+            "points": _fill_buckets(buckets)
+        }
+    }, etag)
+
+
+def _fill_buckets(buckets):
+    """Dense points (zeros for quiet buckets), newest SPARKLINE_MAX_POINTS only."""
+    if not buckets:
+        return []
+
+    step = timedelta(seconds=SUMMARY_BUCKET_SECONDS)
+    last = buckets[-1][0]
+    t = max(buckets[0][0], last - step * (SPARKLINE_MAX_POINTS - 1))
+
+    counts = {r[0]: (r[1], r[2]) for r in buckets}
+    points = []
+    while t <= last:
+        count, weight = counts.get(t, (0, 0))
+        points.append({"t": str(t), "count": count, "weight": weight})
+        t += step
+    return points
+
+
+# -----------------------------------
+# ADMIN: Live Feed (Server-Sent Events)
+# -----------------------------------
+# GET /admin/live?exam_id=&attempt_id=
+# Streams "event", "score" and "status" messages as they are persisted,
+# so dashboards no longer poll. Slow clients lose their oldest queued
+# messages rather than holding up the writers.
+@admin_bp.route("/live", methods=["GET"])
+def admin_live():
+    try:
+        attempt_id = request.args.get("attempt_id")
+        attempt_id = int(attempt_id) if attempt_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    subscriber = live_hub.subscribe(
+        exam_id=request.args.get("exam_id") or None,
+        attempt_id=attempt_id
+    )
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                messages = subscriber.get(LIVE_HEARTBEAT)
+                if not messages:
+                    yield ": keepalive\n\n"
+                    continue
+                for message in messages:
+                    data = json.dumps(message, default=str)
+                    yield f"id: {message['seq']}\nevent: {message['type']}\ndata: {data}\n\n"
+        finally:
+            live_hub.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@admin_bp.route("/live/stats", methods=["GET"])
+def admin_live_stats():
+    return jsonify(live_hub.stats())
+
+
+# -----------------------------------
+# ADMIN: Possible Proxy Test-Takers
+# -----------------------------------
+# GET /admin/face-matches?exam_id=&attempt_id=&limit=
+# Pairs of attempts by different users whose registered faces are near
+# duplicates (db/face_index.py), newest first.
+@admin_bp.route("/face-matches", methods=["GET"])
+def admin_face_matches():
+    ensure_schema()
+
+    try:
+        attempt_id = request.args.get("attempt_id")
+        attempt_id = int(attempt_id) if attempt_id else None
+        limit = min(int(request.args.get("limit", FACE_MATCHES_LIMIT)), ATTEMPTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    clauses = []
+    params = []
+    if attempt_id is not None:
+        clauses.append("(m.attempt_id = %s OR m.matched_attempt_id = %s)")
+        params += [attempt_id, attempt_id]
+    if request.args.get("exam_id"):
+        clauses.append("(a.exam_id = %s OR b.exam_id = %s)")
+        params += [request.args["exam_id"]] * 2
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT m.attempt_id, a.user_id, a.exam_id,
+                   m.matched_attempt_id, b.user_id, b.exam_id,
+                   m.distance, m.source, m.created_at
+            FROM face_matches m
+            JOIN exam_attempts a ON a.id = m.attempt_id
+            JOIN exam_attempts b ON b.id = m.matched_attempt_id
+            {where}
+            ORDER BY m.created_at DESC
+            LIMIT %s
+        """, params + [limit])
+        rows = cur.fetchall()
+
+    return jsonify([
+        {
+            "attempt_id": r[0],
+            "user_id": r[1],
+            "exam_id": r[2],
+            "matched_attempt_id": r[3],
+            "matched_user_id": r[4],
+            "matched_exam_id": r[5],
+            "distance": r[6],
+            "source": r[7],
+            "time": str(r[8])
+        } for r in rows
+    ])
+
+
+@admin_bp.route("/face-index", methods=["GET"])
+def admin_face_index():
+    return jsonify(face_index.stats())
+
+
+# -----------------------------------
+# ADMIN: DB Pool Metrics
+# -----------------------------------
+@admin_bp.route("/db-pool", methods=["GET"])
+def admin_db_pool():
+    return jsonify(pool_stats())
+
+
+# -----------------------------------
+# ADMIN: Background Jobs
+# -----------------------------------
+@admin_bp.route("/jobs", methods=["GET"])
+def admin_jobs():
+    return jsonify({
+        "auto_flag": auto_flag_job.stats(),
+        "activity": activity_tracker.stats(),
+        "partitions": partition_job.stats(),
+        "face_index": face_index_job.stats()
     })
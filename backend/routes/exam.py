@@ -1,13 +1,13 @@
 from flask import Blueprint, request, jsonify 
 import uuid 
-import psycopg2
-from config import DATABASE_URL
 
-exam_bp = Blueprint("exam", __name__)
+from db.connection import db_cursor
+from db.events import flush_events
+from db.ledger import score_ledger, SCORE_TERMINATE
+from db.live import live_hub
+from proctoring.session import sessions
 
-def get_db(): 
-    conn = psycopg2.connect(DATABASE_URL)
-    return conn, conn.cursor()
+exam_bp = Blueprint("exam", __name__)
 
 
 # -----------------------------------
@@ -19,17 +19,24 @@ def start_exam():
     exam_id = data.get("exam_id", "ai_exam_1")
     student_id = f"student_{uuid.uuid4().hex[:6]}"
 
-    conn, cur = get_db()
-    cur.execute("""
-        INSERT INTO exam_attempts (user_id, exam_id, status)
-        VALUES (%s, %s, 'ONGOING')
-        RETURNING id
-    """, (student_id, exam_id))
+    with db_cursor(commit=True) as cur:
+        cur.execute("""
+            INSERT INTO exam_attempts (user_id, exam_id, status)
+            VALUES (%s, %s, 'ONGOING')
+            RETURNING id, started_at
+        """, (student_id, exam_id))
 
-    attempt_id = cur.fetchone()[0]
-    conn.commit()
-    cur.close()
-    conn.close()
+        attempt_id, started_at = cur.fetchone()
+
+    live_hub.publish([{
+        "type": "status",
+        "attempt_id": attempt_id,
+        "exam_id": exam_id,
+        "user_id": student_id,
+        "status": "ONGOING",
+        "score": 0,
+        "started_at": str(started_at)
+    }])
 
     return jsonify({
         "attempt_id": attempt_id,
@@ -42,25 +49,27 @@ def start_exam():
 # -----------------------------------
 @exam_bp.route("/end-exam", methods=["POST"])
 def end_exam():
-    attempt_id = request.json["attempt_id"]
-
-    conn, cur = get_db()
-    cur.execute(
-        "SELECT cheating_score FROM exam_attempts WHERE id=%s",
-        (attempt_id,)
-    )
-    score = cur.fetchone()[0]
-
-    status = "TERMINATED" if score >= 15 else "COMPLETED"
-
-    cur.execute("""
-        UPDATE exam_attempts
-        SET status=%s, ended_at=NOW()
-        WHERE id=%s
-    """, (status, attempt_id))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    attempt_id = int(request.json["attempt_id"])
+
+    # Score comes from the in-memory ledger (reloaded from the DB if needed)
+    entry = score_ledger.get(attempt_id)
+    if entry is None:
+        return jsonify({"error": "Attempt not found"}), 404
+
+    score = entry.score
+    status = "TERMINATED" if score >= SCORE_TERMINATE else "COMPLETED"
+
+    # Make sure queued events are persisted with the final status
+    flush_events()
+
+    with db_cursor(commit=True) as cur:
+        cur.execute("""
+            UPDATE exam_attempts
+            SET status=%s, ended_at=NOW()
+            WHERE id=%s
+        """, (status, attempt_id))
+
+    score_ledger.set_status(attempt_id, status)
+    sessions.remove(attempt_id)
 
     return jsonify({"status": status, "score": score})
@@ -6,6 +6,7 @@ import numpy as np
 from proctoring.face import extract_face
 from proctoring.face_auth import get_face_embedding
 from db.attempts import save_face_embedding, is_face_registered
+from db.face_index import flag_near_duplicates
 
 bp = Blueprint("face_auth", __name__)
 
@@ -55,6 +56,13 @@ def capture_face():
 
     save_face_embedding(attempt_id, embedding)
 
+    # Same face under another user id: recorded for admins only, the
+    # registration itself goes through
+    try:
+        flag_near_duplicates(attempt_id, embedding)
+    except Exception as e:
+        print("❌ Face index lookup error:", e)
+
     return jsonify({
         "status": "FACE_REGISTERED"
     })
\ No newline at end of file
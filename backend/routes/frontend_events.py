@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from db.events import log_event
+from db.events import log_event, valid_event_type
 from db.attempts import evaluate_attempt
 
 frontend_bp = Blueprint("frontend_events", __name__)
@@ -26,6 +26,9 @@ def log_frontend_event():
     if not event_type or not attempt_id:
         return jsonify({"error": "Invalid data"}), 400
 
+    if not valid_event_type(event_type):
+        return jsonify({"error": "Invalid event type"}), 400
+
     # Log the event
     log_event(event_type, attempt_id)
 
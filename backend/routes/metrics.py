@@ -0,0 +1,73 @@
+from flask import Blueprint, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from db.connection import pool_stats, POOL_MAX_SIZE
+from db.embedding_cache import embedding_cache
+from db.events import event_writer
+from db.face_index import face_index
+from db.ledger import score_ledger
+from db.live import live_hub
+from proctoring.metrics import stats_collector
+from proctoring.phone import phone_scheduler
+from proctoring.session import sessions
+from proctoring.workers import inference_pool
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+# -----------------------------------
+# Gauges / counters read at scrape time
+# -----------------------------------
+def _session_stats(key):
+    return lambda: sessions.stats()[key]
+
+
+def _pool_connections():
+    stats = pool_stats()
+    return {"in_use": stats["in_use"], "peak_in_use": stats["peak_in_use"], "max": POOL_MAX_SIZE}
+
+
+def _inference_queue():
+    stats = inference_pool.stats()
+    return stats["queue_depth"] if stats["enabled"] else 0
+
+
+stats_collector.add("proctoring_active_sessions", "Proctoring sessions held in memory",
+                    _session_stats("active_sessions"))
+stats_collector.add("proctoring_session_state_bytes", "Approximate memory held by proctoring sessions",
+                    _session_stats("approx_bytes"))
+stats_collector.add("proctoring_score_ledger_entries", "Attempts cached in the score ledger",
+                    lambda: score_ledger.stats()["entries"])
+stats_collector.add("proctoring_embedding_cache_entries", "Reference embeddings cached in memory",
+                    lambda: embedding_cache.stats()["size"])
+stats_collector.add("proctoring_event_queue_depth", "Events waiting for the write-behind flusher",
+                    event_writer.pending)
+stats_collector.add("proctoring_events_written", "Events persisted by the write-behind flusher",
+                    lambda: event_writer.events_written, kind="counter")
+stats_collector.add("proctoring_events_deferred", "Events re-queued while the database was unavailable",
+                    lambda: event_writer.deferred, kind="counter")
+stats_collector.add("proctoring_phone_batch_queue_depth", "Frames waiting for a phone-detection batch",
+                    lambda: phone_scheduler.stats()["queue_depth"])
+stats_collector.add("proctoring_inference_queue_depth", "Frames waiting for an inference worker",
+                    _inference_queue)
+stats_collector.add("proctoring_face_index_rows", "Registered faces in the cross-attempt face index",
+                    lambda: {"snapshot": face_index.stats()["snapshot_rows"],
+                             "tail": face_index.stats()["tail_rows"]})
+stats_collector.add("proctoring_face_index_matches", "Near-duplicate faces found at registration",
+                    lambda: face_index.matches, kind="counter")
+stats_collector.add("proctoring_live_subscribers", "Connected live-feed (SSE) clients",
+                    lambda: live_hub.stats()["subscribers"])
+stats_collector.add("proctoring_db_pool_connections", "Database pool connections",
+                    _pool_connections)
+stats_collector.add("proctoring_db_pool_checkouts", "Database pool checkouts",
+                    lambda: pool_stats()["checkouts"], kind="counter")
+stats_collector.add("proctoring_db_pool_timeouts", "Database pool checkouts that timed out",
+                    lambda: pool_stats()["timeouts"], kind="counter")
+
+
+# -----------------------------------
+# Prometheus scrape endpoint
+# -----------------------------------
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
@@ -1,19 +1,25 @@
 from flask import Blueprint, request, jsonify
+from flask_sock import Sock
 import cv2
 import numpy as np
 import base64
+import binascii
+import json
 import time
-from collections import defaultdict
-from threading import Lock  # <--- NEW IMPORT
 
-from proctoring.face import analyze_face, extract_face
-from proctoring.phone import detect_phone
+from proctoring.face import FrameAnalysis, face_tier_stats
+from proctoring.phone import detect_phone, phone_scheduler
 from proctoring.face_auth import (
     get_face_embedding as extract_embedding,
-    cosine_distance
+    normalized_distance
 )
+from proctoring.vectors import normalize_embedding
+from proctoring.session import sessions
+from proctoring.motion import frame_thumbnail
+from proctoring.workers import inference_pool, InferenceUnavailable
+from proctoring import metrics
 
-from db.events import log_event
+from db.events import log_event, EventWriteError
 from db.attempts import (
     evaluate_attempt,
     get_face_embedding,
@@ -21,201 +27,346 @@ from db.attempts import (
 )
 
 proctoring_bp = Blueprint("proctoring", __name__)
+sock = Sock()
+
+# Thresholds and all per-attempt timer/counter state live in
+# proctoring/session.py (one ProctorSession per attempt).
+
+# Binary uploads are decoded at reduced resolution: YOLO and FaceMesh
+# downscale internally anyway.
+FRAME_DECODE_FLAG = cv2.IMREAD_REDUCED_COLOR_2
+MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+# WebSocket stream: frame-rate hints sent to the client
+STREAM_BASE_INTERVAL_MS = 1000
+STREAM_MAX_INTERVAL_MS = 3000
 
 # =================================================
-# CONFIGURATION
+# ANALYZE FRAME (JSON / base64 data URL)
 # =================================================
 
-NO_FACE_THRESHOLD = 3
-NO_FACE_TIME_WINDOW = 8
-EVENT_COOLDOWN = 2
+@proctoring_bp.route("/analyze-frame", methods=["POST"])
+def analyze_frame():
+    data = request.json
+
+    if not data or "attempt_id" not in data or "image" not in data:
+        return jsonify({"error": "Invalid payload"}), 400
 
-PHONE_DURATION_THRESHOLD = 3      
-PHONE_COOLDOWN = 8                
+    attempt_id = int(data["attempt_id"])
+    image = data["image"]
 
-HEAD_DURATION_THRESHOLD = 2       
-HEAD_COOLDOWN = 5
+    with metrics.frame():
+        # --- 1. DECODE IMAGE (Heavy work, keep outside lock) ---
+        try:
+            with metrics.timed("decode"):
+                image_bytes = base64.b64decode(image.split(",")[1])
+                np_arr = np.frombuffer(image_bytes, np.uint8)
+                frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR) if np_arr.size else None
+        except (IndexError, ValueError, binascii.Error):
+            frame = None
 
-GAZE_DURATION_THRESHOLD = 2
-GAZE_COOLDOWN = 5
+        # imdecode returns None for bytes that aren't an image
+        if frame is None:
+            metrics.FRAMES.labels("decode_failed").inc()
+            return jsonify({"error": "Image decode failed"}), 400
+
+        return jsonify(process_frame(attempt_id, frame))
 
-FACE_MISMATCH_THRESHOLD = 0.35
-FACE_MISMATCH_CONSECUTIVE = 3
 
 # =================================================
-# IN-MEMORY STATE
+# ANALYZE FRAME (BINARY: image/jpeg or multipart)
 # =================================================
 
-# Lock to prevent race conditions between frames
-thread_lock = Lock()  # <--- NEW LOCK OBJECT
+def read_frame_body():
+    """
+    Reads the raw request body straight into a numpy buffer.
+    Returns None if the body is missing or too large.
+    """
+    length = request.content_length
+    if not length or length > MAX_FRAME_BYTES:
+        return None
+
+    buffer = np.empty(length, np.uint8)
+    view = memoryview(buffer)
+    received = 0
 
-last_face_seen = {}
-no_face_counter = {}
+    while received < length:
+        count = request.stream.readinto(view[received:])
+        if not count:
+            break
+        received += count
 
-phone_start_time = {}
-last_phone_logged = {}
+    return buffer[:received]
 
-head_start_time = {}
-last_head_logged = {}
 
-gaze_start_time = {}
-last_gaze_logged = {}
+@proctoring_bp.route("/analyze-frame-raw", methods=["POST"])
+def analyze_frame_raw():
+    attempt_id = request.args.get("attempt_id") or request.form.get("attempt_id")
+
+    try:
+        attempt_id = int(attempt_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid attempt_id"}), 400
+
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("frame")
+        if upload is None:
+            return jsonify({"error": "Invalid payload"}), 400
+        np_arr = np.frombuffer(upload.read(), np.uint8)
+    else:
+        np_arr = read_frame_body()
+        if np_arr is None:
+            return jsonify({"error": "Invalid payload"}), 400
+
+    with metrics.frame():
+        with metrics.timed("decode"):
+            frame = cv2.imdecode(np_arr, FRAME_DECODE_FLAG) if np_arr.size else None
+        if frame is None:
+            metrics.FRAMES.labels("decode_failed").inc()
+            return jsonify({"error": "Image decode failed"}), 400
+
+        return jsonify(process_frame(attempt_id, frame))
 
-face_mismatch_counter = defaultdict(int)
-identity_warning_issued = set()
 
 # =================================================
-# ANALYZE FRAME
+# STREAMING (WebSocket: binary frames in, verdicts out)
 # =================================================
+# ws://<host>/ws/proctor?attempt_id=<id>
+#   client -> server: binary JPEG frames (up to MAX_FRAME_BYTES), or {"type": "ping"}
+#   server -> client: {"type": "verdict", ...analyze-frame response}
+#                     {"type": "rate", "interval_ms": N}
+#                     {"type": "pong"} / {"type": "error", "error": ...}
 
-@proctoring_bp.route("/analyze-frame", methods=["POST"])
-def analyze_frame():
-    data = request.json
+def frame_interval_hint(elapsed):
+    # Slow the client down when a frame takes more than half its budget
+    if elapsed * 1000 <= STREAM_BASE_INTERVAL_MS / 2:
+        return STREAM_BASE_INTERVAL_MS
+    return min(STREAM_MAX_INTERVAL_MS, int(elapsed * 2000))
 
-    if not data or "attempt_id" not in data or "image" not in data:
-        return jsonify({"error": "Invalid payload"}), 400
 
-    attempt_id = int(data["attempt_id"])
-    image = data["image"]
-
-    # --- 1. DECODE IMAGE (Heavy work, keep outside lock) ---
+@sock.route("/ws/proctor", bp=proctoring_bp)
+def proctor_stream(ws):
     try:
-        image_bytes = base64.b64decode(image.split(",")[1])
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    except:
-        return jsonify({"error": "Image decode failed"}), 400
+        attempt_id = int(request.args.get("attempt_id"))
+    except (TypeError, ValueError):
+        ws.send(json.dumps({"type": "error", "error": "Invalid attempt_id"}))
+        return
+
+    # Per-connection state; re-attached each frame in case it was evicted
+    session = sessions.get(attempt_id)
+    interval = STREAM_BASE_INTERVAL_MS
+    ws.send(json.dumps({"type": "rate", "interval_ms": interval}))
+
+    while True:
+        message = ws.receive()
+        if message is None:
+            break
+
+        if isinstance(message, str):
+            try:
+                control = json.loads(message)
+            except ValueError:
+                control = {}
+            if control.get("type") == "ping":
+                ws.send(json.dumps({"type": "pong"}))
+            continue
+
+        if len(message) > MAX_FRAME_BYTES:
+            ws.send(json.dumps({"type": "error", "error": "Frame too large"}))
+            continue
+
+        started = time.monotonic()
+        session = sessions.attach(session)
+
+        with metrics.frame():
+            with metrics.timed("decode"):
+                frame = cv2.imdecode(np.frombuffer(message, np.uint8), FRAME_DECODE_FLAG)
+            if frame is None:
+                metrics.FRAMES.labels("decode_failed").inc()
+                ws.send(json.dumps({"type": "error", "error": "Image decode failed"}))
+                continue
+
+            try:
+                response = process_frame(attempt_id, frame, session)
+            except Exception as e:
+                # One bad frame must not end the stream
+                print("❌ Stream frame error:", e)
+                ws.send(json.dumps({"type": "error", "error": "Frame analysis failed"}))
+                continue
+        ws.send(json.dumps({"type": "verdict", **response}))
+
+        if response["status"] == "TERMINATED":
+            break
+
+        hint = frame_interval_hint(time.monotonic() - started)
+        if hint != interval:
+            interval = hint
+            ws.send(json.dumps({"type": "rate", "interval_ms": interval}))
 
-    now = time.time()
 
-    # --- 2. RUN AI MODELS (Heavy work, keep outside lock) ---
-    # Running these outside the lock keeps your server fast.
-    phone_detected = detect_phone(frame)
-    face_result = analyze_face(frame)
-    
-    # Extract identity data if needed
+# =================================================
+# MODEL INFERENCE (in-process or worker pool)
+# =================================================
+
+def _identity_due(session, stored_embedding, face_result, face_center, now):
+    # Adaptive schedule, see session.py
+    if stored_embedding is None:
+        return False
+    with session.lock:
+        return session.identity_check_due(face_result["faces"], face_center, now)
+
+
+def run_models(frame, session, stored_embedding, now):
+    """
+    Returns (phone_detected, face_result, live_embedding); the embedding
+    is normalized, or None when no identity check was due or possible.
+    Returns None when the worker pool could not analyze the frame.
+    """
     live_embedding = None
-    stored_embedding = get_face_embedding(attempt_id)
-    if stored_embedding and face_result["faces"] == 1:
-        face_img, face_count, _ = extract_face(frame)
+
+    if inference_pool.enabled:
+        # Model stages run in the workers; only the round trips are timed here
+        try:
+            with inference_pool.frame(frame, affinity=session.attempt_id) as job:
+                with metrics.timed("worker_analyze"):
+                    phone_detected, face_result, face_center = job.analyze()
+
+                if _identity_due(session, stored_embedding, face_result, face_center, now):
+                    try:
+                        with metrics.timed("worker_embedding"):
+                            live_embedding = job.embed()
+                    except Exception:
+                        pass
+        except InferenceUnavailable as e:
+            print("❌ Inference unavailable:", e)
+            return None
+
+        return phone_detected, face_result, live_embedding
+
+    with metrics.timed("yolo"):
+        phone_detected = detect_phone(frame)
+    analysis = FrameAnalysis(frame, affinity=session.attempt_id)
+    face_result = analysis.face_result()
+
+    if _identity_due(session, stored_embedding, face_result, analysis.face_center, now):
+        face_img, face_count, _ = analysis.face_crop()
         if face_count == 1 and face_img is not None:
              try:
-                 live_embedding = extract_embedding(face_img)
+                 with metrics.timed("embedding"):
+                     live_embedding = extract_embedding(face_img)
+                 if live_embedding is not None:
+                     live_embedding = normalize_embedding(live_embedding)
              except:
                  pass
 
+    return phone_detected, face_result, live_embedding
+
+
+# =================================================
+# FRAME PIPELINE (shared by all frame endpoints)
+# =================================================
+
+def process_frame(attempt_id, frame, session=None):
+    now = time.time()
+    if session is None:
+        session = sessions.get(attempt_id, now)
+
+    # --- 2. MOTION GATE (reuse outputs if the scene hasn't changed) ---
+    thumb = frame_thumbnail(frame)
+    with session.lock:
+        cached = session.cached_analysis(thumb, now)
+
+    live_embedding = None
+    stored_embedding = get_face_embedding(attempt_id)
+
+    if cached is not None:
+        # Identity is only checked on freshly analyzed frames
+        phone_detected, face_result = cached
+    else:
+        # --- 3. RUN AI MODELS (Heavy work, keep outside lock) ---
+        # Running these outside the lock keeps your server fast.
+        outputs = run_models(frame, session, stored_embedding, now)
+
+        if outputs is None:
+            # No model output: the rules skip this frame, the score still answers
+            metrics.FRAMES.labels("inference_failed").inc()
+            response = {
+                "faces_detected": None,
+                "direction": None,
+                "gaze": None,
+                "phone_detected": None,
+                "analysis_reused": False,
+                "analysis_skipped": True,
+                "status": None,
+                "warning": None
+            }
+            response.update(evaluate_attempt(attempt_id))
+            return response
+
+        phone_detected, face_result, live_embedding = outputs
+
+        with session.lock:
+            session.store_analysis(thumb, (phone_detected, face_result), now)
+
+    metrics.FRAMES.labels("reused" if cached is not None else "analyzed").inc()
+
     response = {
         "faces_detected": face_result["faces"],
         "direction": face_result["direction"],
         "gaze": face_result.get("gaze", "CENTER"),
         "phone_detected": phone_detected,
+        "analysis_reused": cached is not None,
         "status": None,
         "warning": None
     }
 
-    # --- 3. UPDATE STATE & LOGGING (CRITICAL SECTION - LOCKED) ---
-    # We lock this part so multiple frames can't update timers at the same time.
-    with thread_lock:
-        
-        # Initialize defaults safely
-        last_face_seen.setdefault(attempt_id, now)
-        no_face_counter.setdefault(attempt_id, 0)
-
-        # ---------------- PHONE LOGIC ----------------
-        if phone_detected:
-            state = phone_start_time.get(attempt_id)
-            if not state:
-                phone_start_time[attempt_id] = {"start": now}
-            else:
-                duration = now - state["start"]
-                last_logged = last_phone_logged.get(attempt_id, 0)
-
-                if duration >= PHONE_DURATION_THRESHOLD:
-                    if (now - last_logged > PHONE_COOLDOWN):
-                        log_event("PHONE_DETECTED", attempt_id)
-                        last_phone_logged[attempt_id] = now
-        else:
-            phone_start_time.pop(attempt_id, None)
-
-        # ---------------- FACE/HEAD LOGIC ----------------
-        event = face_result["event"]
-        
-        # A. NO FACE
-        if event == "NO_FACE":
-            no_face_counter[attempt_id] += 1
-            if (
-                no_face_counter[attempt_id] >= NO_FACE_THRESHOLD
-                and now - last_face_seen[attempt_id] > NO_FACE_TIME_WINDOW
-            ):
-                log_event("NO_FACE", attempt_id)
-                no_face_counter[attempt_id] = 0
-            
-            # Return early for No Face, but inside lock to ensure safety
+    distance = None
+    if stored_embedding is not None and live_embedding is not None:
+        distance = normalized_distance(stored_embedding, live_embedding)
+
+    # --- 4. UPDATE STATE & LOGGING (PER-ATTEMPT LOCK) ---
+    # Only frames of the same candidate serialize here. The rules
+    # themselves live in ProctorSession.frame_events (shared with the
+    # offline re-scorer, proctoring/rescore.py).
+    with metrics.locked(session.lock):
+        events, face_missing = session.frame_events(phone_detected, face_result, distance, now)
+
+        for event in events:
+            try:
+                log_event(event, attempt_id)
+            except EventWriteError as e:
+                # Still queued for retry; termination below is written separately
+                print("❌ Sync event write failed:", e)
+
+        if face_missing:
             response.update(evaluate_attempt(attempt_id))
-            return jsonify(response)
-
-        # Reset No Face if found
-        last_face_seen[attempt_id] = now
-        no_face_counter[attempt_id] = 0
-
-        # B. HEAD DIRECTION
-        current_head = event if event in ["LOOKING_LEFT", "LOOKING_RIGHT"] else "CENTER"
-        head_state = head_start_time.get(attempt_id)
-
-        if current_head != "CENTER":
-            if not head_state or head_state["direction"] != current_head:
-                head_start_time[attempt_id] = {"direction": current_head, "start": now}
-            else:
-                duration = now - head_state["start"]
-                last_logged = last_head_logged.get(attempt_id, 0)
-
-                if duration >= HEAD_DURATION_THRESHOLD:
-                    if (now - last_logged > HEAD_COOLDOWN):
-                        log_event(current_head, attempt_id)
-                        last_head_logged[attempt_id] = now
-        else:
-            head_start_time.pop(attempt_id, None)
-
-        # C. GAZE DIRECTION
-        current_gaze = response["gaze"] if response["gaze"] in ["GAZE_LEFT", "GAZE_RIGHT"] else "CENTER"
-        gaze_state = gaze_start_time.get(attempt_id)
-
-        if current_gaze != "CENTER":
-            if not gaze_state or gaze_state["direction"] != current_gaze:
-                gaze_start_time[attempt_id] = {"direction": current_gaze, "start": now}
-            else:
-                duration = now - gaze_state["start"]
-                last_logged = last_gaze_logged.get(attempt_id, 0)
-
-                if duration >= GAZE_DURATION_THRESHOLD:
-                    if (now - last_logged > GAZE_COOLDOWN):
-                        log_event(current_gaze, attempt_id)
-                        last_gaze_logged[attempt_id] = now
-        else:
-            gaze_start_time.pop(attempt_id, None)
+            return response
 
         # ---------------- IDENTITY VERIFICATION ----------------
-        if stored_embedding is not None and live_embedding is not None:
-            distance = cosine_distance(stored_embedding, live_embedding)
-            
-            if distance > FACE_MISMATCH_THRESHOLD:
-                face_mismatch_counter[attempt_id] += 1
-            else:
-                face_mismatch_counter[attempt_id] = 0
-
-            if face_mismatch_counter[attempt_id] >= FACE_MISMATCH_CONSECUTIVE:
-                if attempt_id not in identity_warning_issued:
-                    log_event("IDENTITY_MISMATCH_WARNING", attempt_id)
-                    identity_warning_issued.add(attempt_id)
-                    response["warning"] = "IDENTITY_MISMATCH"
-                    face_mismatch_counter[attempt_id] = 0
-                else:
-                    log_event("FACE_MISMATCH", attempt_id)
-                    terminate_attempt(attempt_id)
-                    response["status"] = "TERMINATED"
-                    return jsonify(response)
+        if "FACE_MISMATCH" in events:
+            terminate_attempt(attempt_id)
+            sessions.remove(attempt_id)
+            response["status"] = "TERMINATED"
+            return response
+
+        if "IDENTITY_MISMATCH_WARNING" in events:
+            response["warning"] = "IDENTITY_MISMATCH"
 
         # Final Score Update
         response.update(evaluate_attempt(attempt_id))
 
-    return jsonify(response)
\ No newline at end of file
+    return response
+
+
+# =================================================
+# IN-MEMORY STATE STATS
+# =================================================
+
+@proctoring_bp.route("/proctoring/stats", methods=["GET"])
+def proctoring_stats():
+    return jsonify({
+        "sessions": sessions.stats(),
+        "phone_batching": phone_scheduler.stats(),
+        "face_tiers": face_tier_stats.stats(),
+        "inference": inference_pool.stats()
+    })
@@ -0,0 +1,58 @@
+import os
+import sys
+import types
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# config.py is local to each deployment (it holds DATABASE_URL) and is
+# not committed; only tests using scratch_db open a connection
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.DATABASE_URL = os.environ.get("DATABASE_URL", "")
+    sys.modules["config"] = config
+
+
+@pytest.fixture(scope="session")
+def scratch_db():
+    """
+    A throwaway database with every migration applied, created next to
+    the one DATABASE_URL points at and dropped afterwards. Tests using
+    it are skipped unless DATABASE_URL is set.
+    """
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        pytest.skip("DATABASE_URL not set")
+
+    import psycopg2
+    from psycopg2.extensions import make_dsn
+
+    from db import connection
+    from db import migrations
+
+    name = f"proctoring_test_{os.getpid()}"
+    admin = psycopg2.connect(url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name}")
+
+    saved_url = connection.DATABASE_URL
+    connection.DATABASE_URL = make_dsn(url, dbname=name)
+    connection._pool = None
+    try:
+        migrations.apply_migrations()
+        with connection.db_cursor(commit=True) as cur:
+            migrations.ensure_partitions(cur)
+        yield connection.DATABASE_URL
+    finally:
+        if connection._pool is not None:
+            connection._pool.closeall()
+        connection._pool = None
+        connection.DATABASE_URL = saved_url
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name}")
+        admin.close()
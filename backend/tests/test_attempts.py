@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+
+import pytest
+
+from db import attempts
+from db.connection import db_cursor
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Statements the tracker would run, via a fake cursor and execute_values."""
+    cur = RecordingCursor()
+
+    @contextmanager
+    def fake_cursor(commit=False):
+        yield cur
+
+    def fake_execute_values(cur, sql, rows, template=None):
+        cur.execute(sql, list(rows))
+
+    monkeypatch.setattr(attempts, "db_cursor", fake_cursor)
+    monkeypatch.setattr(attempts, "execute_values", fake_execute_values)
+    return cur
+
+
+def test_activity_flush_writes_latest_time_per_attempt(recorded):
+    tracker = attempts.ActivityTracker()
+    tracker._ensure_flusher = lambda: None
+
+    tracker.touch(7, 100.0)
+    tracker.touch(7, 130.0)
+    tracker.touch(8, 120.0)
+
+    assert tracker.flush() == 2
+    sql, rows = recorded.executed[0]
+    assert "last_seen_at" in sql
+    assert rows == [(7, 130.0), (8, 120.0)]
+
+    assert tracker.flush() == 0
+    assert len(recorded.executed) == 1
+
+
+def test_failed_activity_flush_stays_pending(monkeypatch):
+    tracker = attempts.ActivityTracker()
+    tracker._ensure_flusher = lambda: None
+
+    @contextmanager
+    def broken_cursor(commit=False):
+        raise RuntimeError("database down")
+        yield
+
+    monkeypatch.setattr(attempts, "db_cursor", broken_cursor)
+    tracker.touch(7, 100.0)
+
+    with pytest.raises(RuntimeError):
+        tracker.flush()
+
+    tracker.touch(8, 90.0)
+    assert tracker._pending == {7: 100.0, 8: 90.0}
+    assert tracker.failures == 1
+
+
+def test_auto_flag_selects_on_inactivity():
+    cur = RecordingCursor()
+    cur.fetchall = lambda: []
+    attempts.auto_flag_abandoned_attempts(cur)
+
+    sql, params = cur.executed[0]
+    assert "last_seen_at < NOW() - %s::interval" in sql
+    assert "started_at" not in sql
+    assert params == (attempts.AUTO_FLAG_IDLE,)
+
+
+# -----------------------------------
+# Against Postgres (DATABASE_URL)
+# -----------------------------------
+def _insert_attempt(cur, started, last_seen):
+    cur.execute("""
+        INSERT INTO exam_attempts (user_id, exam_id, status, started_at, last_seen_at)
+        VALUES ('test', 'auto_flag_test', 'ONGOING', NOW() - %s::interval, NOW() - %s::interval)
+        RETURNING id
+    """, (started, last_seen))
+    return cur.fetchone()[0]
+
+
+def test_active_attempt_is_not_flagged(scratch_db):
+    with db_cursor(commit=True) as cur:
+        active = _insert_attempt(cur, "3 hours", "5 seconds")
+        idle = _insert_attempt(cur, "3 hours", "3 hours")
+
+    # A frame for an attempt whose last_seen_at was stale keeps it open too
+    with db_cursor(commit=True) as cur:
+        stale_but_sending = _insert_attempt(cur, "3 hours", "3 hours")
+    tracker = attempts.ActivityTracker()
+    tracker._ensure_flusher = lambda: None
+    tracker.touch(stale_but_sending)
+    tracker.flush()
+
+    with db_cursor(commit=True) as cur:
+        attempts.auto_flag_abandoned_attempts(cur)
+        cur.execute(
+            "SELECT id, status FROM exam_attempts WHERE id IN (%s, %s, %s)",
+            (active, idle, stale_but_sending)
+        )
+        status = dict(cur.fetchall())
+
+    assert status == {active: "ONGOING", idle: "FLAGGED", stale_but_sending: "ONGOING"}
@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+from db import events
+
+
+class FakeDatabase:
+    """Fails the next `failures` connections; rejects rows of `bad_type`."""
+
+    def __init__(self, failures=0, bad_type=None):
+        self.failures = failures
+        self.bad_type = bad_type
+        self.inserted = []
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    db = FakeDatabase()
+    retracted = []
+
+    @contextmanager
+    def fake_cursor(commit=False):
+        if db.failures:
+            db.failures -= 1
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        yield db
+
+    def fake_execute_values(cur, sql, rows, template=None, fetch=False):
+        if "INSERT INTO cheating_events" not in sql:
+            return None
+        if any(row[1] == cur.bad_type for row in rows):
+            raise psycopg2.DataError("bad row")
+        start = len(cur.inserted)
+        cur.inserted.extend(rows)
+        return [(start + i,) for i in range(len(rows))]
+
+    monkeypatch.setattr(events, "db_cursor", fake_cursor)
+    monkeypatch.setattr(events, "execute_values", fake_execute_values)
+    monkeypatch.setattr(events, "ensure_schema", lambda: None)
+    monkeypatch.setattr(events.live_hub, "publish", lambda messages: None)
+    monkeypatch.setattr(events.score_ledger, "peek", lambda attempt_id: None)
+    monkeypatch.setattr(events.score_ledger, "retract", lambda attempt_id, weight: retracted.append(attempt_id))
+
+    writer = events.EventWriter()
+    writer._ensure_flusher = lambda: None
+    writer.db = db
+    writer.retracted = retracted
+    return writer
+
+
+def test_outage_longer_than_the_retries_drops_nothing(writer):
+    writer.db.failures = events.EVENT_FLUSH_RETRIES * 3
+    for attempt_id in range(5):
+        assert writer.submit("TAB_SWITCH", attempt_id, 3)
+
+    for _ in range(events.EVENT_FLUSH_RETRIES * 3):
+        assert writer.flush() is False
+        assert writer.pending() == 5
+
+    assert writer.flush() is True
+    assert [row[0] for row in writer.db.inserted] == [0, 1, 2, 3, 4]
+    assert writer.retracted == []
+    assert writer.deferred == 5 * events.EVENT_FLUSH_RETRIES * 3
+
+
+def test_outage_backs_off_exponentially_up_to_the_cap(writer):
+    writer.db.failures = 20
+    writer.submit("TAB_SWITCH", 1, 3)
+
+    backoffs = []
+    for _ in range(20):
+        writer.flush()
+        backoffs.append(writer._backoff)
+
+    assert backoffs[1] == 2 * backoffs[0]
+    assert backoffs[-1] == events.EVENT_RETRY_BACKOFF_MAX
+
+    writer.flush()
+    assert writer._backoff == 0.0
+    assert writer.db.inserted
+
+
+def test_only_a_bad_row_uses_up_retries(writer):
+    writer.db.bad_type = "BAD_ROW"
+    writer.submit("TAB_SWITCH", 1, 3)
+    writer.submit("BAD_ROW", 2, 4)
+    writer.submit("COPY_PASTE", 3, 4)
+
+    for _ in range(events.EVENT_FLUSH_RETRIES + 1):
+        writer.flush()
+
+    assert sorted(row[1] for row in writer.db.inserted) == ["COPY_PASTE", "TAB_SWITCH"]
+    assert writer.retracted == [2]
+    assert writer.pending() == 0
+
+
+def test_full_queue_refuses_new_events(writer, monkeypatch):
+    monkeypatch.setattr(events, "EVENT_QUEUE_MAX", 2)
+
+    assert writer.submit("TAB_SWITCH", 1, 3)
+    assert writer.submit("TAB_SWITCH", 1, 3)
+    assert not writer.submit("TAB_SWITCH", 1, 3)
+    assert writer.pending() == 2
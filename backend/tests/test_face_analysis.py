@@ -0,0 +1,305 @@
+"""
+FrameAnalysis against the pre-FrameAnalysis analyze_face / extract_face.
+
+The reference functions below are the original implementations, kept
+verbatim apart from taking their MediaPipe graphs as arguments. Two
+later, intended changes are accounted for rather than compared:
+
+- gaze is reported but no longer scored, and it averages both eyes
+  (the original read the left eye only): landmark fixtures give both
+  eyes the same iris position, and frame results are compared without
+  gaze;
+- the cheap presence tier decides NO_FACE / MULTIPLE_FACES on a
+  downscaled frame, so the model comparison runs with it off and on
+  frames no wider than FACE_PRESENCE_WIDTH.
+
+Webcam frames dropped into tests/fixtures/faces/ (*.jpg, *.png) are
+compared along with the synthetic ones.
+"""
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from proctoring import face
+from proctoring.face import (
+    FrameAnalysis,
+    analyze_eye_gaze,
+    analyze_head_direction,
+    gaze_ratios,
+    head_offsets,
+    landmark_array,
+    landmark_points
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "faces")
+MESH_SIZE = 478
+
+
+# --------------------------------------------------
+# ORIGINAL IMPLEMENTATIONS
+# --------------------------------------------------
+
+def original_head_direction(landmarks):
+    nose_x = landmarks[1].x
+    left = landmarks[234].x
+    right = landmarks[454].x
+
+    offset = nose_x - ((left + right) / 2)
+
+    if offset > 0.06:
+        return "LEFT", "LOOKING_LEFT"
+    if offset < -0.06:
+        return "RIGHT", "LOOKING_RIGHT"
+
+    return "CENTER", None
+
+
+def original_eye_gaze(landmarks):
+    left_corner = landmarks[33]
+    right_corner = landmarks[133]
+    iris = landmarks[468]
+
+    eye_width = right_corner.x - left_corner.x
+    if eye_width == 0:
+        return "CENTER", None
+
+    iris_position = (iris.x - left_corner.x) / eye_width
+
+    if iris_position < 0.35:
+        return "LEFT", "GAZE_LEFT"
+    elif iris_position > 0.65:
+        return "RIGHT", "GAZE_RIGHT"
+
+    return "CENTER", None
+
+
+def original_analyze_face(frame, face_mesh):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    result = face_mesh.process(rgb)
+
+    if not result.multi_face_landmarks:
+        return {"faces": 0, "direction": "NONE", "event": "NO_FACE", "gaze": "NONE"}
+
+    if len(result.multi_face_landmarks) > 1:
+        return {
+            "faces": len(result.multi_face_landmarks),
+            "direction": "MULTIPLE",
+            "event": "MULTIPLE_FACES",
+            "gaze": "NONE"
+        }
+
+    landmarks = result.multi_face_landmarks[0].landmark
+
+    head_direction, head_event = original_head_direction(landmarks)
+    gaze_direction, gaze_event = original_eye_gaze(landmarks)
+    event = head_event if head_event else gaze_event
+
+    return {"faces": 1, "direction": head_direction, "gaze": gaze_direction, "event": event}
+
+
+def original_extract_face(frame, face_detection, face_mesh):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    detection_results = face_detection.process(rgb)
+
+    if not detection_results.detections:
+        return None, 0, None
+
+    if len(detection_results.detections) > 1:
+        return None, len(detection_results.detections), None
+
+    h, w, _ = frame.shape
+    bbox = detection_results.detections[0].location_data.relative_bounding_box
+
+    x1 = int(bbox.xmin * w)
+    y1 = int(bbox.ymin * h)
+    x2 = int((bbox.xmin + bbox.width) * w)
+    y2 = int((bbox.ymin + bbox.height) * h)
+
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(w, x2), min(h, y2)
+
+    face_img = frame[y1:y2, x1:x2]
+
+    if face_img.size == 0:
+        return None, 0, None
+
+    mesh_results = face_mesh.process(rgb)
+    landmarks = mesh_results.multi_face_landmarks[0].landmark if mesh_results.multi_face_landmarks else None
+
+    return face_img, 1, landmarks
+
+
+# --------------------------------------------------
+# LANDMARK MATH (no models)
+# --------------------------------------------------
+
+class _Landmark:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def synthetic_landmarks(rng):
+    """A mesh whose right eye is the left eye shifted, so both gaze ratios agree."""
+    points = rng.random((MESH_SIZE, 2))
+
+    points[33] = (rng.uniform(0.30, 0.40), rng.random())                  # left eye, left corner
+    points[133] = (points[33, 0] + rng.uniform(0.02, 0.08), rng.random())  # left eye, right corner
+    points[468] = (rng.uniform(points[33, 0] - 0.01, points[133, 0] + 0.01), rng.random())
+
+    shift = rng.uniform(0.10, 0.20)
+    points[362] = (points[33, 0] + shift, points[33, 1])
+    points[263] = (points[133, 0] + shift, points[133, 1])
+    points[473] = (points[468, 0] + shift, points[468, 1])
+
+    return [_Landmark(float(x), float(y)) for x, y in points]
+
+
+def _near(value, thresholds, tolerance=1e-4):
+    # The right eye's shifted copy may round the other way right at a threshold
+    return any(abs(value - t) < tolerance for t in thresholds)
+
+
+def test_landmark_math_matches_original():
+    rng = np.random.default_rng(0)
+    compared = 0
+
+    for _ in range(2000):
+        landmarks = synthetic_landmarks(rng)
+        points = landmark_points(landmarks)
+
+        offset = landmarks[1].x - (landmarks[234].x + landmarks[454].x) / 2
+        if not _near(offset, (face.HEAD_YAW_THRESHOLD, -face.HEAD_YAW_THRESHOLD)):
+            assert analyze_head_direction(points) == original_head_direction(landmarks)
+
+        ratio = (landmarks[468].x - landmarks[33].x) / (landmarks[133].x - landmarks[33].x)
+        if not _near(ratio, (face.GAZE_LEFT_RATIO, face.GAZE_RIGHT_RATIO)):
+            assert analyze_eye_gaze(points) == original_eye_gaze(landmarks)
+            compared += 1
+
+    assert compared > 1000
+
+
+def test_stacked_landmarks_match_single_frames():
+    rng = np.random.default_rng(2)
+    frames = [landmark_points(synthetic_landmarks(rng)) for _ in range(50)]
+    stack = landmark_array(frames)
+
+    assert stack.shape == (50, len(face.KEY_LANDMARKS), 2)
+    assert np.allclose(head_offsets(stack), [head_offsets(points) for points in frames], atol=1e-6)
+    assert np.allclose(gaze_ratios(stack), [gaze_ratios(points) for points in frames], atol=1e-4)
+
+
+# --------------------------------------------------
+# FULL FRAMES (MediaPipe)
+# --------------------------------------------------
+
+def _drawn_face(frame, cx, cy, scale):
+    cv2.ellipse(frame, (cx, cy), (int(45 * scale), int(60 * scale)), 0, 0, 360, (150, 180, 220), -1)
+    for dx in (-18, 18):
+        cv2.circle(frame, (cx + int(dx * scale), cy - int(15 * scale)), int(6 * scale), (40, 30, 30), -1)
+    cv2.line(frame, (cx, cy - int(5 * scale)), (cx, cy + int(15 * scale)), (110, 130, 170), 2)
+    cv2.ellipse(frame, (cx, cy + int(30 * scale)), (int(18 * scale), int(6 * scale)), 0, 0, 180, (60, 60, 150), 2)
+
+
+def synthetic_frames():
+    rng = np.random.default_rng(1)
+    frames = {
+        "black": np.zeros((240, 320, 3), np.uint8),
+        "noise": rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    }
+
+    one = np.full((240, 320, 3), 90, np.uint8)
+    _drawn_face(one, 160, 120, 1.2)
+    frames["drawn_face"] = one
+
+    two = np.full((240, 320, 3), 90, np.uint8)
+    _drawn_face(two, 90, 120, 0.9)
+    _drawn_face(two, 230, 120, 0.9)
+    frames["two_drawn_faces"] = two
+
+    return frames
+
+
+def fixture_frames():
+    frames = synthetic_frames()
+
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.jpg")) + glob.glob(os.path.join(FIXTURE_DIR, "*.png"))):
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        h, w = frame.shape[:2]
+        if w > face.FACE_PRESENCE_WIDTH:
+            size = (face.FACE_PRESENCE_WIDTH, int(h * face.FACE_PRESENCE_WIDTH / w))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        frames[os.path.basename(path)] = frame
+
+    return frames
+
+
+FRAMES = fixture_frames()
+
+
+@pytest.fixture(scope="module")
+def reference_graphs():
+    pytest.importorskip("mediapipe")
+    graphs = {"mesh": face._build_face_mesh(), "detection": face._build_face_detection()}
+    yield graphs
+    for graph in graphs.values():
+        graph.close()
+
+
+@pytest.fixture
+def no_presence_tier(monkeypatch):
+    monkeypatch.setattr(face, "FACE_PRESENCE_TIER", None)
+
+
+def _without_gaze(result):
+    # Gaze is left out (both eyes now, unscored); a GAZE_* event only
+    # ever stood in for a missing head event, so it compares as None
+    result = dict(result)
+    result.pop("gaze")
+    if result["event"] in ("GAZE_LEFT", "GAZE_RIGHT"):
+        result["event"] = None
+    return result
+
+
+@pytest.mark.parametrize("name", sorted(FRAMES))
+def test_analyze_face_matches_original(name, reference_graphs, no_presence_tier):
+    frame = FRAMES[name]
+    reference_graphs["mesh"].reset()      # pooled FaceMesh is reset for keyless callers too
+
+    expected = original_analyze_face(frame, reference_graphs["mesh"])
+    actual = face.analyze_face(frame)
+
+    assert _without_gaze(actual) == _without_gaze(expected)
+    if expected["faces"] != 1:
+        assert actual["gaze"] == expected["gaze"]
+
+
+@pytest.mark.parametrize("name", sorted(FRAMES))
+def test_extract_face_matches_original(name, reference_graphs, no_presence_tier):
+    frame = FRAMES[name]
+    reference_graphs["mesh"].reset()
+
+    expected_img, expected_count, expected_landmarks = original_extract_face(
+        frame, reference_graphs["detection"], reference_graphs["mesh"]
+    )
+    actual_img, actual_count, actual_landmarks = face.extract_face(frame)
+
+    assert actual_count == expected_count
+    if expected_img is None:
+        assert actual_img is None
+        assert actual_landmarks is None
+        return
+
+    assert actual_img.shape == expected_img.shape
+    assert np.array_equal(actual_img, expected_img)
+
+    if expected_landmarks is None:
+        assert actual_landmarks is None
+    else:
+        assert np.allclose(landmark_points(actual_landmarks), landmark_points(expected_landmarks))
@@ -0,0 +1,236 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from db import face_index
+from db.face_index import (
+    FACE_INDEX_NPROBE,
+    FACE_INDEX_TAIL_OVERLAP,
+    FaceIndex,
+    Snapshot,
+    assign_lists,
+    cohort_pairs,
+    group_pairs,
+    search_matrix,
+    train_centroids
+)
+from proctoring.vectors import EMBEDDING_DTYPE
+
+DIM = 128
+REGISTERED_UNTIL = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def normalized(rows):
+    rows = np.asarray(rows, dtype=EMBEDDING_DTYPE)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def faces(rng, people, per_person, noise=0.35):
+    """per_person noisy captures of each of `people` faces, person-major."""
+    centers = rng.standard_normal((people, DIM))
+    captures = np.repeat(centers, per_person, axis=0)
+    captures += noise * rng.standard_normal(captures.shape)
+    return normalized(captures)
+
+
+def write_snapshot(directory, name, vectors, lists=0, registered_until=REGISTERED_UNTIL):
+    """Lays out a snapshot the way build_snapshot does, without the database."""
+    path = directory / name
+    path.mkdir()
+    attempt_ids = np.arange(1, len(vectors) + 1, dtype=np.int64)
+
+    if lists:
+        centroids = train_centroids(vectors, lists)
+        assign = assign_lists(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        vectors, attempt_ids = vectors[order], attempt_ids[order]
+        np.save(path / "centroids.npy", centroids)
+        np.save(path / "offsets.npy", np.searchsorted(assign[order], np.arange(lists + 1)))
+
+    np.save(path / "vectors.npy", vectors)
+    np.save(path / "attempts.npy", attempt_ids)
+    np.save(path / "users.npy", np.array([f"user-{a}" for a in attempt_ids], dtype=str))
+    np.save(path / "exams.npy", np.array(["exam"] * len(vectors), dtype=str))
+    (path / "meta.json").write_text(json.dumps({
+        "rows": len(vectors),
+        "registered_until": registered_until.isoformat(),
+        "lists": lists
+    }))
+    (directory / "CURRENT").write_text(name)
+    return path
+
+
+def hits(q, rows):
+    return set(zip(q.tolist(), rows.tolist()))
+
+
+# -----------------------------------
+# search_matrix
+# -----------------------------------
+@pytest.mark.parametrize("block_rows", [1, 7, 64, 1000])
+def test_search_matrix_is_the_same_across_block_sizes(block_rows):
+    rng = np.random.default_rng(0)
+    vectors = faces(rng, 20, 5)
+    queries = vectors[::9]
+
+    q, rows, sims = search_matrix(vectors, queries, 0.7, block_rows=block_rows)
+
+    expected = np.argwhere((queries @ vectors.T) >= 0.7)
+    assert hits(q, rows) == set(map(tuple, expected.tolist()))
+    assert np.allclose(sims, np.sum(queries[q] * vectors[rows], axis=1), atol=1e-5)
+    assert rows.dtype.kind == "i" and q.dtype.kind == "i"
+
+
+def test_search_matrix_without_hits_returns_empty_arrays():
+    rng = np.random.default_rng(1)
+    vectors = faces(rng, 5, 2)
+
+    q, rows, sims = search_matrix(vectors, vectors[:1], 1.5, block_rows=3)
+
+    assert q.size == rows.size == sims.size == 0
+    assert sims.dtype == EMBEDDING_DTYPE
+
+
+# -----------------------------------
+# Snapshot.search with inverted lists
+# -----------------------------------
+def test_inverted_lists_recall_matches_exhaustive_search(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = faces(rng, 400, 10)
+    queries = normalized(vectors[::13] + 0.02 * rng.standard_normal((len(vectors[::13]), DIM)))
+    min_similarity = 1.0 - face_index.PROXY_MATCH_THRESHOLD
+
+    lists = int(4 * np.sqrt(len(vectors)))
+    ann = Snapshot(str(write_snapshot(tmp_path, "snap-ann", vectors, lists=lists)))
+    (tmp_path / "flat").mkdir()
+    flat = Snapshot(str(write_snapshot(tmp_path / "flat", "snap-flat", vectors)))
+
+    def found(snapshot):
+        q, rows, sims = snapshot.search(queries, min_similarity, nprobe=FACE_INDEX_NPROBE)
+        assert np.all(sims >= min_similarity)
+        return {(int(i), int(snapshot.attempt_ids[r])) for i, r in zip(q, rows)}
+
+    exact = found(flat)
+    approx = found(ann)
+
+    assert len(exact) > len(queries)
+    assert approx <= exact
+    assert len(approx) / len(exact) >= 0.95
+
+
+def test_snapshot_probing_every_list_is_exhaustive(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = faces(rng, 50, 4)
+    snapshot = Snapshot(str(write_snapshot(tmp_path, "snap-1", vectors, lists=16)))
+
+    q, rows, _ = snapshot.search(vectors[:10], 0.7, nprobe=16)
+    exact_q, exact_rows, _ = search_matrix(snapshot.vectors, vectors[:10], 0.7)
+
+    assert hits(q, rows) == hits(exact_q, exact_rows)
+
+
+# -----------------------------------
+# FaceIndex tail
+# -----------------------------------
+def tail_row(attempt_id, vector, registered_at, user_id="user"):
+    return attempt_id, user_id, "exam", vector.tobytes(), registered_at
+
+
+def test_merge_tail_keeps_the_newest_registration():
+    rng = np.random.default_rng(4)
+    old, new = faces(rng, 2, 1)
+    index = FaceIndex()
+    t = REGISTERED_UNTIL
+
+    index._merge_tail(t, [tail_row(1, old, t + timedelta(seconds=5))])
+    assert index._tail_since == t + timedelta(seconds=5)
+
+    # The overlap re-reads the same row; then a re-registration replaces it
+    index._merge_tail(t, [tail_row(1, new, t + timedelta(seconds=5))])
+    assert np.array_equal(index._tail[1][2], old)
+
+    index._tail_matrix = np.zeros((1, DIM), dtype=EMBEDDING_DTYPE)
+    index._merge_tail(t, [tail_row(1, new, t + timedelta(seconds=9)), tail_row(1, old, t + timedelta(seconds=2))])
+    assert np.array_equal(index._tail[1][2], new)
+    assert index._tail[1][3] == t + timedelta(seconds=9)
+    assert index._tail_matrix is None
+    assert index._tail_since == t + timedelta(seconds=9)
+
+
+def test_reload_drops_tail_rows_the_snapshot_covers(tmp_path):
+    rng = np.random.default_rng(5)
+    vectors = faces(rng, 4, 1)
+    index = FaceIndex(directory=str(tmp_path))
+    overlap = timedelta(seconds=FACE_INDEX_TAIL_OVERLAP)
+
+    index._merge_tail(REGISTERED_UNTIL - 2 * overlap, [
+        tail_row(1, vectors[0], REGISTERED_UNTIL - 2 * overlap),           # covered
+        tail_row(2, vectors[1], REGISTERED_UNTIL - overlap / 2),           # inside the overlap
+        tail_row(3, vectors[2], REGISTERED_UNTIL + timedelta(seconds=1)),  # after the snapshot
+    ])
+    write_snapshot(tmp_path, "snap-1", vectors)
+
+    index._reload(0.0, force=True)
+
+    assert index.ready
+    assert sorted(index._tail) == [2, 3]
+    assert index._tail_matrix is None
+    assert index._tail_since == REGISTERED_UNTIL + timedelta(seconds=1)
+
+
+def test_reload_moves_tail_since_up_to_the_snapshot(tmp_path):
+    index = FaceIndex(directory=str(tmp_path))
+    index._merge_tail(REGISTERED_UNTIL - timedelta(hours=1), [])
+    write_snapshot(tmp_path, "snap-1", faces(np.random.default_rng(6), 2, 1))
+
+    index._reload(0.0, force=True)
+
+    assert index._tail == {}
+    assert index._tail_since == REGISTERED_UNTIL
+
+
+# -----------------------------------
+# Cohort clustering
+# -----------------------------------
+def test_cohort_pairs_matches_all_pairs_across_blocks():
+    rng = np.random.default_rng(7)
+    vectors = faces(rng, 30, 3)
+    user_ids = [f"user-{i % 40}" for i in range(len(vectors))]
+
+    pairs = cohort_pairs(vectors, user_ids, 0.3, block_rows=8)
+
+    sims = vectors @ vectors.T
+    expected = {
+        (i, j)
+        for i in range(len(vectors)) for j in range(i + 1, len(vectors))
+        if sims[i, j] >= 0.7 and user_ids[i] != user_ids[j]
+    }
+    assert {(i, j) for i, j, _ in pairs} == expected
+    assert all(abs(d - (1.0 - sims[i, j])) < 1e-5 for i, j, d in pairs)
+
+
+def test_cohort_pairs_skips_the_same_user():
+    vectors = normalized(np.ones((3, DIM)))
+
+    pairs = cohort_pairs(vectors, ["a", "a", "b"], 0.3)
+
+    assert [(i, j) for i, j, _ in pairs] == [(0, 2), (1, 2)]
+
+
+def test_group_pairs_joins_chains_into_one_cluster():
+    attempt_ids = [10, 11, 12, 13, 14, 15]
+    user_ids = ["a", "b", "c", "d", "e", "e"]
+    pairs = [(0, 1, 0.2), (1, 2, 0.1), (3, 4, 0.25), (2, 0, 0.15)]
+
+    clusters = group_pairs(pairs, attempt_ids, user_ids)
+
+    assert clusters == [
+        {"attempts": [10, 11, 12], "users": ["a", "b", "c"], "pairs": 3, "min_distance": 0.1},
+        {"attempts": [13, 14], "users": ["d", "e"], "pairs": 1, "min_distance": 0.25},
+    ]
+
+
+def test_group_pairs_without_pairs_is_empty():
+    assert group_pairs([], [1, 2], ["a", "b"]) == []
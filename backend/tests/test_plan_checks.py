@@ -0,0 +1,208 @@
+import inspect
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+from db import attempts, events, face_index, migrations
+from db.connection import db_cursor
+from db.migrations import EXPECTED_INDEXES, MIGRATIONS, PLAN_CHECKS, check_plan
+
+
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+def migration_sql():
+    parts = []
+    for _, _, body in MIGRATIONS:
+        if callable(body):
+            parts.append(inspect.getsource(body))
+            # and the helpers it calls, e.g. _create_events_table
+            for name in body.__code__.co_names:
+                helper = getattr(migrations, name, None)
+                if inspect.isfunction(helper):
+                    parts.append(inspect.getsource(helper))
+        elif isinstance(body, str):
+            parts.append(body)
+        else:
+            parts.extend(body)
+    return "\n".join(parts)
+
+
+class RecordingCursor:
+    """Records statements; every query returns no rows."""
+
+    def __init__(self, fetchone=None):
+        self.executed = []
+        self._fetchone = fetchone
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return self._fetchone
+
+    def fetchall(self):
+        return []
+
+
+class PlanCursor:
+    """Answers EXPLAIN (FORMAT JSON) with a canned plan tree."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fetchone(self):
+        return (json.dumps([{"Plan": self.plan}]),)
+
+    def fetchall(self):
+        return []      # no partition indexes
+
+
+def check_named(name):
+    return next(check for check in PLAN_CHECKS if check["name"] == name)
+
+
+# -----------------------------------
+# The checks themselves
+# -----------------------------------
+def test_check_names_are_unique():
+    names = [check["name"] for check in PLAN_CHECKS]
+    assert len(names) == len(set(names))
+
+
+@pytest.mark.parametrize("check", PLAN_CHECKS, ids=lambda c: c["name"])
+def test_params_match_placeholders(check):
+    assert check["sql"].count("%s") == len(check["params"])
+
+
+@pytest.mark.parametrize(
+    "check", [c for c in PLAN_CHECKS if c["index"]], ids=lambda c: c["name"]
+)
+def test_expected_index_is_created_by_a_migration(check):
+    index = check["index"]
+    if index.endswith("_pkey"):
+        return      # primary keys come with their CREATE TABLE
+
+    assert re.search(rf"CREATE INDEX (CONCURRENTLY )?(IF NOT EXISTS )?{index}\b", migration_sql())
+    assert any(name == index for _, name in EXPECTED_INDEXES)
+
+
+# -----------------------------------
+# Same SQL as the code paths they stand for
+# -----------------------------------
+def test_auto_flag_check_matches_job_query():
+    cur = RecordingCursor()
+    attempts.auto_flag_abandoned_attempts(cur)
+
+    sql, params = cur.executed[0]
+    assert normalize(sql) == normalize(check_named("auto-flag abandoned attempts")["sql"])
+    assert params == check_named("auto-flag abandoned attempts")["params"]
+
+
+def test_score_update_check_matches_event_writer(monkeypatch):
+    executed = []
+
+    @contextmanager
+    def fake_cursor(commit=False):
+        yield RecordingCursor()
+
+    def fake_execute_values(cur, sql, rows, template=None, fetch=False):
+        executed.append(sql)
+        return [(i,) for i in range(len(rows))]
+
+    monkeypatch.setattr(events, "db_cursor", fake_cursor)
+    monkeypatch.setattr(events, "execute_values", fake_execute_values)
+    monkeypatch.setattr(events, "ensure_schema", lambda: None)
+    events.EventWriter()._insert([(7, "TAB_SWITCH", 3, 1767225600.0, 0, "exam")])
+
+    update = next(sql for sql in executed if "UPDATE exam_attempts" in sql)
+    check_sql = check_named("event writer score update")["sql"]
+    assert normalize(update) == normalize(check_sql.replace("(VALUES (%s, 1, 1))", "(VALUES %s)"))
+
+
+def test_face_index_tail_check_matches_lookup_query(monkeypatch):
+    cur = RecordingCursor()
+
+    @contextmanager
+    def fake_cursor(commit=False):
+        yield cur
+
+    monkeypatch.setattr(face_index, "db_cursor", fake_cursor)
+    face_index.FaceIndex()._fetch_tail(datetime(2026, 1, 1))
+
+    sql, _ = cur.executed[0]
+    assert normalize(sql) == normalize(check_named("face index tail")["sql"])
+
+
+# -----------------------------------
+# check_plan on canned plans
+# -----------------------------------
+def index_scan(index, relation="exam_attempts"):
+    return {"Node Type": "Index Scan", "Relation Name": relation, "Index Name": index}
+
+
+def test_check_plan_accepts_the_expected_index():
+    check = check_named("admin attempts page")
+    plan = {"Node Type": "Limit", "Plans": [index_scan("idx_exam_attempts_started")]}
+
+    assert check_plan(PlanCursor(plan), check) == []
+
+
+def test_check_plan_disables_seqscan_for_the_explain():
+    cur = PlanCursor(index_scan("idx_exam_attempts_started"))
+    check_plan(cur, check_named("admin attempts page"))
+
+    assert "SET LOCAL enable_seqscan = off" in cur.executed
+    assert cur.executed[-1].startswith("EXPLAIN (FORMAT JSON)")
+
+
+def test_check_plan_flags_seq_scan_on_a_partition():
+    check = check_named("attempt timeline")
+    plan = {"Node Type": "Append", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "cheating_events_y2026m01"}
+    ]}
+
+    assert check_plan(PlanCursor(plan), check) == [
+        "sequential scan on cheating_events_y2026m01",
+        "expected idx_cheating_events_attempt_created, used no index"
+    ]
+
+
+def test_check_plan_flags_another_index():
+    check = check_named("admin attempts by exam")
+    plan = index_scan("idx_exam_attempts_started")
+
+    problems = check_plan(PlanCursor(plan), check)
+    assert problems == [
+        "expected idx_exam_attempts_exam_started, used ['idx_exam_attempts_started']"
+    ]
+
+
+def test_check_plan_flags_sort_when_the_index_should_order():
+    check = check_named("admin attempts by status")
+    plan = {"Node Type": "Sort", "Plans": [index_scan("idx_exam_attempts_status_started")]}
+
+    assert check_plan(PlanCursor(plan), check) == [
+        "explicit sort (index does not supply the order)"
+    ]
+
+
+# -----------------------------------
+# Real plans (opt-in: needs DATABASE_URL)
+# -----------------------------------
+def test_scratch_database_verifies(scratch_db):
+    assert migrations.verify() == []
+
+
+@pytest.mark.parametrize("check", PLAN_CHECKS, ids=lambda c: c["name"])
+def test_real_plan(scratch_db, check):
+    with db_cursor() as cur:
+        assert check_plan(cur, check) == []
@@ -0,0 +1,31 @@
+from proctoring.window import RollingWindow, RuleSet, TemporalRule
+
+HEAD = 0
+
+
+def window(duration=2, cooldown=5, min_frames=1, gap=1):
+    rules = RuleSet([TemporalRule("LOOKING_LEFT", HEAD, 1, duration, cooldown, min_frames)], channels=1, gap=gap)
+    return RollingWindow(rules)
+
+
+def replay(w, codes, start=100.0, step=1.0):
+    """Events per frame for one code per frame, one frame per `step` seconds."""
+    return [w.push(start + i * step, (code,)) for i, code in enumerate(codes)]
+
+
+def test_fires_once_the_run_lasts_the_duration_then_cools_down():
+    fired = replay(window(), [1] * 10)
+
+    assert [i for i, events in enumerate(fired) if events] == [2, 8]
+    assert fired[2] == ["LOOKING_LEFT"]
+
+
+def test_a_single_flicker_does_not_restart_the_run():
+    assert replay(window(), [1, 0, 1])[-1] == ["LOOKING_LEFT"]
+    assert replay(window(), [1, 0, 0, 1, 1])[-1] == []
+
+
+def test_min_frames_counts_frames_since_the_last_firing():
+    fired = replay(window(duration=0, cooldown=0, min_frames=3), [1] * 9)
+
+    assert [i for i, events in enumerate(fired) if events] == [2, 5, 8]
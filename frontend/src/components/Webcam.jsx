@@ -1,19 +1,20 @@
 import { useEffect, useRef } from "react";
 import WebcamLib from "react-webcam";
 
-function Webcam({ onCapture, warningLevel }) {
+function Webcam({ onCapture, warningLevel, interval = 1000 }) {
   const webcamRef = useRef(null);
 
   useEffect(() => {
-    const interval = setInterval(() => {
+    const timer = setInterval(() => {
       if (webcamRef.current) {
-        const imageSrc = webcamRef.current.getScreenshot();
-        if (imageSrc) onCapture(imageSrc);
+        // Raw JPEG blob (no base64 data URL)
+        const canvas = webcamRef.current.getCanvas();
+        if (canvas) canvas.toBlob(blob => blob && onCapture(blob), "image/jpeg", 0.8);
       }
-    }, 1000);
+    }, interval);
 
-    return () => clearInterval(interval);
-  }, [onCapture]);
+    return () => clearInterval(timer);
+  }, [onCapture, interval]);
 
   // 🔥 BORDER COLOR LOGIC (FIXED)
   const isCritical =
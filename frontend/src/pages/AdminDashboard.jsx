@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { API_BASE } from "../config/api";
 
@@ -6,32 +6,102 @@ import { API_BASE } from "../config/api";
 // Ensure you have this font imported in your index.html or index.css:
 // @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
 
+const PAGE_SIZE = 50;
+
 function AdminDashboard() {
   const navigate = useNavigate();
   const [attempts, setAttempts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [counts, setCounts] = useState({});
   const [filter, setFilter] = useState("ALL");
   const [searchTerm, setSearchTerm] = useState("");
   
   const [showProfileMenu, setShowProfileMenu] = useState(false);
 
-  useEffect(() => {
-    fetch(`${API_BASE}/admin/attempts`)
+  // Status filtering and paging happen server-side (keyset cursor)
+  const loadAttempts = useCallback((cursor = null) => {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (filter !== "ALL") params.set("status", filter);
+    if (cursor) params.set("cursor", cursor);
+
+    fetch(`${API_BASE}/admin/attempts?${params}`)
       .then(res => res.json())
-      .then(data => setAttempts(data))
+      .then(data => {
+        setAttempts(prev => cursor ? [...prev, ...data.attempts] : data.attempts);
+        setNextCursor(data.next_cursor);
+        if (data.status_counts) setCounts(data.status_counts);
+      })
       .catch(err => console.error("Fetch error:", err));
-  }, []);
+  }, [filter]);
+
+  useEffect(() => {
+    loadAttempts();
+  }, [loadAttempts]);
+
+  // Last status seen per attempt, so live transitions can move the counts
+  const knownStatus = useRef({});
+  useEffect(() => {
+    attempts.forEach(a => { knownStatus.current[a.id] = a.status; });
+  }, [attempts]);
+
+  // Live feed: scores and statuses are pushed over SSE instead of polled
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE}/admin/live`);
+
+    source.addEventListener("score", e => {
+      const msg = JSON.parse(e.data);
+      setAttempts(prev => prev.map(a =>
+        a.id === msg.attempt_id ? { ...a, cheating_score: msg.score } : a
+      ));
+    });
 
-  const filteredAttempts = attempts.filter(a => {
-    const matchesStatus = filter === "ALL" || a.status === filter;
-    const matchesSearch = a.user_id.toLowerCase().includes(searchTerm.toLowerCase());
-    return matchesStatus && matchesSearch;
-  });
+    source.addEventListener("status", e => {
+      const msg = JSON.parse(e.data);
+      const previous = knownStatus.current[msg.attempt_id];
+      knownStatus.current[msg.attempt_id] = msg.status;
 
-  const total = attempts.length;
-  const completed = attempts.filter(a => a.status === "COMPLETED").length;
-  const ongoing = attempts.filter(a => a.status === "ONGOING").length;
-  const flagged = attempts.filter(a => a.status === "FLAGGED").length;
-  const terminated = attempts.filter(a => a.status === "TERMINATED").length;
+      if (previous !== msg.status) {
+        setCounts(prev => {
+          const next = { ...prev, [msg.status]: (prev[msg.status] || 0) + 1 };
+          if (previous) next[previous] = Math.max((next[previous] || 0) - 1, 0);
+          return next;
+        });
+      }
+
+      setAttempts(prev => {
+        if (prev.some(a => a.id === msg.attempt_id)) {
+          return prev
+            .map(a => a.id === msg.attempt_id
+              ? { ...a, status: msg.status, cheating_score: msg.score }
+              : a)
+            .filter(a => filter === "ALL" || a.status === filter);
+        }
+        // New attempt: newest first, like the first page
+        if (!previous && msg.user_id && (filter === "ALL" || filter === msg.status)) {
+          return [{
+            id: msg.attempt_id,
+            user_id: msg.user_id,
+            exam_id: msg.exam_id,
+            cheating_score: msg.score,
+            status: msg.status,
+            started_at: msg.started_at
+          }, ...prev];
+        }
+        return prev;
+      });
+    });
+
+    return () => source.close();
+  }, [filter]);
+
+  const filteredAttempts = attempts.filter(a =>
+    a.user_id.toLowerCase().includes(searchTerm.toLowerCase())
+  );
+
+  const total = Object.values(counts).reduce((sum, n) => sum + n, 0);
+  const ongoing = counts.ONGOING || 0;
+  const flagged = counts.FLAGGED || 0;
+  const terminated = counts.TERMINATED || 0;
 
   const handleLogout = () => {
     navigate("/");
@@ -187,6 +257,14 @@ function AdminDashboard() {
               )}
             </tbody>
           </table>
+
+          {nextCursor && (
+            <div style={styles.loadMoreRow}>
+              <button style={styles.viewBtn} onClick={() => loadAttempts(nextCursor)}>
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       </main>
     </div>
@@ -462,7 +540,8 @@ const styles = {
     cursor: "pointer",
     transition: "all 0.2s"
   },
-  emptyState: { padding: 40, textAlign: "center", color: "#94a3b8", fontSize: 14 }
+  emptyState: { padding: 40, textAlign: "center", color: "#94a3b8", fontSize: 14 },
+  loadMoreRow: { padding: 16, textAlign: "center", borderTop: "1px solid #f1f5f9" }
 };
 
 export default AdminDashboard;
\ No newline at end of file
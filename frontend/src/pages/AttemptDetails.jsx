@@ -10,6 +10,7 @@ function AttemptDetails() {
   const { id } = useParams();
   const navigate = useNavigate();
   const [data, setData] = useState(null);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -25,6 +26,60 @@ function AttemptDetails() {
       });
   }, [id]);
 
+  // Rollups come from the summary tables. The live feed says when a new
+  // event lands; only then is the summary re-fetched (revalidated with
+  // If-None-Match), at most once per SUMMARY_REFRESH_MS.
+  useEffect(() => {
+    const loadSummary = () =>
+      fetch(`${API_BASE}/admin/attempt/${id}/summary`)
+        .then(res => res.ok ? res.json() : null)
+        .then(json => json && setSummary(json))
+        .catch(err => console.error(err));
+
+    loadSummary();
+
+    let pending = null;
+    const scheduleSummary = () => {
+      if (!pending) {
+        pending = setTimeout(() => { pending = null; loadSummary(); }, SUMMARY_REFRESH_MS);
+      }
+    };
+
+    const source = new EventSource(`${API_BASE}/admin/live?attempt_id=${id}`);
+
+    source.addEventListener("event", e => {
+      const msg = JSON.parse(e.data);
+      setData(prev => prev && prev.attempt ? {
+        ...prev,
+        events: [...prev.events, {
+          event_type: msg.event_type,
+          weight: msg.weight,
+          time: msg.time
+        }]
+      } : prev);
+      scheduleSummary();
+    });
+
+    const updateAttempt = e => {
+      const msg = JSON.parse(e.data);
+      setData(prev => prev && prev.attempt ? {
+        ...prev,
+        attempt: {
+          ...prev.attempt,
+          cheating_score: msg.score,
+          status: msg.status || prev.attempt.status
+        }
+      } : prev);
+    };
+    source.addEventListener("score", updateAttempt);
+    source.addEventListener("status", updateAttempt);
+
+    return () => {
+      source.close();
+      clearTimeout(pending);
+    };
+  }, [id]);
+
   if (loading) return <div style={styles.loading}>Loading attempt data...</div>;
   if (!data || !data.attempt) return <div style={styles.error}>Attempt not found.</div>;
 
@@ -106,6 +161,27 @@ function AttemptDetails() {
           </div>
         </div>
 
+        {/* ================= EVENT BREAKDOWN ================= */}
+        {summary && summary.by_type.length > 0 && (
+          <div style={styles.sectionContainer}>
+            <h3 style={styles.sectionTitle}>Event Breakdown</h3>
+
+            <div style={styles.breakdownCard}>
+              <Sparkline points={summary.sparkline.points} />
+
+              <div style={styles.breakdownList}>
+                {summary.by_type.map(t => (
+                  <div key={t.event_type} style={styles.breakdownItem}>
+                    <EventBadge type={t.event_type} />
+                    <span style={styles.breakdownCount}>×{t.count}</span>
+                    <span style={styles.weightBadge}>+{t.weight}</span>
+                  </div>
+                ))}
+              </div>
+            </div>
+          </div>
+        )}
+
         {/* ================= TIMELINE TABLE ================= */}
         <div style={styles.sectionContainer}>
           <h3 style={styles.sectionTitle}>Detailed Event Log</h3>
@@ -160,6 +236,25 @@ function AttemptDetails() {
 
 /* ================= COMPONENTS ================= */
 
+const SUMMARY_REFRESH_MS = 1000;
+
+// Weighted events per minute
+const Sparkline = ({ points, width = 600, height = 48 }) => {
+  if (!points.length) return null;
+
+  const max = Math.max(...points.map(p => p.weight), 1);
+  const step = points.length > 1 ? width / (points.length - 1) : 0;
+  const path = points
+    .map((p, i) => `${i === 0 ? "M" : "L"}${(i * step).toFixed(1)},${(height - (p.weight / max) * height).toFixed(1)}`)
+    .join(" ");
+
+  return (
+    <svg viewBox={`0 0 ${width} ${height}`} style={styles.sparkline} preserveAspectRatio="none">
+      <path d={path} fill="none" stroke="#ef4444" strokeWidth="2" />
+    </svg>
+  );
+};
+
 const StatusBadge = ({ status }) => {
   const config = {
     COMPLETED: { bg: "#dcfce7", color: "#166534", icon: "✅" },
@@ -332,6 +427,12 @@ const styles = {
     border: "1px solid #e2e8f0"
   },
 
+  breakdownCard: { background: "white", borderRadius: 16, border: "1px solid #e2e8f0", padding: 24, display: "flex", flexDirection: "column", gap: 16 },
+  sparkline: { width: "100%", height: 48 },
+  breakdownList: { display: "flex", flexWrap: "wrap", gap: 12 },
+  breakdownItem: { display: "flex", alignItems: "center", gap: 8 },
+  breakdownCount: { fontSize: 13, fontWeight: 700, color: "#334155" },
+
   loading: { display: "flex", justifyContent: "center", alignItems: "center", height: "100vh", color: "#64748b", fontSize: 16 },
   error: { display: "flex", justifyContent: "center", alignItems: "center", height: "100vh", color: "#ef4444", fontSize: 16 }
 };
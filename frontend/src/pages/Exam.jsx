@@ -28,6 +28,8 @@ function Exam() {
   const [countdown, setCountdown] = useState(5);
 
   const timerRef = useRef(null);
+  const streamRef = useRef(null);
+  const [frameInterval, setFrameInterval] = useState(1000);
 
   // ---------------- START EXAM ----------------
   useEffect(() => {
@@ -128,21 +130,52 @@ function Exam() {
   }, [submitted, terminated, attemptId]);
 
   // ---------------- WEBCAM MONITOR ----------------
-  const sendFrameToBackend = async (image) => {
+  const handleVerdict = (data) => {
+    if (data.warning) setWarning(data.warning);
+    if (data.identity_mismatch) setWarning("IDENTITY_MISMATCH");
+    if (data.status === "TERMINATED") setTerminated(true);
+  };
+
+  // Streaming channel: frames go out as binary messages, verdicts come back
+  useEffect(() => {
+    if (!attemptId || submitted || terminated) return;
+
+    const ws = new WebSocket(
+      `${API_BASE.replace(/^http/, "ws")}/ws/proctor?attempt_id=${attemptId}`
+    );
+
+    ws.onmessage = (msg) => {
+      const data = JSON.parse(msg.data);
+      if (data.type === "rate") setFrameInterval(data.interval_ms);
+      if (data.type === "verdict") handleVerdict(data);
+    };
+
+    streamRef.current = ws;
+
+    return () => {
+      ws.close();
+      streamRef.current = null;
+    };
+  }, [attemptId, submitted, terminated]);
+
+  const sendFrameToBackend = async (frame) => {
     if (!attemptId || submitted || terminated) return;
 
+    const ws = streamRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(frame);
+      return;
+    }
+
+    // Fallback: plain HTTP upload
     try {
-      const res = await fetch(`${API_BASE}/analyze-frame`, {
+      const res = await fetch(`${API_BASE}/analyze-frame-raw?attempt_id=${attemptId}`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ image, attempt_id: attemptId })
+        headers: { "Content-Type": "image/jpeg" },
+        body: frame
       });
 
-      const data = await res.json();
-
-      if (data.warning) setWarning(data.warning);
-      if (data.identity_mismatch) setWarning("IDENTITY_MISMATCH");
-      if (data.status === "TERMINATED") setTerminated(true);
+      handleVerdict(await res.json());
 
     } catch (err) {
       console.error("Backend error:", err);
@@ -344,7 +377,7 @@ function Exam() {
          <div style={styles.webcamFrame}>
             {/* Pass generic styles if your Webcam component accepts style props, 
                 otherwise this div wrapper handles the positioning */}
-            <Webcam onCapture={sendFrameToBackend} warningLevel={warning} />
+            <Webcam onCapture={sendFrameToBackend} warningLevel={warning} interval={frameInterval} />
          </div>
          <div style={styles.webcamStatus}>
             Status: {warning ? "Suspicious" : "Secure"}